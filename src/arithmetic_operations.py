@@ -1,8 +1,27 @@
 """
 Arithmetic operations for use as neural net activation functions
 """
+import numpy
 from operations import Operation
 
+# The largest modulus for which products of residues fit in 64-bit integers.
+MAX_BATCH_ORDER = 1 << 31
+
+
+def residues(column, order):
+    """
+    Reduce a column of integers modulo a positive integer.
+
+    Arguments:
+        column (list | numpy.ndarray): The integers.
+        order (int): The modulus.
+
+    Returns:
+        numpy.ndarray: An array of `numpy.int64` holding the least nonnegative residues.
+    """
+
+    return numpy.remainder(numpy.asarray(column, dtype=numpy.int64), order)
+
 
 class ModularAddition(Operation):
     """
@@ -21,6 +40,16 @@ class ModularAddition(Operation):
         # Complain if the order is nonpositive.
         assert order > 0
         Operation.__init__(self, 2, lambda *x: (x[0] + x[1]) % order, cache_values)
+        self.order = order
+
+    def spec(self):
+        return 'ModularAddition', self.order
+
+    def _evaluate_batch(self, *columns):
+        assert len(columns) == 2
+        if self.order > MAX_BATCH_ORDER:
+            return Operation._evaluate_batch(self, *columns)
+        return (residues(columns[0], self.order) + residues(columns[1], self.order)) % self.order
 
 
 class ModularMultiplication(Operation):
@@ -40,6 +69,16 @@ class ModularMultiplication(Operation):
         # Complain if the order is nonpositive.
         assert order > 0
         Operation.__init__(self, 2, lambda *x: (x[0] * x[1]) % order, cache_values)
+        self.order = order
+
+    def spec(self):
+        return 'ModularMultiplication', self.order
+
+    def _evaluate_batch(self, *columns):
+        assert len(columns) == 2
+        if self.order > MAX_BATCH_ORDER:
+            return Operation._evaluate_batch(self, *columns)
+        return (residues(columns[0], self.order) * residues(columns[1], self.order)) % self.order
 
 
 class ModularNegation(Operation):
@@ -58,4 +97,14 @@ class ModularNegation(Operation):
 
         # Complain if the order is nonpositive.
         assert order > 0
-        Operation.__init__(self, 1, lambda *x: (-x) % order, cache_values)
+        Operation.__init__(self, 1, lambda *x: (-x[0]) % order, cache_values)
+        self.order = order
+
+    def spec(self):
+        return 'ModularNegation', self.order
+
+    def _evaluate_batch(self, *columns):
+        assert len(columns) == 1
+        if self.order > MAX_BATCH_ORDER:
+            return Operation._evaluate_batch(self, *columns)
+        return -residues(columns[0], self.order) % self.order
@@ -0,0 +1,303 @@
+"""
+Relations stored as boolean arrays
+"""
+import numpy
+from relations import Relation, comparison, cube_side, set_operator
+
+
+class ArrayRelation(Relation):
+    """
+    A relation stored as a boolean array with one axis for each coordinate, so that a tuple belongs to the relation when
+    the entry of the array at that tuple is True. This suits relations of higher arity, such as voxel images, since
+    membership is a single array lookup and set operations, permutations of the coordinates, and reflections are carried
+    out by numpy on the whole array at once.
+
+    An `ArrayRelation` can be used anywhere a `Relation` can. Set operations between an `ArrayRelation` and another
+    relation convert the other relation to an array and produce an `ArrayRelation`. The array is read-only, since
+    relations are immutable.
+
+    Attributes:
+        array (numpy.ndarray): The boolean array of shape `(universe_size,) * arity` describing the relation.
+    """
+
+    __slots__ = ('_array',)
+
+    def __init__(self, array):
+        """
+        Create a relation from a boolean array.
+
+        Argument:
+            array (numpy.ndarray): An array of shape `(universe_size,) * arity` whose entry at a tuple is True exactly
+                when that tuple belongs to the relation. It is copied, so it may be changed afterwards.
+        """
+
+        self._set_array(numpy.array(array, dtype=numpy.bool_))
+
+    def _set_array(self, array):
+        """
+        Store a boolean array as the contents of the relation, without copying it.
+
+        Argument:
+            array (numpy.ndarray): The boolean array describing the relation.
+        """
+
+        array.flags.writeable = False
+        self._array = array
+        self._arity = array.ndim
+        self._universe_size = cube_side(array)
+        self._size = int(numpy.count_nonzero(array))
+        self._hash = None
+        self._fingerprint = None
+
+    @classmethod
+    def _from_array(cls, array):
+        """
+        Create a relation from a freshly computed boolean array, which is adopted without being copied.
+
+        Argument:
+            array (numpy.ndarray): The boolean array describing the relation.
+
+        Returns:
+            ArrayRelation: The relation described by `array`.
+        """
+
+        rel = object.__new__(cls)
+        rel._set_array(array)
+        return rel
+
+    @classmethod
+    def _from_store(cls, store, universe_size, arity, complemented=False, allow_complemented=True):
+        # The other constructors of `Relation`, such as `from_bits` and `from_coords`, end here, so they make array
+        # relations as well.
+        return cls.from_relation(Relation._from_store(store, universe_size, arity, complemented))
+
+    @classmethod
+    def from_array(cls, array):
+        return cls(array)
+
+    @classmethod
+    def from_relation(cls, rel):
+        """
+        Convert a relation to an `ArrayRelation`.
+
+        Argument:
+            rel (Relation): The relation to convert.
+
+        Returns:
+            ArrayRelation: A relation equal to `rel` which is stored as a boolean array.
+        """
+
+        if isinstance(rel, ArrayRelation):
+            return rel
+        return cls._from_array(rel.to_array())
+
+    def to_relation(self):
+        """
+        Convert the relation to an ordinary `Relation`.
+
+        Returns:
+            Relation: A relation equal to this one which is stored in the representation a `Relation` would choose.
+        """
+
+        return Relation.from_bits(self.bits, self.universe_size, self.arity)
+
+    @property
+    def array(self):
+        return self._array
+
+    def to_array(self):
+        return self._array
+
+    @property
+    def tuples(self):
+        return frozenset(map(tuple, numpy.argwhere(self._array).tolist()))
+
+    @property
+    def bits(self):
+        # The array is flattened in the lexicographic order of its indices, which is the order used for `bits`.
+        return int.from_bytes(numpy.packbits(self._array.ravel(), bitorder='little').tobytes(), 'little')
+
+    @property
+    def representation(self):
+        return 'array'
+
+    @property
+    def complemented(self):
+        return False
+
+    def materialize(self):
+        return self
+
+    def _positions(self):
+        return iter(numpy.flatnonzero(self._array).tolist())
+
+    def _canonical(self):
+        return self.to_relation()._canonical()
+
+    # The operators of other kinds of relations read the stored forms of their operands directly, so an array relation
+    # presents itself to them as a dense relation.
+
+    @property
+    def _store(self):
+        return self.bits
+
+    @property
+    def _complemented(self):
+        return False
+
+    def _store_nbytes(self):
+        return self._array.nbytes
+
+    def __reduce_ex__(self, protocol):
+        """
+        Prepare the relation for pickling. The array pickles itself, so with protocol 5 its buffer can be sent out of
+        band without copying.
+
+        Argument:
+            protocol (int): The pickle protocol in use.
+
+        Returns:
+            tuple: The constructor `_from_array` and the array.
+        """
+
+        return self._from_array, (self._array,)
+
+    def __contains__(self, tup):
+        """
+        Check whether a tuple belongs to the relation by looking it up in the array.
+
+        Argument:
+            tup (tuple of int): The tuple we are checking.
+
+        Returns:
+            bool: True when `tup` belongs to the relation, False otherwise.
+        """
+
+        if not isinstance(tup, tuple) or len(tup) != self.arity:
+            return False
+        if not all(0 <= entry < self.universe_size for entry in tup):
+            return False
+        return bool(self._array[tup])
+
+    def __iter__(self):
+        """
+        Produce an iterator for the tuples in the relation.
+
+        Returns:
+            iterator: The tuples in the relation, in lexicographic order.
+        """
+
+        return map(tuple, numpy.argwhere(self._array).tolist())
+
+    def _has_position(self, position):
+        return bool(self._array.flat[position])
+
+    def flip(self, tup):
+        """
+        Add a tuple to the relation if it is absent, or remove it if it is present. Unlike for other relations, this
+        copies the array, which numpy does in a single pass.
+
+        Argument:
+            tup (tuple of int): The tuple to flip. Its entries must lie in the universe.
+
+        Returns:
+            ArrayRelation: The relation differing from this one in exactly `tup`.
+        """
+
+        array = self._array.copy()
+        array.flat[self._position(tup)] ^= True
+        return self._from_array(array)
+
+    def permute_axes(self, permutation):
+        """
+        Permute the coordinates of every tuple in the relation.
+
+        Argument:
+            permutation (iterable of int): A rearrangement of `range(self.arity)`. Coordinate `i` of each tuple in the
+                new relation is coordinate `permutation[i]` of the corresponding tuple in this one.
+
+        Returns:
+            ArrayRelation: The relation with its coordinates permuted.
+        """
+
+        return self._from_array(numpy.ascontiguousarray(numpy.transpose(self._array, tuple(permutation))))
+
+    def reflect(self, axes):
+        """
+        Reflect the relation along some of its coordinates, sending each entry `x` in those coordinates to
+        `universe_size - 1 - x`.
+
+        Argument:
+            axes (iterable of int): The coordinates to reflect.
+
+        Returns:
+            ArrayRelation: The reflected relation.
+        """
+
+        axes = tuple(axes)
+        if not axes:
+            return self
+        return self._from_array(numpy.ascontiguousarray(numpy.flip(self._array, axes)))
+
+    @comparison
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if self._size != other._size:
+            return False
+        return bool(numpy.array_equal(self._array, other.to_array()))
+
+    @comparison
+    def __le__(self, other):
+        return not (self._array & ~other.to_array()).any()
+
+    @comparison
+    def __lt__(self, other):
+        return self._size < other._size and self <= other
+
+    @comparison
+    def __ge__(self, other):
+        return not (other.to_array() & ~self._array).any()
+
+    @comparison
+    def __gt__(self, other):
+        return self._size > other._size and self >= other
+
+    # Equal relations must have equal hash values whichever class they belong to, so the hash is not changed.
+    __hash__ = Relation.__hash__
+
+    def __invert__(self):
+        return self._from_array(~self._array)
+
+    @set_operator
+    def __and__(self, other):
+        return self._from_array(self._array & other.to_array())
+
+    @set_operator
+    def __or__(self, other):
+        return self._from_array(self._array | other.to_array())
+
+    @set_operator
+    def __xor__(self, other):
+        return self._from_array(self._array ^ other.to_array())
+
+    @set_operator
+    def __sub__(self, other):
+        return self._from_array(self._array & ~other.to_array())
+
+    # Python tries these before the operators of an ordinary `Relation` on the left, since this is a subclass.
+    __rand__ = __and__
+    __ror__ = __or__
+    __rxor__ = __xor__
+
+    @set_operator
+    def __rsub__(self, other):
+        return self._from_array(other.to_array() & ~self._array)
+
+    @comparison
+    def intersection_size(self, other):
+        return int(numpy.count_nonzero(self._array & other.to_array()))
+
+    @comparison
+    def dot(self, other):
+        return self.intersection_size(other) & 1
@@ -0,0 +1,395 @@
+"""
+Cache policies for memoized operations
+"""
+import sys
+from collections import OrderedDict
+from weakref import WeakSet
+from relations import Relation, relation_nbytes
+
+
+def entry_nbytes(key, value):
+    """
+    Estimate the memory held by an entry in the cache of an operation.
+
+    Arguments:
+        key (tuple): The arguments of the operation.
+        value (object): The value of the operation at `key`.
+
+    Returns:
+        int: The size of `key` and of each argument and of `value`. Relations are measured by
+            `relations.relation_nbytes` and other objects by `sys.getsizeof`.
+    """
+
+    nbytes = sys.getsizeof(key)
+    for obj in key + (value,):
+        nbytes += relation_nbytes(obj) if isinstance(obj, Relation) else sys.getsizeof(obj)
+    return nbytes
+
+
+class UnboundedCache(dict):
+    """
+    A cache which keeps every value it is given. This is a plain dictionary, which is what `Operation.values` has always
+    been, so it is the fastest policy but grows without limit.
+    """
+
+
+class LRUCache:
+    """
+    A cache holding at most a fixed number of values, which evicts the least recently used one to make room for a new
+    one.
+
+    Caches have the interface of a dictionary restricted to `get`, `__getitem__`, `__setitem__`, `__contains__`,
+    `__len__`, `__iter__`, and `clear`, so a dictionary can be used wherever a cache is expected.
+
+    Attributes:
+        maxsize (int): The largest number of values held at once.
+    """
+
+    def __init__(self, maxsize):
+        """
+        Create an empty cache.
+
+        Argument:
+            maxsize (int): The largest number of values held at once.
+        """
+
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Look up a value, marking it as the most recently used.
+
+        Arguments:
+            key (tuple): The arguments of the operation.
+            default (object): What to return when there is no value for `key`.
+
+        Returns:
+            object: The value for `key`, or `default`.
+        """
+
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self._entries[key]
+
+    def __getitem__(self, key):
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def __setitem__(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __str__(self):
+        return 'A least recently used cache holding {} of at most {} values'.format(len(self), self.maxsize)
+
+
+class LFUCache:
+    """
+    A cache holding at most a fixed number of values, which evicts the least frequently used one to make room for a new
+    one. Among values used equally often, the one used least recently goes first. Every operation takes constant time,
+    since the keys are kept in buckets by the number of times they have been used.
+
+    This suits operations applied over and over to a small set of inputs, such as the images substituted into training
+    pairs by `mnist_training_binary.build_training_data`, mixed with many inputs seen only once.
+
+    Attributes:
+        maxsize (int): The largest number of values held at once.
+    """
+
+    def __init__(self, maxsize):
+        """
+        Create an empty cache.
+
+        Argument:
+            maxsize (int): The largest number of values held at once.
+        """
+
+        self.maxsize = maxsize
+        self._entries = {}
+        self._counts = {}
+        # For each number of uses, the keys used that often, from least to most recently used.
+        self._buckets = {}
+        self._least = 0
+
+    def _use(self, key):
+        """
+        Count a use of a key in the cache.
+
+        Argument:
+            key (tuple): A key which is in the cache.
+        """
+
+        count = self._counts[key]
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._least == count:
+                self._least = count + 1
+        self._counts[key] = count + 1
+        self._buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def get(self, key, default=None):
+        """
+        Look up a value, counting a use of it.
+
+        Arguments:
+            key (tuple): The arguments of the operation.
+            default (object): What to return when there is no value for `key`.
+
+        Returns:
+            object: The value for `key`, or `default`.
+        """
+
+        if key not in self._entries:
+            return default
+        self._use(key)
+        return self._entries[key]
+
+    def __getitem__(self, key):
+        value = self._entries[key]
+        self._use(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self._entries:
+            self._entries[key] = value
+            self._use(key)
+            return
+        if self.maxsize <= 0:
+            return
+        if len(self._entries) >= self.maxsize:
+            bucket = self._buckets[self._least]
+            evicted, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self._buckets[self._least]
+            del self._entries[evicted]
+            del self._counts[evicted]
+        self._entries[key] = value
+        self._counts[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._least = 1
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self._counts.clear()
+        self._buckets.clear()
+        self._least = 0
+
+    def __str__(self):
+        return 'A least frequently used cache holding {} of at most {} values'.format(len(self), self.maxsize)
+
+
+class CacheBudget:
+    """
+    A memory budget shared by the `SizeBoundedCache`s drawing on it. Each live cache may hold an equal share of the
+    budget, and the share of each cache grows again as operations are discarded. Every cache is trimmed to its share
+    whenever it stores a value and whenever a new cache joins, so the total never exceeds the budget however many
+    operations are made.
+
+    Attributes:
+        max_bytes (int): The number of bytes to be shared.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        Create a budget.
+
+        Argument:
+            max_bytes (int): The number of bytes to be shared.
+        """
+
+        self.max_bytes = max_bytes
+        self._caches = WeakSet()
+
+    def register(self, cache):
+        """
+        Let a cache draw on the budget, trimming the caches already drawing on it to their smaller shares. The cache
+        stops counting once it is garbage collected.
+
+        Argument:
+            cache (SizeBoundedCache): The cache.
+        """
+
+        self._caches.add(cache)
+        self.trim()
+
+    def __len__(self):
+        """
+        Give the number of live caches drawing on the budget.
+
+        Returns:
+            int: The number of caches sharing the budget.
+        """
+
+        return len(self._caches)
+
+    @property
+    def share(self):
+        """
+        The number of bytes each cache may hold.
+        """
+
+        return self.max_bytes // max(1, len(self._caches))
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes held by all the caches together.
+        """
+
+        return sum(cache.nbytes for cache in list(self._caches))
+
+    def trim(self):
+        """
+        Evict values from every cache which is over its share.
+        """
+
+        for cache in list(self._caches):
+            cache.trim()
+
+    def __str__(self):
+        return 'A cache budget of {} bytes shared by {} caches, of which {} are in use'.format(
+            self.max_bytes, len(self), self.nbytes)
+
+
+class SizeBoundedCache(LRUCache):
+    """
+    A cache holding values up to a number of bytes, which evicts the least recently used values to make room for a new
+    one. The size of each entry is estimated by `entry_nbytes` when it is stored. The bound is either fixed or an equal
+    share of a `CacheBudget`.
+
+    Attributes:
+        nbytes (int): The estimated number of bytes held by the entries.
+    """
+
+    def __init__(self, max_bytes=None, budget=None, sizeof=entry_nbytes):
+        """
+        Create an empty cache.
+
+        Arguments:
+            max_bytes (int): The largest number of bytes held at once. Exactly one of this and `budget` should be given.
+            budget (CacheBudget): A budget to share with other caches.
+            sizeof (function): A function estimating the size in bytes of an entry from its key and value.
+        """
+
+        assert (max_bytes is None) != (budget is None)
+        LRUCache.__init__(self, None)
+        self.max_bytes = max_bytes
+        self.budget = budget
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self._sizes = {}
+        if budget is not None:
+            budget.register(self)
+
+    @property
+    def limit(self):
+        """
+        The number of bytes the cache may currently hold.
+        """
+
+        return self.max_bytes if self.budget is None else self.budget.share
+
+    def __setitem__(self, key, value):
+        nbytes = self.sizeof(key, value)
+        self.nbytes += nbytes - self._sizes.get(key, 0)
+        self._sizes[key] = nbytes
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self.trim()
+
+    def trim(self):
+        """
+        Evict the least recently used values until the cache is within its limit.
+        """
+
+        limit = self.limit
+        while self.nbytes > limit and self._entries:
+            key, _ = self._entries.popitem(last=False)
+            self.nbytes -= self._sizes.pop(key)
+
+    def clear(self):
+        LRUCache.clear(self)
+        self._sizes.clear()
+        self.nbytes = 0
+
+    def __str__(self):
+        return 'A size-bounded cache holding {} values in {} of at most {} bytes'.format(len(self), self.nbytes,
+                                                                                         self.limit)
+
+
+# Makes the cache of each memoized operation which is not given one, or is None when no policy has been chosen.
+_default_cache = None
+
+
+def set_default_cache(factory):
+    """
+    Choose the cache policy of the memoized operations made from now on which are not given caches of their own.
+
+    Argument:
+        factory (function): A function of no arguments returning a new, empty cache, such as `UnboundedCache` or
+            `lambda: LRUCache(1000)`. If this is None, each kind of operation goes back to its own default policy.
+    """
+
+    global _default_cache
+    _default_cache = factory
+
+
+def new_cache(default=UnboundedCache):
+    """
+    Make a cache according to the policy chosen with `set_default_cache`.
+
+    Argument:
+        default (function): A function of no arguments returning a new, empty cache, used when no policy has been
+            chosen. Operations keep every value by default, while composites, whose values are the most numerous in
+            training, use a bounded cache.
+
+    Returns:
+        object: A new, empty cache. This is made by `default` unless a policy has been chosen.
+    """
+
+    return (default if _default_cache is None else _default_cache)()
+
+
+def limit_cache_memory(max_bytes):
+    """
+    Bound the memory of the caches of all the memoized operations made from now on which are not given caches of their
+    own. They share a single budget, which is spread evenly across those which are alive at any time.
+
+    Argument:
+        max_bytes (int): The number of bytes all the caches together may hold.
+
+    Returns:
+        CacheBudget: The budget the caches share.
+    """
+
+    budget = CacheBudget(max_bytes)
+    set_default_cache(lambda: SizeBoundedCache(budget=budget))
+    return budget
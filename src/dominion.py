@@ -265,11 +265,10 @@ def random_adjacent_relation(relation):
     if random.randint(0, size * size - 1) == 0:
         return relation
 
-    # Otherwise, flip a random tuple.
+    # Otherwise, flip a random tuple. The neighbor shares the storage of the original relation.
     rand_tuple = (random.randint(0, size - 1), random.randint(0, size - 1))
-    rand_rel = Relation([rand_tuple], size, relation.arity)
 
-    return relation ^ rand_rel
+    return relation.flip(rand_tuple)
 
 
 # TODO: Fix
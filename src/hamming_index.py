@@ -0,0 +1,235 @@
+"""
+Nearest-neighbor search in the Hamming graph
+"""
+import random
+import numpy
+from relation_batch import POPCOUNT, RelationBatch, packed_row
+
+
+class HammingIndex:
+    """
+    An index of relations with the same universe and arity for finding those nearest to a given relation, where the
+    distance between two relations is the size of their symmetric difference. This is their distance in the Hamming
+    graph, and the distance averaged by `polymorphisms.hamming_loss`.
+
+    The relations are kept as packed rows, as in a `RelationBatch`, and indexed by bit-sampling locality-sensitive
+    hashing. Each of several tables samples a few positions at random and puts each relation in the bucket given by its
+    bits at those positions, so relations close to a query are likely to share a bucket with it in at least one table.
+    A query only looks at the relations in its buckets and ranks them by their exact distances. When the buckets hold
+    too few relations to answer a query, or when an exact answer is asked for, all the rows are scanned instead, which
+    is still vectorized.
+
+    Attributes:
+        relations (list of Relation): The indexed relations, in the order they were inserted.
+        universe_size (int): The number of elements in the universe of each relation.
+        arity (int): The arity of each relation.
+    """
+
+    def __init__(self, relations=(), universe_size=None, arity=None, tables=8, bits_per_key=16, seed=None):
+        """
+        Create an index.
+
+        Arguments:
+            relations (iterable of Relation): The relations to index to begin with.
+            universe_size (int): The universe size of the relations. This only needs to be given when `relations` might
+                be empty.
+            arity (int): The arity of the relations. This only needs to be given when `relations` might be empty.
+            tables (int): The number of hash tables. More tables find more of the near neighbors at the cost of larger
+                candidate sets.
+            bits_per_key (int): The number of positions sampled by each table. More bits make the buckets smaller and
+                more selective.
+            seed (int): A seed for choosing the sampled positions, so that an index can be rebuilt identically.
+        """
+
+        relations = list(relations)
+        if relations:
+            universe_size = relations[0].universe_size
+            arity = relations[0].arity
+        self.universe_size = universe_size
+        self.arity = arity
+        self.relations = []
+        positions = universe_size ** arity
+        generator = random.Random(seed)
+        samples = numpy.array([[generator.randrange(positions) for _ in range(bits_per_key)] for _ in range(tables)],
+                              dtype=numpy.int64).reshape(tables, bits_per_key)
+        # For each table, the bytes holding the sampled bits, the shifts bringing them down, and their place values.
+        self._sample_bytes = samples >> 3
+        self._sample_shifts = (samples & 7).astype(numpy.uint8)
+        self._place_values = numpy.uint64(1) << numpy.arange(bits_per_key, dtype=numpy.uint64)
+        self._buckets = [{} for _ in range(tables)]
+        self._rows = numpy.zeros((max(16, len(relations)), self.row_bytes), dtype=numpy.uint8)
+        self.extend(relations)
+
+    @property
+    def row_bytes(self):
+        """
+        The number of bytes in each packed row.
+        """
+
+        return (self.universe_size ** self.arity + 7) // 8
+
+    @property
+    def packed(self):
+        """
+        The packed rows of the indexed relations, as an array of `numpy.uint8` of shape `(len(self), row_bytes)`.
+        """
+
+        return self._rows[:len(self.relations)]
+
+    def __len__(self):
+        """
+        Give the number of relations in the index.
+
+        Returns:
+            int: The number of relations inserted so far.
+        """
+
+        return len(self.relations)
+
+    def __str__(self):
+        """
+        Display basic information about the index.
+
+        Returns:
+            str: Information about the number of relations in the index and their universe and arity.
+        """
+
+        return 'A Hamming index of {} relations on a universe of size {} of arity {}'.format(len(self),
+                                                                                           self.universe_size,
+                                                                                           self.arity)
+
+    def _keys(self, rows):
+        """
+        Find the bucket of each of some packed rows in each table.
+
+        Argument:
+            rows (numpy.ndarray): An array of `numpy.uint8` of shape `(N, row_bytes)`.
+
+        Returns:
+            numpy.ndarray: An array of `numpy.uint64` of shape `(tables, N)` holding the keys of the buckets.
+        """
+
+        bits = (rows[:, self._sample_bytes] >> self._sample_shifts) & 1
+        return numpy.moveaxis(bits.astype(numpy.uint64) @ self._place_values, 1, 0)
+
+    def insert(self, rel):
+        """
+        Add a relation to the index.
+
+        Argument:
+            rel (Relation): The relation to add. It must have the universe and arity of the index.
+        """
+
+        self.extend((rel,))
+
+    def extend(self, relations):
+        """
+        Add several relations to the index at once.
+
+        Argument:
+            relations (iterable of Relation | RelationBatch): The relations to add. They must have the universe and
+                arity of the index.
+        """
+
+        if isinstance(relations, RelationBatch):
+            assert relations.universe_size == self.universe_size and relations.arity == self.arity
+            rows = relations.packed
+            relations = relations.to_relations()
+        else:
+            relations = list(relations)
+            assert all(rel.universe_size == self.universe_size and rel.arity == self.arity for rel in relations)
+            rows = RelationBatch.from_relations(relations, self.universe_size, self.arity).packed
+        if not relations:
+            return
+        start = len(self.relations)
+        end = start + len(relations)
+        if end > len(self._rows):
+            # Grow the storage geometrically, so that inserting relations one at a time takes amortized constant time.
+            grown = numpy.zeros((max(end, 2 * len(self._rows)), self.row_bytes), dtype=numpy.uint8)
+            grown[:start] = self._rows[:start]
+            self._rows = grown
+        self._rows[start:end] = rows
+        self.relations.extend(relations)
+        for buckets, keys in zip(self._buckets, self._keys(rows).tolist()):
+            for index, key in enumerate(keys, start):
+                buckets.setdefault(key, []).append(index)
+
+    def distances(self, rel, indices=None):
+        """
+        Compute the exact distances from a relation to indexed relations.
+
+        Arguments:
+            rel (Relation): The relation to measure from.
+            indices (numpy.ndarray): The indices of the relations to measure to. All of them are used if this is not
+                given.
+
+        Returns:
+            numpy.ndarray: An array of `numpy.int64` holding the sizes of the symmetric differences.
+        """
+
+        rows = self.packed if indices is None else self._rows[indices]
+        return POPCOUNT[rows ^ packed_row(rel.bits, self.row_bytes)].sum(axis=1, dtype=numpy.int64)
+
+    def candidates(self, rel):
+        """
+        Find the indexed relations sharing a bucket with a relation in some table.
+
+        Argument:
+            rel (Relation): The query relation.
+
+        Returns:
+            numpy.ndarray: The indices of the candidates, in increasing order.
+        """
+
+        keys = self._keys(packed_row(rel.bits, self.row_bytes)[numpy.newaxis])[:, 0].tolist()
+        found = set()
+        for buckets, key in zip(self._buckets, keys):
+            found.update(buckets.get(key, ()))
+        return numpy.array(sorted(found), dtype=numpy.int64)
+
+    def nearest(self, rel, k=1, exact=False):
+        """
+        Find the indexed relations nearest to a relation.
+
+        Arguments:
+            rel (Relation): The query relation.
+            k (int): The number of neighbors to find.
+            exact (bool): Whether to scan every relation instead of only the candidates from the hash tables. Without
+                this, a neighbor which shares no bucket with `rel` may be missed.
+
+        Returns:
+            list of tuple: Up to `k` pairs of an indexed relation and its distance from `rel`, nearest first.
+        """
+
+        indices = None if exact else self.candidates(rel)
+        if indices is not None and len(indices) < k:
+            indices = None
+        distances = self.distances(rel, indices)
+        if indices is None:
+            indices = numpy.arange(len(self.relations))
+        k = min(k, len(distances))
+        if not k:
+            return []
+        nearest = numpy.argpartition(distances, k - 1)[:k]
+        nearest = nearest[numpy.argsort(distances[nearest], kind='stable')]
+        return [(self.relations[indices[i]], int(distances[i])) for i in nearest]
+
+    def within(self, rel, radius, exact=False):
+        """
+        Find the indexed relations within a given distance of a relation.
+
+        Arguments:
+            rel (Relation): The query relation.
+            radius (int): The largest distance allowed.
+            exact (bool): Whether to scan every relation instead of only the candidates from the hash tables. Without
+                this, a relation within `radius` which shares no bucket with `rel` may be missed.
+
+        Returns:
+            list of tuple: The pairs of an indexed relation within `radius` of `rel` and its distance, nearest first.
+        """
+
+        indices = numpy.arange(len(self.relations)) if exact else self.candidates(rel)
+        distances = self.distances(rel, indices)
+        close = numpy.flatnonzero(distances <= radius)
+        close = close[numpy.argsort(distances[close], kind='stable')]
+        return [(self.relations[indices[i]], int(distances[i])) for i in close]
@@ -3,8 +3,10 @@ Modified MNIST training set for binary image classification
 """
 import json
 from pathlib import Path
+import numpy
 from relations import Relation
-from itertools import product
+from relation_batch import RelationBatch
+from relation_store import RelationStore
 
 
 def import_mnist_data(data_type):
@@ -34,6 +36,27 @@ def import_mnist_data(data_type):
             yield cleaned_data
 
 
+def greyscale_to_array(image):
+    """
+    Convert a greyscale image from the MNIST training set to an array of greyscale values.
+
+    Argument:
+        image (dict): A dictionary representing a greyscale image as described in `import_mnist_data`.
+
+    Returns:
+        numpy.ndarray: An array of `numpy.uint8` of shape `(28, 28)` whose entry at a pair of coordinates is the
+            greyscale value of `image` there.
+    """
+
+    array = numpy.zeros((28, 28), dtype=numpy.uint8)
+    for val, coords in image.items():
+        # Each greyscale value is written to all of its coordinates at once.
+        if val != 'label' and coords:
+            coords = numpy.asarray(coords)
+            array[coords[:, 0], coords[:, 1]] = val
+    return array
+
+
 def greyscale_to_binary(image, cutoff=127):
     """
     Convert a greyscale image from the MNIST training set to a binary relation.
@@ -47,14 +70,49 @@ def greyscale_to_binary(image, cutoff=127):
             least as large as `cutoff`.
     """
 
-    pairs = []
-    for val in range(cutoff, 256):
-        if val in image:
-            pairs += image[val]
-    return Relation(pairs, 28)
+    return Relation.from_array(greyscale_to_array(image) >= cutoff)
+
+
+def mnist_greyscale_arrays(data_type):
+    """
+    Load a whole MNIST dataset as one array of greyscale images.
+
+    Argument:
+        data_type (str): Either 'train' or 'test', depending on which data one would like to load.
+
+    Returns:
+        tuple: An array of `numpy.uint8` of shape `(N, 28, 28)` holding the greyscale images, as in
+            `greyscale_to_array`, and an array of `numpy.int64` holding their labels.
+    """
+
+    images = []
+    labels = []
+    for dic in import_mnist_data(data_type):
+        images.append(greyscale_to_array(dic))
+        labels.append(dic['label'])
+    return numpy.array(images, dtype=numpy.uint8).reshape(-1, 28, 28), numpy.array(labels, dtype=numpy.int64)
+
+
+def mnist_binary_batch(data_type, cutoff=127):
+    """
+    Load a whole MNIST dataset as a batch of binary relations, which are thresholded and packed in single vectorized
+    calls rather than one image at a time.
+
+    Arguments:
+        data_type (str): Either 'train' or 'test', depending on which data one would like to load.
+        cutoff: Any pixel coordinates in a greyscale image which are over this value will be taken to be in the
+            corresponding relation.
 
+    Returns:
+        tuple: A `RelationBatch` of binary relations on a universe of size 28, one for each image in the dataset, and an
+            array of `numpy.int64` holding their labels.
+    """
 
-def mnist_binary_relations(data_type, cutoff=127):
+    images, labels = mnist_greyscale_arrays(data_type)
+    return RelationBatch.from_arrays(images >= cutoff), labels
+
+
+def mnist_binary_relations(data_type, cutoff=127, pool=None):
     """
     Create an iterator for binary relations coming from MNIST data.
 
@@ -62,6 +120,8 @@ def mnist_binary_relations(data_type, cutoff=127):
         data_type (str): Either 'train' or 'test', depending on which data one would like to examine.
         cutoff: Any pixel coordinates in a greyscale image which are over this value will be taken to be in the
             corresponding relation.
+        pool (RelationPool): If this is given, the relations will be interned in it, so that equal images are
+            represented by a single object.
 
     Yields:
         tuple: A binary relation corresponding to a greyscale image from an MNIST dataset and its corresponding integer
@@ -70,10 +130,39 @@ def mnist_binary_relations(data_type, cutoff=127):
 
     data = import_mnist_data(data_type)
     for dic in data:
-        yield greyscale_to_binary(dic, cutoff), dic['label']
+        rel = greyscale_to_binary(dic, cutoff)
+        if pool is not None:
+            rel = rel.intern(pool)
+        yield rel, dic['label']
+
+
+def mnist_relation_store(path, data_type, cutoff=127):
+    """
+    Write the binary relations coming from MNIST data to a labelled `RelationStore`, so that later runs can read them
+    from disk without parsing the JSON files. If the store already holds some of the images, for example because an
+    earlier run was interrupted, only the remaining ones are added.
 
+    Arguments:
+        path (str | os.PathLike): The location of the store.
+        data_type (str): Either 'train' or 'test', depending on which data one would like to convert.
+        cutoff: Any pixel coordinates in a greyscale image which are over this value will be taken to be in the
+            corresponding relation.
 
-def build_training_data(pairs, data_type, cutoff=127):
+    Returns:
+        RelationStore: The store, open for reading and appending.
+    """
+
+    store = RelationStore(path, 'a', 28, 2, labelled=True)
+    data = mnist_binary_relations(data_type, cutoff)
+    # Skip the images which are already in the store.
+    for _ in range(len(store)):
+        next(data)
+    store.extend(data)
+    store.flush()
+    return store
+
+
+def build_training_data(pairs, data_type, cutoff=127, pool=None):
     """
     Create an iterable of pairs for training or testing a discrete neural net using the MNIST datasets. Either the
     train data or the test data from MNIST may be used.
@@ -93,6 +182,8 @@ def build_training_data(pairs, data_type, cutoff=127):
         data_type (str): Either 'train' or 'test', depending on which data one would like to examine.
         cutoff: Any pixel coordinates in a greyscale image which are over this value will be taken to be in the
             corresponding relation.
+        pool (RelationPool): If this is given, all the relations produced will be interned in it. Since the same
+            images are substituted over and over, this can save a lot of memory and speeds up memoized operations.
 
     Yields:
         tuple: A pair whose first entry is a dictionary indicating that a tuple of binary relations is to be fed into a
@@ -104,9 +195,13 @@ def build_training_data(pairs, data_type, cutoff=127):
     # dynamically from the MNIST training data.
     substitution_dic = {i: None for i in range(10)}
     substitution_dic['Empty'] = Relation(tuple(), 28, 2)
-    substitution_dic['Full'] = Relation(product(range(28), repeat=2), 28)
+    # The full relation is the complement of the empty one, which is stored without listing all of its pairs.
+    substitution_dic['Full'] = ~substitution_dic['Empty']
+    if pool is not None:
+        substitution_dic['Empty'] = substitution_dic['Empty'].intern(pool)
+        substitution_dic['Full'] = substitution_dic['Full'].intern(pool)
     # Load the MNIST data
-    data = mnist_binary_relations(data_type, cutoff)
+    data = mnist_binary_relations(data_type, cutoff, pool)
     # Initialize the images corresponding to the digits.
     for i in range(10):
         # For each digit, we try to find a candidate image.
@@ -125,7 +220,7 @@ def build_training_data(pairs, data_type, cutoff=127):
             tuple(substitution_dic[pair[1][i]] for i in range(len(pair[1])))
 
 
-def binary_mnist_zero_one(quantity_of_zeroes, data_type, quantity_of_ones=None, cutoff=127):
+def binary_mnist_zero_one(quantity_of_zeroes, data_type, quantity_of_ones=None, cutoff=127, pool=None):
     """
     Create a data set for training a discrete neural net to recognize handwritten zeroes and ones. Zeroes are labeled
     with the empty relation and ones are labeled with the full relation.
@@ -136,6 +231,7 @@ def binary_mnist_zero_one(quantity_of_zeroes, data_type, quantity_of_ones=None,
         quantity_of_ones (int): The number of examples of handwritten ones to show.
         cutoff: Any pixel coordinates in a greyscale image which are over this value will be taken to be in the
             corresponding relation.
+        pool (RelationPool): If this is given, all the relations produced will be interned in it.
 
     Returns:
         iterable: An iterable of training data where handwritten zeroes and ones are mapped to full and empty relations.
@@ -146,4 +242,4 @@ def binary_mnist_zero_one(quantity_of_zeroes, data_type, quantity_of_ones=None,
         quantity_of_ones = quantity_of_zeroes
     pairs = [((0,), ('Full',)) for _ in range(quantity_of_zeroes)]
     pairs += [((1,), ('Empty',)) for _ in range(quantity_of_ones)]
-    return build_training_data(pairs, data_type, cutoff)
+    return build_training_data(pairs, data_type, cutoff, pool)
@@ -3,6 +3,8 @@ Discrete neural net
 """
 import random
 import numpy
+from operations import make_column, relation_batch
+from relation_batch import RelationBatch
 
 
 class Neuron:
@@ -66,6 +68,131 @@ def zero_one_loss(x, y):
     return 1-(x == y)
 
 
+def zero_one_loss_batch(x, y):
+    """
+    Compute the 0-1 loss for many pairs of tuples at once.
+
+    Arguments:
+        x (tuple of (numpy.ndarray | RelationBatch | list)): The columns of outputs from feeding forward through a
+            neural net, as given by `NeuralNet.feed_forward_batch`.
+        y (tuple of (numpy.ndarray | RelationBatch | list)): The columns of target outputs, such as
+            `TrainingColumns.outputs`.
+
+    Returns:
+        numpy.ndarray: The 0-1 loss of each pair, as a boolean array.
+    """
+
+    wrong = numpy.zeros(len(y[0]) if y else 0, dtype=numpy.bool_)
+    for (column, target) in zip(x, y):
+        wrong |= _mismatches(column, target)
+    return wrong
+
+
+# The loss functions which can be computed on whole columns, each with the function doing so.
+_batch_losses = {zero_one_loss: zero_one_loss_batch}
+
+
+def register_batch_loss(loss_func, batch_loss_func):
+    """
+    Let `NeuralNet.empirical_loss` compute a loss function on whole columns of outputs at once.
+
+    Arguments:
+        loss_func (function): The loss function of a pair of tuples.
+        batch_loss_func (function): A function computing `loss_func` for many pairs, taking columns of outputs and of
+            target outputs as `zero_one_loss_batch` does and returning a numpy array with the loss of each pair.
+    """
+
+    _batch_losses[loss_func] = batch_loss_func
+
+
+class TrainingColumns:
+    """
+    Training pairs stored as columns, with one column for each input variable and one for each output, so that a neural
+    net can be evaluated on all of them at once by `NeuralNet.feed_forward_batch`. Columns are made by
+    `operations.make_column`, so a column of numbers is a numpy array, a column of relations is a `RelationBatch`, and
+    any other column is a list. Iterating over the columns gives back the training pairs, so they can be used
+    anywhere training pairs are expected.
+
+    Attributes:
+        inputs (dict of str: numpy.ndarray | RelationBatch | list): The column of values of each input variable.
+        outputs (tuple of (numpy.ndarray | RelationBatch | list)): The column of target values of each output.
+    """
+
+    def __init__(self, training_pairs):
+        """
+        Gather training pairs into columns.
+
+        Argument:
+            training_pairs (iterable): Training pairs (x,y) where x is a dictionary of inputs and y is a tuple of
+                outputs. All the dictionaries should have the same keys, and all the tuples the same length.
+        """
+
+        training_pairs = tuple(training_pairs)
+        self._size = len(training_pairs)
+        names = tuple(training_pairs[0][0]) if training_pairs else ()
+        width = len(training_pairs[0][1]) if training_pairs else 0
+        self.inputs = {name: make_column([x[name] for (x, _) in training_pairs]) for name in names}
+        self.outputs = tuple(make_column([y[i] for (_, y) in training_pairs]) for i in range(width))
+
+    def __len__(self):
+        """
+        Give the number of training pairs.
+
+        Returns:
+            int: The length of each column.
+        """
+
+        return self._size
+
+    def __iter__(self):
+        """
+        Produce an iterator for the training pairs.
+
+        Yields:
+            tuple: A dictionary of inputs and a tuple of outputs.
+        """
+
+        names = tuple(self.inputs)
+        for i in range(self._size):
+            yield ({name: _entry(self.inputs[name], i) for name in names},
+                   tuple(_entry(column, i) for column in self.outputs))
+
+
+def _entry(column, i):
+    """
+    Read an entry of a column, as a Python object.
+
+    Arguments:
+        column (numpy.ndarray | RelationBatch | list): The column.
+        i (int): The index of the entry.
+
+    Returns:
+        object: The entry.
+    """
+
+    return column[i].item() if isinstance(column, numpy.ndarray) else column[i]
+
+
+def _mismatches(x, y):
+    """
+    Compare two columns entry by entry.
+
+    Arguments:
+        x (numpy.ndarray | RelationBatch | list): A column of outputs.
+        y (numpy.ndarray | RelationBatch | list): A column of target outputs of the same length.
+
+    Returns:
+        numpy.ndarray: A boolean array which is True where the columns disagree.
+    """
+
+    if isinstance(x, RelationBatch) or isinstance(y, RelationBatch):
+        # Two relations differ exactly when their packed rows do.
+        return (relation_batch(x).packed != relation_batch(y).packed).any(axis=1)
+    if isinstance(x, numpy.ndarray) and isinstance(y, numpy.ndarray):
+        return x != y
+    return numpy.array([a != b for (a, b) in zip(x, y)], dtype=numpy.bool_)
+
+
 class NeuralNet:
     """
     A (discrete) neural net.
@@ -106,13 +233,37 @@ class NeuralNet:
                 current_vals[neuron] = neuron.activation_func(*tup)
         return tuple(current_vals[neuron] for neuron in self.architecture[-1].neurons)
 
+    def feed_forward_batch(self, columns):
+        """
+        Feed many assignments of values forward through the neural net at once, using the `evaluate_batch` method of
+        each activation function.
+
+        Argument:
+            columns (dict of str: numpy.ndarray | list): The column of values of each variable, such as
+                `TrainingColumns.inputs`.
+
+        Returns:
+            tuple: The columns of values of each of the output layer neurons.
+        """
+
+        current_vals = dict(columns)
+        for layer in self.architecture[1:]:
+            for neuron in layer.neurons:
+                current_vals[neuron] = neuron.activation_func.evaluate_batch(
+                    *(current_vals[input_neuron] for input_neuron in neuron.inputs))
+        return tuple(current_vals[neuron] for neuron in self.architecture[-1].neurons)
+
     def empirical_loss(self, training_pairs, loss_func=zero_one_loss):
         """
         Calculate the current empirical loss of the neural net with respect to the training pairs and loss function.
 
+        When the training pairs are given as `TrainingColumns` and the loss function has a batch form, such as the 0-1
+        loss or `polymorphisms.hamming_loss`, the whole training set is fed forward at once by `feed_forward_batch`.
+        Other loss functions can be given batch forms with `register_batch_loss`.
+
         Argument:
-            training_pairs (iterable): Training pairs (x,y) where x is a dictionary of inputs and y is a tuple of
-                outputs.
+            training_pairs (iterable | TrainingColumns): Training pairs (x,y) where x is a dictionary of inputs and y is
+                a tuple of outputs.
             loss_func (function): The loss function to use for training. The default is the 0-1 loss.
 
         Returns:
@@ -120,6 +271,12 @@ class NeuralNet:
                 the training set and 1 being complete failure.
         """
 
+        batch_loss_func = _batch_losses.get(loss_func)
+        if isinstance(training_pairs, TrainingColumns) and batch_loss_func is not None:
+            if not len(training_pairs):
+                return numpy.average(())
+            outputs = self.feed_forward_batch(training_pairs.inputs)
+            return numpy.average(batch_loss_func(outputs, training_pairs.outputs))
         # Create a tuple of loss function values for each pair in our training set, then average them.
         return numpy.average(tuple(loss_func(self.feed_forward(x), y) for (x, y) in training_pairs))
 
@@ -0,0 +1,201 @@
+"""
+Instrumentation of operations
+"""
+from weakref import WeakKeyDictionary
+import operations
+
+
+class OperationStats:
+    """
+    Counters for the calls made to all the operations of one class.
+
+    Attributes:
+        name (str): The name of the class of operations.
+        calls (int): The number of calls, counting each call of `evaluate_batch` once.
+        hits (int): The number of lookups answered from a cache, including those of memoized composites.
+        misses (int): The number of lookups in a cache which did not find a value.
+        seconds (float): The time spent computing values, including the time spent in any operations called along the
+            way, such as the constituents of a composite.
+    """
+
+    def __init__(self, name):
+        """
+        Create empty counters.
+
+        Argument:
+            name (str): The name of the class of operations.
+        """
+
+        self.name = name
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.seconds = 0.0
+        # The caches the operations have looked values up in, so that their sizes can be found.
+        self._caches = WeakKeyDictionary()
+
+    @property
+    def hit_rate(self):
+        """
+        The proportion of the lookups in caches which found a value.
+        """
+
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def cache_size(self):
+        """
+        The number of values currently held in the caches of the live operations of the class. A cache shared by several
+        composites is only counted once.
+        """
+
+        caches = {id(cache): cache for cache in list(self._caches.values())}
+        return sum(len(cache) for cache in caches.values())
+
+    def __str__(self):
+        """
+        Display the counters.
+
+        Returns:
+            str: The counters on a single line.
+        """
+
+        return '{}: {} calls, {} hits, {} misses ({:.1%} hit rate), {:.6f} seconds, {} cached values'.format(
+            self.name, self.calls, self.hits, self.misses, self.hit_rate, self.seconds, self.cache_size)
+
+
+class StatsRegistry:
+    """
+    A collection of `OperationStats`, one for each class of operations which has been called, such as
+    `RotationAutomorphism`, `IndicatorPolymorphism`, or `Composite`. Operations made directly from `Operation` are
+    counted under that name.
+
+    The registry is told about calls by `operations.set_observer`, through the methods `called`, `looked_up`, and
+    `computed`.
+    """
+
+    def __init__(self):
+        """
+        Create an empty registry.
+        """
+
+        self._stats = {}
+
+    def stats(self, cls):
+        """
+        Find the counters for a class of operations, creating them if necessary.
+
+        Argument:
+            cls (type): A subclass of `Operation`.
+
+        Returns:
+            OperationStats: The counters for `cls`.
+        """
+
+        stats = self._stats.get(cls)
+        if stats is None:
+            stats = self._stats[cls] = OperationStats(cls.__name__)
+        return stats
+
+    def called(self, op):
+        self.stats(type(op)).calls += 1
+
+    def looked_up(self, op, cache, hit):
+        stats = self.stats(type(op))
+        if hit:
+            stats.hits += 1
+        else:
+            stats.misses += 1
+            stats._caches[op] = cache
+
+    def computed(self, op, seconds):
+        self.stats(type(op)).seconds += seconds
+
+    def __getitem__(self, name):
+        """
+        Look up the counters for a class of operations by name.
+
+        Argument:
+            name (str): The name of the class.
+
+        Returns:
+            OperationStats: The counters for the class.
+        """
+
+        for stats in self._stats.values():
+            if stats.name == name:
+                return stats
+        raise KeyError(name)
+
+    def __iter__(self):
+        """
+        Produce an iterator for the counters, from the class which spent the most time computing values to the least.
+
+        Returns:
+            iterator: The `OperationStats` in the registry.
+        """
+
+        return iter(sorted(self._stats.values(), key=lambda stats: stats.seconds, reverse=True))
+
+    def __len__(self):
+        return len(self._stats)
+
+    def reset(self):
+        """
+        Discard all the counters.
+        """
+
+        self._stats.clear()
+
+    def __str__(self):
+        """
+        Display the counters for every class.
+
+        Returns:
+            str: One line for each class of operations, the most expensive first.
+        """
+
+        return '\n'.join(str(stats) for stats in self)
+
+
+# The registry which `enable_stats` uses unless it is given another one.
+registry = StatsRegistry()
+
+
+def enable_stats(stats_registry=None):
+    """
+    Start recording the calls made to all operations, by making a registry the observer of `operations`. While the
+    instrumentation is disabled, each call only checks that there is no observer.
+
+    Argument:
+        stats_registry (StatsRegistry): The registry in which to record calls. The module-level `registry` is used if
+            this is not given.
+
+    Returns:
+        StatsRegistry: The registry in use.
+    """
+
+    if stats_registry is None:
+        stats_registry = registry
+    operations.set_observer(stats_registry)
+    return stats_registry
+
+
+def disable_stats():
+    """
+    Stop recording the calls made to operations. The counters gathered so far are kept.
+    """
+
+    operations.set_observer(None)
+
+
+def stats_enabled():
+    """
+    Check whether calls to operations are being recorded.
+
+    Returns:
+        bool: True when the instrumentation is enabled, False otherwise.
+    """
+
+    return operations._observer is not None
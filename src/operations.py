@@ -1,6 +1,96 @@
 """
 Operations for use as neural net activation functions
 """
+from time import perf_counter
+from weakref import WeakValueDictionary, ref
+import numpy
+from caches import LRUCache, new_cache
+from relation_batch import RelationBatch
+from relations import Relation
+
+# Marks a missing value in a cache, since None can be the value of an operation.
+_MISSING = object()
+# The largest number of values remembered by the cache of a composite, unless a cache policy has been chosen.
+COMPOSITE_CACHE_SIZE = 4096
+# The caches of composites, each in a `_SharedCache`, keyed by the specs of the composites sharing them. A cache is
+# dropped once no composite uses it.
+_composite_caches = WeakValueDictionary()
+# Is told about the calls made to operations while `operation_stats` is recording them, and is None otherwise.
+_observer = None
+
+
+def set_observer(observer):
+    """
+    Choose an object to be told about every call made to an operation, or stop telling anything about them.
+
+    Argument:
+        observer (object): None, or an object with the methods `called(op)`, called once for each call of an operation
+            or of its `evaluate_batch` method, `looked_up(op, cache, hit)`, called for each lookup in the cache of a
+            memoized operation or composite with whether it found the value, and `computed(op, seconds)`, called with
+            the time taken each time an operation computes a value or a column of values rather than looking it up.
+    """
+
+    global _observer
+    _observer = observer
+
+
+def column_entries(column):
+    """
+    Read the entries of a column of values, such as the arguments given to `Operation.evaluate_batch`.
+
+    Argument:
+        column (list | numpy.ndarray | RelationBatch): The column.
+
+    Returns:
+        list: The entries, with numbers as Python integers and the rows of a batch as `Relation`s.
+    """
+
+    if isinstance(column, numpy.ndarray):
+        return column.tolist()
+    return list(column)
+
+
+def make_column(values):
+    """
+    Gather values into a column. Integers make a numpy array and relations with the same universe and arity make a
+    `RelationBatch`, so that later operations can act on the whole column at once. Anything else is kept as a list.
+
+    Argument:
+        values (iterable): The values.
+
+    Returns:
+        numpy.ndarray | RelationBatch | list: The column holding `values`, in order.
+    """
+
+    values = list(values)
+    if not values:
+        return values
+    if all(isinstance(value, (int, numpy.integer)) for value in values):
+        try:
+            return numpy.array(values, dtype=numpy.int64)
+        except OverflowError:
+            return values
+    if all(isinstance(value, Relation) for value in values):
+        shape = (values[0].universe_size, values[0].arity)
+        if all((value.universe_size, value.arity) == shape for value in values):
+            return RelationBatch.from_relations(values)
+    return values
+
+
+def relation_batch(column):
+    """
+    Make sure a column of relations is a `RelationBatch`.
+
+    Argument:
+        column (RelationBatch | iterable of Relation): The column. The relations must have the same universe and arity.
+
+    Returns:
+        RelationBatch: The batch of the relations in `column`.
+    """
+
+    if isinstance(column, RelationBatch):
+        return column
+    return RelationBatch.from_relations(column)
 
 
 class Operation:
@@ -18,12 +108,13 @@ class Operation:
         value of the Operation when applied to some
             inputs.
         cache_values (bool): Whether to store already-computed values of the Operation in memory.
-        values (dict): If `cache_values` is True then this attribute will keep track of which input-output pairs have
-            already been computed for this Operation so that they may be reused. This can be replaced by another object
-            that can be indexed.
+        values (dict | LRUCache | LFUCache | SizeBoundedCache): If `cache_values` is True then this attribute will keep
+            track of which input-output pairs have already been computed for this Operation so that they may be reused.
+            Its policy for evicting values is chosen by `caches.set_default_cache` unless a cache is given. This can be
+            replaced by another object with the interface of a dictionary.
     """
 
-    def __init__(self, arity, func, cache_values=True):
+    def __init__(self, arity, func, cache_values=True, cache=None):
         """
         Create a finitary operation on a set.
 
@@ -34,13 +125,16 @@ class Operation:
             func (function): The function which is used to compute the output value of the Operation when applied to
                 some inputs. If the arity is 0, pass a constant, not a function, here.
             cache_values (bool): Whether to store already-computed values of the Operation in memory.
+            cache (dict | LRUCache | LFUCache | SizeBoundedCache): The cache to use when `cache_values` is True. If this
+                is not given, a new cache is made by `caches.new_cache`, which keeps every value unless another policy
+                has been chosen.
         """
 
         self.arity = arity
         self.func = func
         self.cache_values = cache_values
         if self.cache_values:
-            self.values = {}
+            self.values = new_cache() if cache is None else cache
 
     def __call__(self, *tup):
         """
@@ -51,11 +145,82 @@ class Operation:
         """
         if self.arity == 0:
             return self.func
+        if _observer is not None:
+            _observer.called(self)
         if self.cache_values:
-            if tup not in self.values:
-                self.values[tup] = self.func(*tup)
-            return self.values[tup]
-        return self.func(*tup)
+            # A single lookup both checks for the value and, for caches with an eviction policy, records its use.
+            value = self.values.get(tup, _MISSING)
+            if _observer is not None:
+                _observer.looked_up(self, self.values, value is not _MISSING)
+            if value is _MISSING:
+                value = self.func(*tup) if _observer is None else self._compute(self.func, tup)
+                self.values[tup] = value
+            return value
+        return self.func(*tup) if _observer is None else self._compute(self.func, tup)
+
+    def _compute(self, func, args):
+        """
+        Apply a function computing values of the Operation and tell the observer how long it took.
+
+        Arguments:
+            func (function): The function to apply, such as `self.func`.
+            args (tuple): The arguments to pass to `func`.
+
+        Returns:
+            object: The value of `func` at `args`.
+        """
+
+        start = perf_counter()
+        value = func(*args)
+        _observer.computed(self, perf_counter() - start)
+        return value
+
+    def evaluate_batch(self, *columns):
+        """
+        Compute the values of the Operation on many tuples of inputs at once. The inputs are given as columns, one for
+        each argument, whose entries at each index form a tuple of inputs. The work is done by `_evaluate_batch`.
+
+        Argument:
+            columns (tuple of (list | numpy.ndarray | RelationBatch)): The columns of inputs, all of the same length.
+
+        Returns:
+            numpy.ndarray | RelationBatch | list: The column of values.
+        """
+
+        if _observer is None:
+            return self._evaluate_batch(*columns)
+        _observer.called(self)
+        return self._compute(self._evaluate_batch, columns)
+
+    def _evaluate_batch(self, *columns):
+        """
+        Compute the values of the Operation on columns of inputs, as described in `evaluate_batch`. This calls the
+        Operation on each tuple in turn, so it uses and fills the cache like any other call. Subclasses which can act on
+        whole columns with numpy, such as the arithmetic operations and the polymorphisms of the Hamming graph, override
+        it.
+
+        Argument:
+            columns (tuple of (list | numpy.ndarray | RelationBatch)): The columns of inputs, all of the same length.
+
+        Returns:
+            numpy.ndarray | RelationBatch | list: The column of values, made by `make_column`.
+        """
+
+        assert self.arity > 0
+        assert len(columns) == self.arity
+        return make_column(self(*tup) for tup in zip(*map(column_entries, columns)))
+
+    def spec(self):
+        """
+        Describe the function computed by the operation, so that operations made separately can be recognized as the
+        same. Subclasses whose objects are determined by a few parameters override this.
+
+        Returns:
+            tuple: A hashable description such that operations with equal descriptions compute the same function, or
+                None when there is no such description, as for an operation made from an arbitrary function.
+        """
+
+        return None
 
     def __getitem__(self, ops):
         """
@@ -63,8 +228,10 @@ class Operation:
         arity k with k-many operations g_i of arity n is an n-ary operation f[g_1,...,g_k] where we evaluate as
         (f[g_1,...,g_k])(x_1,...,x_n)=f(g_1(x_1,...,x_n),...,g_k(x_1,...,x_n)).
 
-        Composite operations are not memoized, but if their constituent operations are memoized then the composite will
-        perform the appropriate lookups when called rather than recomputing those values from scratch.
+        Composite operations are not memoized unless asked to be, but if their constituent operations are memoized then
+        the composite will perform the appropriate lookups when called rather than recomputing those values from
+        scratch. A composite is compiled into a flat `Plan` the first time it is called, so composites nested to any
+        depth are evaluated without nested calls. See `Composite` for memoizing a composite on relations.
 
         Currently, this will not work when applied to a 0-ary operation.
 
@@ -73,7 +240,7 @@ class Operation:
                 should have length `self.arity` and all of its entries should have the same arities.
 
         Returns:
-            Operation: The result of composing the operations in question.
+            Composite: The result of composing the operations in question.
         """
 
         assert self.arity > 0
@@ -84,21 +251,271 @@ class Operation:
         arities = frozenset(op.arity for op in ops)
         assert len(arities) == 1
         new_arity = tuple(arities)[0]
+        return Composite(new_arity, self, ops)
+
+
+def _new_composite_cache():
+    """
+    Make the cache of a composite when no cache policy has been chosen.
+
+    Returns:
+        LRUCache: A cache holding at most `COMPOSITE_CACHE_SIZE` values.
+    """
+
+    return LRUCache(COMPOSITE_CACHE_SIZE)
+
+
+class _SharedCache:
+    """
+    A holder for a cache shared by several composites. Caches such as plain dictionaries cannot be referred to weakly,
+    so the registry of shared caches refers weakly to their holders instead, which the composites keep alive.
+
+    Attribute:
+        cache (object): The shared cache.
+    """
+
+    __slots__ = ('cache', '__weakref__')
+
+    def __init__(self, cache):
+        self.cache = cache
+
+
+class Composite(Operation):
+    """
+    A generalized composite of operations, as formed by `Operation.__getitem__`.
+
+    A composite is not memoized unless `memoize` is set. A memoized composite applied to relations remembers its values
+    in a cache keyed by the fingerprints of the arguments rather than by the arguments themselves, since equal relations
+    are often different objects. The cache is made by `caches.new_cache`, so it follows the policy chosen with
+    `caches.set_default_cache` or `caches.limit_cache_memory` like the caches of other operations, and otherwise holds
+    at most `COMPOSITE_CACHE_SIZE` values, evicting the least recently used. It is shared by all
+    the live composites with the same spec, so a composite rebuilt in the same way, for example by a later call to
+    `polymorphisms.polymorphism_neighbor_func`, finds the values computed by earlier ones. A composite containing an
+    operation with no spec keeps a cache of its own.
+
+    Attributes:
+        outer (Operation): The operation applied to the values of the inner operations.
+        inner (tuple of Operation): The operations applied to the arguments.
+        memoize (bool): Whether to remember the values of the composite on relations.
+    """
+
+    def __init__(self, arity, outer, inner, memoize=False):
+        """
+        Create a composite operation.
+
+        Arguments:
+            arity (int): The arity of the inner operations.
+            outer (Operation): The operation applied to the values of the inner operations.
+            inner (iterable of Operation): The operations applied to the arguments.
+            memoize (bool): Whether to remember the values of the composite on relations.
+        """
+
+        # Storing the bound method `self._evaluate` would make a reference cycle, which delays freeing the composite and
+        # so the removal of its shared cache from the registry.
+        composite = ref(self)
+        Operation.__init__(self, arity, lambda *tup: composite()._evaluate(*tup), cache_values=False)
+        self.outer = outer
+        self.inner = tuple(inner)
+        self.memoize = memoize
+        self._plan = None
+        self._spec = _MISSING
+        self._cache = None
+        self._shared = None
+
+    @property
+    def plan(self):
+        """
+        The flat `Plan` evaluating the composite, which is compiled when it is first needed.
+        """
+
+        if self._plan is None:
+            self._plan = Plan(self)
+        return self._plan
+
+    def spec(self):
+        """
+        Describe the composite by the specs of the steps of its plan and the slots they read. Since plans are compiled
+        in a fixed order, composites built in the same way from operations with equal specs have equal specs, and this
+        needs no recursion however deeply they are nested.
+
+        Returns:
+            tuple: A hashable description of the composite, or None if some operation in its plan has no spec.
+        """
+
+        if self._spec is _MISSING:
+            plan = self.plan
+            steps = tuple((op.spec(), arguments) for op, arguments in plan.steps)
+            if any(step_spec is None for step_spec, _ in steps):
+                self._spec = None
+            else:
+                self._spec = ('Composite', self.arity, steps, plan.output)
+        return self._spec
+
+    @property
+    def cache(self):
+        """
+        The cache of the values of the composite on relations, keyed by the fingerprints of the arguments. It is shared
+        with the live composites which have the same spec.
+        """
+
+        if self._cache is None:
+            spec = self.spec()
+            if spec is None:
+                self._cache = new_cache(_new_composite_cache)
+            else:
+                self._shared = _composite_caches.get(spec)
+                if self._shared is None:
+                    self._shared = _composite_caches[spec] = _SharedCache(new_cache(_new_composite_cache))
+                self._cache = self._shared.cache
+        return self._cache
+
+    def _evaluate_batch(self, *columns):
+        """
+        Evaluate the composite on columns of inputs by running its plan on whole columns.
+
+        Argument:
+            columns (tuple of (list | numpy.ndarray | RelationBatch)): The columns of inputs, all of the same length.
+
+        Returns:
+            numpy.ndarray | RelationBatch | list: The column of values.
+        """
+
+        assert len(columns) == self.arity
+        return self.plan.evaluate_batch(*columns)
+
+    def _evaluate(self, *tup):
+        """
+        Evaluate the composite operation, looking up its value first when the arguments are relations.
+
+        Args:
+            *tup: A tuple of arguments to the composite operation. The length of this should be the arity of the
+                composite.
 
-        def composite(*tup):
-            """
-            Evaluate the composite operation.
+        Returns:
+            object: The result of applying the generalized composite operation to the arguments.
+        """
+
+        if self._plan is None:
+            self._plan = Plan(self)
+        # Only relations have fingerprints which stay valid for as long as the cache does.
+        if not self.memoize or not all(isinstance(arg, Relation) for arg in tup):
+            return self._plan(*tup)
+        cache = self._cache if self._cache is not None else self.cache
+        key = tuple(arg.fingerprint for arg in tup)
+        value = cache.get(key, _MISSING)
+        if _observer is not None:
+            _observer.looked_up(self, cache, value is not _MISSING)
+        if value is _MISSING:
+            value = self._plan(*tup)
+            cache[key] = value
+        return value
 
-            Args:
-                *tup: A tuple of arguments to the composite operation. The length of this should be the arity of the
 
-            Returns:
-                object: The result of applying the generalized composite operation to the arguments.
-            """
+class Plan:
+    """
+    A flat program evaluating an operation built up from composites. Evaluating a composite directly would call its
+    outer operation on the values of its inner operations, each of which might be a composite in turn, so an operation
+    nested many times over would run through as many levels of calls. A plan instead lists the operations which do the
+    actual work in an order in which each comes after those whose values it needs, and runs through that list in a
+    single loop.
+
+    The values are kept in numbered slots. The first slots hold the arguments, and each step calls an operation on some
+    earlier slots and puts its value in the next slot. Projections and identities are resolved to the slots they pick
+    out rather than called, and an operation applied to the same slots in several places is only called once.
 
-            return self(*(op(*tup) for op in ops))
+    Attributes:
+        arity (int): The arity of the operation.
+        steps (tuple of tuple): The steps of the plan, each a pair of an operation and the slots of its arguments. The
+            value of step `i` is put in slot `arity + i`.
+        output (int): The slot holding the value of the operation.
+    """
 
-        return Operation(new_arity, composite, cache_values=False)
+    def __init__(self, op):
+        """
+        Compile an operation into a plan.
+
+        Argument:
+            op (Operation): The operation to compile, usually a `Composite`.
+        """
+
+        self.arity = op.arity
+        steps = []
+        # The slot holding the value of each operation applied to a tuple of slots.
+        slots = {}
+        # The operations are visited without recursion, so that deeply nested composites can be compiled. Each entry on
+        # the stack is an operation, the slots of its arguments, and for a composite, the slots of the values of its
+        # inner operations once they are known.
+        stack = [(op, tuple(range(op.arity)), None)]
+        while stack:
+            node, arguments, inner_slots = stack.pop()
+            key = (node, arguments)
+            if key in slots:
+                continue
+            if isinstance(node, Projection):
+                slots[key] = arguments[node.coordinate]
+            elif isinstance(node, Identity):
+                slots[key] = arguments[0]
+            elif not isinstance(node, Composite):
+                slots[key] = self.arity + len(steps)
+                steps.append((node, arguments))
+            elif inner_slots is None:
+                # The inner operations are compiled first, then the outer operation.
+                pending = [inner for inner in node.inner if (inner, arguments) not in slots]
+                if pending:
+                    stack.append((node, arguments, None))
+                    stack.extend((inner, arguments, None) for inner in pending)
+                else:
+                    inner_slots = tuple(slots[(inner, arguments)] for inner in node.inner)
+                    stack.append((node, arguments, inner_slots))
+                    if (node.outer, inner_slots) not in slots:
+                        stack.append((node.outer, inner_slots, None))
+            else:
+                slots[key] = slots[(node.outer, inner_slots)]
+        self.steps = tuple(steps)
+        self.output = slots[(op, tuple(range(op.arity)))]
+
+    def __len__(self):
+        """
+        Give the number of steps in the plan.
+
+        Returns:
+            int: The number of operations called when the plan is run.
+        """
+
+        return len(self.steps)
+
+    def __call__(self, *tup):
+        """
+        Run the plan.
+
+        Argument:
+            tup (tuple): The arguments of the operation.
+
+        Returns:
+            object: The value of the operation at `tup`.
+        """
+
+        values = list(tup)
+        for op, arguments in self.steps:
+            values.append(op(*[values[slot] for slot in arguments]))
+        return values[self.output]
+
+    def evaluate_batch(self, *columns):
+        """
+        Run the plan on whole columns, with each step handing the columns of its arguments to the `evaluate_batch`
+        method of its operation.
+
+        Argument:
+            columns (tuple of (list | numpy.ndarray | RelationBatch)): The columns of inputs, all of the same length.
+
+        Returns:
+            numpy.ndarray | RelationBatch | list: The column of values of the operation.
+        """
+
+        values = list(columns)
+        for op, arguments in self.steps:
+            values.append(op.evaluate_batch(*[values[slot] for slot in arguments]))
+        return values[self.output]
 
 
 class Identity(Operation):
@@ -109,6 +526,9 @@ class Identity(Operation):
     def __init__(self):
         Operation.__init__(self, 1, lambda *x: x[0], cache_values=False)
 
+    def spec(self):
+        return 'Identity',
+
 
 class Projection(Operation):
     """
@@ -117,6 +537,10 @@ class Projection(Operation):
 
     def __init__(self, arity, coordinate):
         Operation.__init__(self, arity, lambda *x: x[coordinate], cache_values=False)
+        self.coordinate = coordinate
+
+    def spec(self):
+        return 'Projection', self.arity, self.coordinate
 
 
 class Constant(Operation):
@@ -0,0 +1,421 @@
+"""
+Caches of operation values kept on disk across runs
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from hashlib import blake2b
+from caches import LRUCache
+from operations import Composite
+from relations import Relation
+
+# The types of arguments which can be written into a key, besides relations, which are written as their fingerprints.
+KEY_TYPES = (int, float, str, bytes, bool, type(None))
+# The number of uses of stored values to remember before recording them in the store.
+TOUCH_BATCH = 256
+# The proportion of its limit a store is brought down to when it goes over, so that values are not evicted on every
+# write.
+LOW_WATER = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memo (
+    op BLOB NOT NULL,
+    args BLOB NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (op, args)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS memo_used ON memo (used);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    nbytes INTEGER NOT NULL,
+    entries INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS memo_insert AFTER INSERT ON memo BEGIN
+    UPDATE totals SET nbytes = nbytes + NEW.size, entries = entries + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS memo_delete AFTER DELETE ON memo BEGIN
+    UPDATE totals SET nbytes = nbytes - OLD.size, entries = entries - 1;
+END;
+"""
+
+
+def _digest(obj):
+    """
+    Digest a description of an operation or of its arguments.
+
+    Argument:
+        obj (tuple): A tuple built from integers, strings, and other objects whose `repr` is the same in every run.
+
+    Returns:
+        bytes: A 16-byte digest of `repr(obj)`.
+    """
+
+    return blake2b(repr(obj).encode(), digest_size=16).digest()
+
+
+def argument_key(tup):
+    """
+    Describe a tuple of arguments in a way which is the same in every process and every run.
+
+    Argument:
+        tup (tuple): The arguments of an operation.
+
+    Returns:
+        bytes: A digest of the arguments, with relations replaced by their fingerprints, or None if some argument is
+            neither a relation nor a simple value.
+    """
+
+    entries = []
+    for arg in tup:
+        if isinstance(arg, Relation):
+            entries.append(arg.fingerprint)
+        elif isinstance(arg, KEY_TYPES):
+            entries.append(arg)
+        else:
+            return None
+    return _digest(tuple(entries))
+
+
+class PersistentStore:
+    """
+    A file holding the values of operations, shared by every run and every process which opens it. Values are stored
+    in an sqlite database keyed by the spec of the operation and the fingerprints of its arguments, so an experiment run
+    again with the same training set and the same constant relations finds the values computed the first time.
+
+    The database is in write-ahead logging mode, so any number of local processes can read from it while one writes,
+    and each process waits its turn to write rather than failing. Each process, and each process forked from it, opens
+    its own connection.
+
+    When the stored values take up more than `max_bytes`, the least recently used ones are removed. Uses of stored
+    values are recorded in batches, so the order of eviction is approximate.
+
+    Attributes:
+        path (str): The path of the database file.
+        max_bytes (int): The largest number of bytes of keys and values to keep, or None for no limit.
+    """
+
+    def __init__(self, path, max_bytes=None, timeout=30.0):
+        """
+        Open a store, creating the file if it does not exist.
+
+        Arguments:
+            path (str): The path of the database file.
+            max_bytes (int): The largest number of bytes of keys and values to keep. There is no limit if this is not
+                given.
+            timeout (float): The number of seconds to wait for another process to finish writing.
+        """
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._connection = None
+        self._pid = None
+        self._touched = {}
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executescript(_SCHEMA)
+
+    def _connect(self):
+        """
+        Get the connection of this process to the database, opening one if necessary.
+
+        Returns:
+            sqlite3.Connection: The connection.
+        """
+
+        if self._connection is None or self._pid != os.getpid():
+            # A connection inherited from the parent of a forked process must not be used, so it is simply dropped.
+            self._connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                               check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._pid = os.getpid()
+            self._touched = {}
+        return self._connection
+
+    def cache(self, spec, memory_size=1024):
+        """
+        Make a cache for an operation which reads and writes its values in the store.
+
+        Arguments:
+            spec (tuple): The spec of the operation, as given by `Operation.spec`.
+            memory_size (int): The number of values to keep in memory as well, so that repeated lookups do not go to
+                the file.
+
+        Returns:
+            PersistentCache: The cache for the operation.
+        """
+
+        return PersistentCache(self, spec, memory_size)
+
+    def load(self, op, args):
+        """
+        Look up a stored value.
+
+        Arguments:
+            op (bytes): The digest of the spec of the operation.
+            args (bytes): The digest of the arguments, as made by `argument_key`.
+
+        Returns:
+            bytes: The pickled value, or None if there is none.
+        """
+
+        with self._lock:
+            row = self._connect().execute('SELECT value FROM memo WHERE op = ? AND args = ?', (op, args)).fetchone()
+            if row is None:
+                return None
+            self._touched[(op, args)] = time.time()
+            if len(self._touched) >= TOUCH_BATCH:
+                self.flush()
+            return row[0]
+
+    def save(self, op, args, value):
+        """
+        Store a value, then evict values if the store is over its limit.
+
+        Arguments:
+            op (bytes): The digest of the spec of the operation.
+            args (bytes): The digest of the arguments, as made by `argument_key`.
+            value (bytes): The pickled value.
+        """
+
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute('INSERT INTO memo VALUES (?, ?, ?, ?, ?) ON CONFLICT (op, args) DO UPDATE SET '
+                                   'used = excluded.used', (op, args, value, len(op) + len(args) + len(value),
+                                                            time.time()))
+                self._evict(connection)
+
+    def _evict(self, connection):
+        """
+        Remove the least recently used values if the store is over its limit, bringing it down to `LOW_WATER` times its
+        limit. This is called inside a transaction.
+
+        Argument:
+            connection (sqlite3.Connection): The connection of this process.
+        """
+
+        if self.max_bytes is None:
+            return
+        nbytes = connection.execute('SELECT nbytes FROM totals').fetchone()[0]
+        if nbytes <= self.max_bytes:
+            return
+        # Remove the shortest run of least recently used values freeing enough bytes.
+        connection.execute('DELETE FROM memo WHERE (op, args) IN (SELECT op, args FROM (SELECT op, args, '
+                           'sum(size) OVER (ORDER BY used ROWS UNBOUNDED PRECEDING) - size AS freed FROM memo) '
+                           'WHERE freed < ?)',
+                           (nbytes - int(LOW_WATER * self.max_bytes),))
+
+    def flush(self):
+        """
+        Record the uses of stored values which have not been recorded yet, so that they are kept ahead of values used
+        less recently.
+        """
+
+        with self._lock:
+            if not self._touched:
+                return
+            touched = [(used, op, args) for ((op, args), used) in self._touched.items()]
+            self._touched = {}
+            connection = self._connect()
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.executemany('UPDATE memo SET used = max(used, ?) WHERE op = ? AND args = ?', touched)
+
+    def count(self, op):
+        """
+        Count the values stored for an operation.
+
+        Argument:
+            op (bytes): The digest of the spec of the operation.
+
+        Returns:
+            int: The number of values.
+        """
+
+        with self._lock:
+            return self._connect().execute('SELECT count(*) FROM memo WHERE op = ?', (op,)).fetchone()[0]
+
+    def discard(self, op):
+        """
+        Remove all the values stored for an operation.
+
+        Argument:
+            op (bytes): The digest of the spec of the operation.
+        """
+
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute('DELETE FROM memo WHERE op = ?', (op,))
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes of keys and values in the store.
+        """
+
+        with self._lock:
+            return self._connect().execute('SELECT nbytes FROM totals').fetchone()[0]
+
+    def __len__(self):
+        """
+        Give the number of values in the store.
+
+        Returns:
+            int: The number of values stored for all operations together.
+        """
+
+        with self._lock:
+            return self._connect().execute('SELECT entries FROM totals').fetchone()[0]
+
+    def clear(self):
+        """
+        Remove every stored value.
+        """
+
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute('DELETE FROM memo')
+            self._touched = {}
+
+    def close(self):
+        """
+        Record any pending uses and close the connection of this process. The store opens a new connection if it is
+        used again.
+        """
+
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self.flush()
+                self._connection.close()
+            self._connection = None
+
+    def __str__(self):
+        limit = 'no limit' if self.max_bytes is None else 'at most {} bytes'.format(self.max_bytes)
+        return 'A persistent store at {} holding {} values in {} bytes, with {}'.format(self.path, len(self),
+                                                                                      self.nbytes, limit)
+
+
+class PersistentCache:
+    """
+    The cache of a single operation in a `PersistentStore`. It can be used wherever a cache is expected, with the
+    interface of a dictionary restricted to `get`, `__getitem__`, `__setitem__`, `__contains__`, `__len__`, and
+    `clear`. The keys cannot be iterated over, since only their digests are stored.
+
+    Values are pickled, so they must be picklable, and arguments must be relations or simple values such as integers.
+    Values at other arguments are only kept in memory. Recently used values are kept in memory as well, in front of the
+    file.
+
+    Attributes:
+        store (PersistentStore): The store holding the values.
+        spec (tuple): The spec of the operation.
+        memory (LRUCache): The values kept in memory, keyed by the digests of their arguments.
+    """
+
+    def __init__(self, store, spec, memory_size=1024):
+        """
+        Create the cache of an operation.
+
+        Arguments:
+            store (PersistentStore): The store to hold the values.
+            spec (tuple): The spec of the operation. Operations without specs cannot share values across runs.
+            memory_size (int): The number of values to keep in memory as well.
+        """
+
+        assert spec is not None
+        self.store = store
+        self.spec = spec
+        self.memory = LRUCache(memory_size)
+        self._op = _digest(spec)
+        # The values at arguments which cannot be written into a key.
+        self._local = LRUCache(memory_size)
+
+    def get(self, key, default=None):
+        """
+        Look up a value, first in memory and then in the store.
+
+        Arguments:
+            key (tuple): The arguments of the operation.
+            default (object): What to return when there is no value for `key`.
+
+        Returns:
+            object: The value for `key`, or `default`.
+        """
+
+        args = argument_key(key)
+        if args is None:
+            return self._local.get(key, default)
+        if args in self.memory:
+            return self.memory[args]
+        value = self.store.load(self._op, args)
+        if value is None:
+            return default
+        value = pickle.loads(value)
+        self.memory[args] = value
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key, self)
+        if value is self:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        args = argument_key(key)
+        if args is None:
+            self._local[key] = value
+            return
+        self.memory[args] = value
+        self.store.save(self._op, args, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def __len__(self):
+        return self.store.count(self._op) + len(self._local)
+
+    def clear(self):
+        self.memory.clear()
+        self._local.clear()
+        self.store.discard(self._op)
+
+    def __str__(self):
+        return 'A persistent cache holding {} values, of which {} are in memory'.format(len(self), len(self.memory))
+
+
+def persist(op, store, memory_size=1024):
+    """
+    Make an operation keep its values in a persistent store. A composite keeps its values on relations there, and any
+    other operation is memoized there on all its arguments.
+
+    Arguments:
+        op (Operation): The operation. It must have a spec.
+        store (PersistentStore): The store to hold the values.
+        memory_size (int): The number of values to keep in memory as well.
+
+    Returns:
+        Operation: The operation itself, so that this can be used where the operation is made.
+    """
+
+    cache = store.cache(op.spec(), memory_size)
+    if isinstance(op, Composite):
+        # A composite looks its values up by the fingerprints of its arguments, which are keys of the same kind.
+        op.memoize = True
+        op._cache = cache
+    else:
+        op.cache_values = True
+        op.values = cache
+    return op
@@ -2,23 +2,28 @@
 Polymorphisms
 """
 from relations import Relation
-from operations import Operation, Projection
+from array_relations import ArrayRelation
+from operations import Operation, Projection, relation_batch
+from relation_batch import RelationBatch
+from neural_net import register_batch_loss
 import random
 import numpy
 
 
-def quarter_turn(rel):
+def quarter_turn(rel, k=1):
     """
-    Rotate a binary relation by a quarter turn counterclockwise.
+    Rotate a binary relation by quarter turns counterclockwise. The pair (i, j) is sent to (universe_size - 1 - j, i)
+    by each quarter turn, which is how numpy rotates the boolean array of the relation.
 
     Args:
         rel (Relation): The binary relation to be rotated.
+        k (int): The number of quarter turns.
 
     Returns:
-        Relation: The same relation rotated by a quarter turn counterclockwise.
+        Relation: The same relation rotated by `k` quarter turns counterclockwise.
     """
 
-    return Relation(((rel.universe_size - tup[1], tup[0]) for tup in rel), rel.universe_size, rel.arity)
+    return Relation.from_array(numpy.rot90(rel.to_array(), k))
 
 
 class RotationAutomorphism(Operation):
@@ -34,12 +39,27 @@ class RotationAutomorphism(Operation):
             k (int): The number of quarter turns by which to rotate the image counterclockwise.
         """
 
-        def func(x):
-            for _ in range(k % 4):
-                x = quarter_turn(x)
-            return x
+        Operation.__init__(self, 1, func=lambda x: quarter_turn(x, k % 4))
+        self.k = k % 4
 
-        Operation.__init__(self, 1, func=func)
+    def spec(self):
+        return 'RotationAutomorphism', self.k
+
+    def _evaluate_batch(self, *columns):
+        """
+        Rotate a whole column of binary relations at once, as a stack of boolean arrays.
+
+        Argument:
+            columns (tuple of (RelationBatch | list of Relation)): The single column of binary relations.
+
+        Returns:
+            RelationBatch: The rotated relations.
+        """
+
+        assert len(columns) == 1
+        # Turning an array a quarter turn counterclockwise sends the entry at (i, j) to (universe_size - 1 - j, i), as
+        # `quarter_turn` does.
+        return RelationBatch.from_arrays(numpy.rot90(relation_batch(columns[0]).to_arrays(), self.k, axes=(1, 2)))
 
 
 class ReflectionAutomorphism(Operation):
@@ -52,8 +72,85 @@ class ReflectionAutomorphism(Operation):
         Create a reflection automorphism.
         """
 
-        Operation.__init__(self, 1, lambda rel: Relation(((rel.universe_size - tup[0], tup[1]) for tup in rel),
-                                                         rel.universe_size, rel.arity))
+        # The pair (i, j) is sent to (universe_size - 1 - i, j).
+        Operation.__init__(self, 1, lambda rel: Relation.from_array(numpy.flip(rel.to_array(), 0)))
+
+    def spec(self):
+        return 'ReflectionAutomorphism',
+
+    def _evaluate_batch(self, *columns):
+        """
+        Reflect a whole column of binary relations at once, as a stack of boolean arrays.
+
+        Argument:
+            columns (tuple of (RelationBatch | list of Relation)): The single column of binary relations.
+
+        Returns:
+            RelationBatch: The reflected relations.
+        """
+
+        assert len(columns) == 1
+        return RelationBatch.from_arrays(numpy.flip(relation_batch(columns[0]).to_arrays(), axis=1))
+
+
+class HyperoctahedralAutomorphism(Operation):
+    """
+    An automorphism of the Hamming graph obtained by applying a symmetry of the cube to an image of any arity. Each
+    symmetry permutes the coordinates of the tuples and then reflects some of them, so these include the rotations and
+    reflections of binary images as well as those of voxel images.
+    """
+
+    def __init__(self, permutation, reflections=()):
+        """
+        Create a hyperoctahedral automorphism.
+
+        Arguments:
+            permutation (iterable of int): A rearrangement of `range(arity)`. Coordinate `i` of each tuple in the image
+                is coordinate `permutation[i]` of the corresponding tuple in the argument.
+            reflections (iterable of int): The coordinates to reflect after permuting.
+        """
+
+        self.permutation = tuple(permutation)
+        self.reflections = tuple(reflections)
+
+        def func(rel):
+            return ArrayRelation.from_relation(rel).permute_axes(self.permutation).reflect(self.reflections)
+
+        Operation.__init__(self, 1, func=func)
+
+    def spec(self):
+        return 'HyperoctahedralAutomorphism', self.permutation, self.reflections
+
+    def _evaluate_batch(self, *columns):
+        """
+        Apply the symmetry to a whole column of relations at once, as a stack of boolean arrays.
+
+        Argument:
+            columns (tuple of (RelationBatch | list of Relation)): The single column of relations.
+
+        Returns:
+            RelationBatch: The images of the relations.
+        """
+
+        assert len(columns) == 1
+        # The first axis of the stack indexes the relations, so the axes of each relation are shifted by one.
+        arrays = numpy.transpose(relation_batch(columns[0]).to_arrays(), (0,) + tuple(i + 1 for i in self.permutation))
+        return RelationBatch.from_arrays(numpy.flip(arrays, tuple(i + 1 for i in self.reflections)))
+
+    @classmethod
+    def random(cls, arity):
+        """
+        Choose a hyperoctahedral automorphism uniformly at random.
+
+        Argument:
+            arity (int): The arity of the relations the automorphism will be applied to.
+
+        Returns:
+            HyperoctahedralAutomorphism: A random symmetry of the cube of dimension `arity`.
+        """
+
+        permutation = random.sample(range(arity), arity)
+        return cls(permutation, tuple(axis for axis in range(arity) if random.getrandbits(1)))
 
 
 class SwappingAutomorphism(Operation):
@@ -71,6 +168,29 @@ class SwappingAutomorphism(Operation):
         """
 
         Operation.__init__(self, 1, lambda a: a ^ b)
+        self.b = b
+
+    def spec(self):
+        # The fixed relation is described by its fingerprint. Expressions have none, so they give no spec.
+        if not isinstance(self.b, Relation):
+            return None
+        return 'SwappingAutomorphism', self.b.fingerprint
+
+    def _evaluate_batch(self, *columns):
+        """
+        Take the symmetric difference of a whole column of relations with the fixed relation.
+
+        Argument:
+            columns (tuple of (RelationBatch | list of Relation)): The single column of relations.
+
+        Returns:
+            RelationBatch: The symmetric differences.
+        """
+
+        assert len(columns) == 1
+        if not isinstance(self.b, Relation):
+            return Operation._evaluate_batch(self, *columns)
+        return relation_batch(columns[0]) ^ self.b
 
 
 class BlankingEndomorphism(Operation):
@@ -87,6 +207,28 @@ class BlankingEndomorphism(Operation):
         """
 
         Operation.__init__(self, 1, lambda a: a & b)
+        self.b = b
+
+    def spec(self):
+        if not isinstance(self.b, Relation):
+            return None
+        return 'BlankingEndomorphism', self.b.fingerprint
+
+    def _evaluate_batch(self, *columns):
+        """
+        Intersect a whole column of relations with the fixed relation.
+
+        Argument:
+            columns (tuple of (RelationBatch | list of Relation)): The single column of relations.
+
+        Returns:
+            RelationBatch: The intersections.
+        """
+
+        assert len(columns) == 1
+        if not isinstance(self.b, Relation):
+            return Operation._evaluate_batch(self, *columns)
+        return relation_batch(columns[0]) & self.b
 
 
 def indicator_polymorphism(tup, a, b):
@@ -107,9 +249,9 @@ def indicator_polymorphism(tup, a, b):
     a = tuple(a)
     universe_size = a[0].universe_size
     if all(rel[0].dot(rel[1]) for rel in zip(a, b)):
-        return Relation((tup,), universe_size)
+        return Relation.from_frozenset(frozenset((tup,)), universe_size, len(tup))
     else:
-        return Relation(tuple(), universe_size, len(tup))
+        return Relation.from_bits(0, universe_size, len(tup))
 
 
 class IndicatorPolymorphism(Operation):
@@ -117,7 +259,7 @@ class IndicatorPolymorphism(Operation):
     Create a polymorphism of the Hamming graph by taking dot products with fixed relations.
     """
 
-    def __init__(self, tup, b):
+    def __init__(self, tup, b, gram_engine=None):
         """
         Create an indicator polymorphism where the output is either an empty relation or a relation containing a single
         tuple.
@@ -126,16 +268,64 @@ class IndicatorPolymorphism(Operation):
             tup (tuple of int): The single tuple in question.
             b (iterable of Relation): A sequence of Relations with which dot products are to be taken, thought of as
             constants. Should contain at least one entry.
+            gram_engine (ParityGramEngine): An engine whose bank of constants contains the members of `b`. When this is
+                given the dot products of the inputs primed in the engine are looked up there rather than being taken
+                one at a time.
         """
 
-        Operation.__init__(self, len(b), lambda *a: indicator_polymorphism(tup, a, b))
+        if gram_engine is None:
+            Operation.__init__(self, len(b), lambda *a: indicator_polymorphism(tup, a, b))
+        else:
+            columns = tuple(gram_engine.column(rel) for rel in b)
 
+            def func(*a):
+                if all(gram_engine.dot(rel, column) for (rel, column) in zip(a, columns)):
+                    return Relation.from_frozenset(frozenset((tup,)), a[0].universe_size, len(tup))
+                return Relation.from_bits(0, a[0].universe_size, len(tup))
 
-def polymorphism_neighbor_func(op, num_of_neighbors, constant_relations, use_dominions=False):
+            Operation.__init__(self, len(b), func)
+        self.tup = tuple(tup)
+        self.b = tuple(b)
+
+    def spec(self):
+        # The engine only changes how the dot products are found, not the function computed.
+        return 'IndicatorPolymorphism', self.tup, tuple(rel.fingerprint for rel in self.b)
+
+    def _evaluate_batch(self, *columns):
+        """
+        Evaluate the indicator polymorphism on columns of relations, taking the dot products of each column with its
+        constant all at once.
+
+        Argument:
+            columns (tuple of (RelationBatch | list of Relation)): One column of relations for each argument.
+
+        Returns:
+            RelationBatch: The relations which contain `self.tup` exactly where every dot product is 1, and are empty
+                elsewhere.
+        """
+
+        assert len(columns) == self.arity
+        batches = tuple(relation_batch(column) for column in columns)
+        hits = numpy.ones(len(batches[0]), dtype=numpy.bool_)
+        for (batch, rel) in zip(batches, self.b):
+            hits &= batch.dot(rel).astype(numpy.bool_)
+        universe_size = batches[0].universe_size
+        # The position of the tuple in the packed rows, as in `Relation._position`.
+        position = 0
+        for entry in self.tup:
+            position = position * universe_size + entry
+        output = RelationBatch(numpy.zeros((len(hits), (universe_size ** len(self.tup) + 7) // 8), dtype=numpy.uint8),
+                               universe_size, len(self.tup))
+        output.packed[hits, position >> 3] = 1 << (position & 7)
+        return output
+
+
+def polymorphism_neighbor_func(op, num_of_neighbors, constant_relations, use_dominions=False, gram_engine=None):
     """
-    Find the neighbors of a given polymorphism of the Hamming graph. Currently, this assumes relations are all binary.
-    There is also an implicit assumption here that dominion polymorphisms should be binary operations. This could be
-    changed as well, but likely is not necessary.
+    Find the neighbors of a given polymorphism of the Hamming graph. Binary relations are rotated and reflected as
+    images, while relations of other arities use the symmetries of the corresponding cube. There is also an implicit
+    assumption here that dominion polymorphisms should be binary operations. This could be changed as well, but likely
+    is not necessary.
 
     Arguments:
         op (Operation): A Hamming graph polymorphism operation.
@@ -144,19 +334,28 @@ def polymorphism_neighbor_func(op, num_of_neighbors, constant_relations, use_dom
             nonzero length.
         use_dominions (bool): Whether to use dominion polymorphisms. Set the False by default until these are
             working.
+        gram_engine (ParityGramEngine): An engine whose bank of constants is `constant_relations`. If this is given, the
+            indicator polymorphisms produced will look up their dot products in it. The engine should be primed with
+            the training inputs and reused across training steps, so that their dot products are only computed once.
 
     Yields:
-        Operation: A neighboring operation to the given one.
+        Operation: A neighboring operation to the given one. Neighbors made by twisting `op` with endomorphisms are
+            memoized composites; see `operations.Composite`.
     """
 
-    endomorphisms = []
-    endomorphisms += [RotationAutomorphism(k) for k in range(4)]
-    endomorphisms.append(ReflectionAutomorphism())
-    endomorphisms.append('Swapping')
-    endomorphisms.append('Blanking')
     constant_relations = tuple(constant_relations)
     universe_size = constant_relations[0].universe_size
     arity = constant_relations[0].arity
+    endomorphisms = []
+    if arity == 2:
+        endomorphisms += [RotationAutomorphism(k) for k in range(4)]
+        endomorphisms.append(ReflectionAutomorphism())
+    else:
+        # Relations of other arities use the symmetries of the cube of that dimension, which are applied to boolean
+        # arrays all at once.
+        endomorphisms += [HyperoctahedralAutomorphism.random(arity) for _ in range(5)]
+    endomorphisms.append('Swapping')
+    endomorphisms.append('Blanking')
     yield op
     for _ in range(num_of_neighbors):
         twist = random.choice((0, 1))
@@ -169,7 +368,10 @@ def polymorphism_neighbor_func(op, num_of_neighbors, constant_relations, use_dom
                     endomorphisms_to_use[i] = SwappingAutomorphism(random.choice(constant_relations))
             for i in range(len(endomorphisms_to_use)-1):
                 endomorphisms_to_use[i] = endomorphisms_to_use[i][Projection(op.arity, i)]
-            yield endomorphisms_to_use[-1][op[endomorphisms_to_use[:-1]]]
+            neighbor = endomorphisms_to_use[-1][op[endomorphisms_to_use[:-1]]]
+            # Twisted neighbors are memoized, so one rebuilt by a later call finds the values computed by this one.
+            neighbor.memoize = True
+            yield neighbor
         else:
             if op.arity == 1:
                 random_endomorphism = random.choice(endomorphisms)
@@ -186,7 +388,7 @@ def polymorphism_neighbor_func(op, num_of_neighbors, constant_relations, use_dom
                     # The universe size and relation arity for the indicator polymorphisms is read off from the
                     # `constant_relations`.
                     yield IndicatorPolymorphism(tuple(random.randrange(universe_size) for _ in range(arity)),
-                                                random.choices(constant_relations, k=op.arity))
+                                                random.choices(constant_relations, k=op.arity), gram_engine)
 
 
 def hamming_loss(x, y):
@@ -204,4 +406,26 @@ def hamming_loss(x, y):
         numpy.float64: The average size of the symmetric difference of corresponding pairs of relations in `x` and `y`.
     """
 
-    return numpy.average(tuple(len(rel0 ^ rel1) for (rel0, rel1) in zip(x, y)))
+    return numpy.average(tuple(rel0.symmetric_difference_size(rel1) for (rel0, rel1) in zip(x, y)))
+
+
+def hamming_loss_batch(x, y):
+    """
+    Compute the Hamming loss for many pairs of sequences of relations at once, as the popcounts of the packed rows of
+    the symmetric differences of whole columns of relations.
+
+    Args:
+        x (tuple of (RelationBatch | list of Relation)): The columns of outputs from feeding forward through a neural
+            net, as given by `NeuralNet.feed_forward_batch`.
+        y (tuple of (RelationBatch | list of Relation)): The columns of target outputs, such as
+            `TrainingColumns.outputs`.
+
+    Returns:
+        numpy.ndarray: The value of `hamming_loss` for each pair.
+    """
+
+    return numpy.average([(relation_batch(column) ^ relation_batch(target)).cardinalities()
+                          for (column, target) in zip(x, y)], axis=0)
+
+
+register_batch_loss(hamming_loss, hamming_loss_batch)
@@ -0,0 +1,559 @@
+"""
+Batches of relations stored as packed bit arrays
+"""
+import numpy
+from caches import LRUCache
+from relations import Relation
+
+# The number of set bits in each possible byte, used to count the tuples in packed rows.
+POPCOUNT = numpy.array([bin(byte).count('1') for byte in range(256)], dtype=numpy.uint8)
+# The parity of the number of set bits in each possible byte.
+PARITY = POPCOUNT & 1
+# The number of bytes of intermediate results `parity_gram` may hold at once.
+GRAM_CHUNK_BYTES = 1 << 25
+# The number of inputs whose dot products a `ParityGramEngine` remembers by default.
+ENGINE_ROWS = 1 << 16
+
+
+def packed_row(bits, row_bytes):
+    """
+    Convert the packed representation of a relation to a row of packed bytes.
+
+    Arguments:
+        bits (int): The packed representation of a relation, as in `Relation.bits`.
+        row_bytes (int): The number of bytes in a row. This should be enough to hold `universe_size ** arity` bits.
+
+    Returns:
+        numpy.ndarray: A one-dimensional array of `numpy.uint8` whose bits, read from the least significant bit of each
+            byte, are the bits of `bits`.
+    """
+
+    return numpy.frombuffer(bits.to_bytes(row_bytes, 'little'), dtype=numpy.uint8)
+
+
+class RelationBatch:
+    """
+    A sequence of relations of the same universe and arity, stored together as a two-dimensional array of packed bits.
+    Row `i` of the array holds the bits of the `i`th relation in the same order as `Relation.bits`, eight to a byte with
+    the least significant bit of each byte first. The padding bits at the end of each row are always zero.
+
+    The set operations for relations are available for batches as well. They act row by row, either between two batches
+    of the same length or between a batch and a single `Relation`, which is broadcast against every row.
+
+    Attributes:
+        packed (numpy.ndarray): An array of `numpy.uint8` of shape `(len(self), row_bytes)` holding the packed rows.
+        universe_size (int): The number of elements in the universe of each relation.
+        arity (int): The arity of each relation.
+    """
+
+    def __init__(self, packed, universe_size, arity):
+        """
+        Create a batch of relations from an array of packed rows.
+
+        Arguments:
+            packed (numpy.ndarray): An array of `numpy.uint8` of shape `(N, ceil(universe_size ** arity / 8))` holding
+                the packed rows. The padding bits at the end of each row must be zero.
+            universe_size (int): The number of elements in the universe of each relation.
+            arity (int): The arity of each relation.
+        """
+
+        self._universe_size = universe_size
+        self._arity = arity
+        self.packed = numpy.asarray(packed, dtype=numpy.uint8).reshape(-1, self.row_bytes)
+
+    @classmethod
+    def from_relations(cls, relations, universe_size=None, arity=None):
+        """
+        Pack a sequence of relations into a batch.
+
+        Arguments:
+            relations (iterable of Relation): The relations to pack. These should all have the same universe and arity.
+            universe_size (int): The universe size of the relations. This only needs to be given when `relations` might
+                be empty.
+            arity (int): The arity of the relations. This only needs to be given when `relations` might be empty.
+
+        Returns:
+            RelationBatch: The batch whose rows are the given relations, in order.
+        """
+
+        relations = tuple(relations)
+        if relations:
+            universe_size = relations[0].universe_size
+            arity = relations[0].arity
+        assert all(rel.universe_size == universe_size and rel.arity == arity for rel in relations)
+        row_bytes = (universe_size ** arity + 7) // 8
+        packed = numpy.frombuffer(b''.join(rel.bits.to_bytes(row_bytes, 'little') for rel in relations),
+                                  dtype=numpy.uint8)
+        return cls(packed, universe_size, arity)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Pack a stack of boolean arrays into a batch, such as a dataset of binary images, in a single vectorized call.
+
+        Argument:
+            arrays (numpy.ndarray): An array of shape `(N,) + (universe_size,) * arity` whose `i`th entry describes the
+                `i`th relation as in `Relation.from_array`.
+
+        Returns:
+            RelationBatch: The batch whose rows are the relations described by `arrays`, in order.
+        """
+
+        arrays = numpy.asarray(arrays, dtype=numpy.bool_)
+        assert arrays.ndim >= 1 and len(set(arrays.shape[1:])) <= 1
+        universe_size = arrays.shape[1] if arrays.ndim > 1 else 1
+        packed = numpy.packbits(arrays.reshape(len(arrays), -1), axis=1, bitorder='little')
+        return cls(packed, universe_size, arrays.ndim - 1)
+
+    def to_arrays(self):
+        """
+        Unpack the batch into a stack of boolean arrays. This is the inverse of `from_arrays`.
+
+        Returns:
+            numpy.ndarray: An array of shape `(len(self),) + (universe_size,) * arity` whose `i`th entry is the array
+                describing the `i`th relation, as in `Relation.to_array`.
+        """
+
+        positions = self.universe_size ** self.arity
+        return numpy.unpackbits(self.packed, axis=1, count=positions, bitorder='little').view(numpy.bool_).reshape(
+            (len(self),) + (self.universe_size,) * self.arity)
+
+    @property
+    def universe_size(self):
+        return self._universe_size
+
+    @property
+    def arity(self):
+        return self._arity
+
+    @property
+    def row_bytes(self):
+        """
+        The number of bytes in each packed row.
+        """
+
+        return (self.universe_size ** self.arity + 7) // 8
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes taken up by the packed rows.
+        """
+
+        return self.packed.nbytes
+
+    def __reduce_ex__(self, protocol):
+        """
+        Prepare the batch for pickling. The packed array pickles itself, so with protocol 5 all the rows can be sent out
+        of band as one buffer without copying.
+
+        Argument:
+            protocol (int): The pickle protocol in use.
+
+        Returns:
+            tuple: The class and the arguments to its constructor.
+        """
+
+        return type(self), (self.packed, self.universe_size, self.arity)
+
+    def to_relations(self):
+        """
+        Unpack the batch into individual relations.
+
+        Returns:
+            list of Relation: The relations in the batch, in order.
+        """
+
+        return list(self)
+
+    def __len__(self):
+        """
+        Give the number of relations in the batch.
+
+        Returns:
+            int: The number of rows of `self.packed`.
+        """
+
+        return self.packed.shape[0]
+
+    def __getitem__(self, index):
+        """
+        Retrieve a relation or a sub-batch.
+
+        Argument:
+            index (int | slice | numpy.ndarray): Either the index of a single relation or anything that numpy accepts
+                for selecting rows of an array.
+
+        Returns:
+            Relation | RelationBatch: A single relation when `index` is an integer and a batch otherwise.
+        """
+
+        if isinstance(index, (int, numpy.integer)):
+            return Relation.from_bits(int.from_bytes(self.packed[index].tobytes(), 'little'), self.universe_size,
+                                      self.arity)
+        return RelationBatch(self.packed[index], self.universe_size, self.arity)
+
+    def __iter__(self):
+        """
+        Produce an iterator for the relations in the batch.
+
+        Returns:
+            iterator: The relations in the batch, in order.
+        """
+
+        return (self[i] for i in range(len(self)))
+
+    def __str__(self):
+        """
+        Display basic information about the batch.
+
+        Returns:
+            str: Information about the number of relations in the batch and their universe and arity.
+        """
+
+        return 'A batch of {} relations on a universe of size {} of arity {}'.format(len(self), self.universe_size,
+                                                                                     self.arity)
+
+    def comparison_check(self, other):
+        """
+        Determine whether a batch or relation can be combined with this batch.
+
+        Argument:
+            other (RelationBatch | Relation): The batch or relation to combine with this one.
+
+        Returns:
+            bool: True when the universes and arities agree and, for a batch, the lengths agree as well.
+        """
+
+        if self.universe_size != other.universe_size or self.arity != other.arity:
+            return False
+        if isinstance(other, RelationBatch):
+            return len(self) == len(other)
+        return True
+
+    def _rows(self, other):
+        """
+        Get the packed rows of a batch or relation to combine with this batch.
+
+        Argument:
+            other (RelationBatch | Relation): The batch or relation to combine with this one.
+
+        Returns:
+            numpy.ndarray: Either the packed rows of `other` or, for a single relation, one row which numpy will
+                broadcast against `self.packed`.
+        """
+
+        assert self.comparison_check(other)
+        if isinstance(other, RelationBatch):
+            return other.packed
+        return packed_row(other.bits, self.row_bytes)[numpy.newaxis, :]
+
+    def _full_row(self):
+        """
+        Give the packed row of the full relation, with the padding bits left clear.
+
+        Returns:
+            numpy.ndarray: A one-dimensional array of `numpy.uint8`.
+        """
+
+        return packed_row((1 << self.universe_size ** self.arity) - 1, self.row_bytes)
+
+    def cardinalities(self):
+        """
+        Count the tuples in each relation of the batch.
+
+        Returns:
+            numpy.ndarray: An array of `numpy.int64` whose `i`th entry is the size of the `i`th relation.
+        """
+
+        return POPCOUNT[self.packed].sum(axis=1, dtype=numpy.int64)
+
+    def __invert__(self):
+        """
+        Take the complement of every relation in the batch.
+
+        Returns:
+            RelationBatch: The batch of complements.
+        """
+
+        return RelationBatch(self.packed ^ self._full_row(), self.universe_size, self.arity)
+
+    def __and__(self, other):
+        """
+        Intersect the relations in the batch with those of another batch, or with a single relation.
+
+        Argument:
+            other (RelationBatch | Relation): The batch or relation to intersect with.
+
+        Returns:
+            RelationBatch: The batch of intersections.
+        """
+
+        return RelationBatch(self.packed & self._rows(other), self.universe_size, self.arity)
+
+    def __or__(self, other):
+        """
+        Take the union of the relations in the batch with those of another batch, or with a single relation.
+
+        Argument:
+            other (RelationBatch | Relation): The batch or relation to take the union with.
+
+        Returns:
+            RelationBatch: The batch of unions.
+        """
+
+        return RelationBatch(self.packed | self._rows(other), self.universe_size, self.arity)
+
+    def __xor__(self, other):
+        """
+        Take the symmetric difference of the relations in the batch with those of another batch, or with a single
+        relation.
+
+        Argument:
+            other (RelationBatch | Relation): The batch or relation to add.
+
+        Returns:
+            RelationBatch: The batch of symmetric differences.
+        """
+
+        return RelationBatch(self.packed ^ self._rows(other), self.universe_size, self.arity)
+
+    def __sub__(self, other):
+        """
+        Remove the relations of another batch, or a single relation, from the relations in the batch.
+
+        Argument:
+            other (RelationBatch | Relation): The batch or relation to remove.
+
+        Returns:
+            RelationBatch: The batch of set differences.
+        """
+
+        return RelationBatch(self.packed & ~self._rows(other), self.universe_size, self.arity)
+
+    def dot(self, other):
+        """
+        Take the dot products modulo 2 of the relations in the batch with those of another batch, or with a single
+        relation.
+
+        Argument:
+            other (RelationBatch | Relation): The batch or relation with which to take dot products.
+
+        Returns:
+            numpy.ndarray: An array of 0s and 1s, one for each relation in the batch.
+        """
+
+        return (self & other).cardinalities() & 1
+
+    def words(self):
+        """
+        View the packed rows as 64-bit words, padding each row with zero bytes if necessary.
+
+        Returns:
+            numpy.ndarray: An array of `numpy.uint64` of shape `(len(self), ceil(row_bytes / 8))`.
+        """
+
+        padding = -self.row_bytes % 8
+        packed = self.packed
+        if padding:
+            packed = numpy.pad(packed, ((0, 0), (0, padding)))
+        return numpy.ascontiguousarray(packed).view(numpy.uint64)
+
+    def gram(self, other):
+        """
+        Take the dot product modulo 2 of every relation in the batch with every relation in another batch.
+
+        Argument:
+            other (RelationBatch | iterable of Relation): The relations with which to take dot products.
+
+        Returns:
+            numpy.ndarray: The matrix computed by `parity_gram`.
+        """
+
+        return parity_gram(self, other)
+
+
+def batch_training_pairs(training_pairs):
+    """
+    Gather training pairs whose inputs and outputs are relations into batches, one for each input variable and one for
+    each output. This is the transpose of the usual layout, where each pair holds a single relation per variable.
+
+    Argument:
+        training_pairs (iterable): Training pairs (x,y) where x is a dictionary of relations and y is a tuple of
+            relations, as produced by `mnist_training_binary.build_training_data`. All the pairs should have the same
+            keys and the same number of outputs.
+
+    Returns:
+        tuple: A pair whose first entry is a dictionary sending each input variable to the batch of its values and whose
+            second entry is a tuple containing the batch of values of each output.
+    """
+
+    training_pairs = tuple(training_pairs)
+    inputs = {key: RelationBatch.from_relations(x[key] for (x, _) in training_pairs) for key in training_pairs[0][0]}
+    outputs = tuple(RelationBatch.from_relations(y[i] for (_, y) in training_pairs)
+                    for i in range(len(training_pairs[0][1])))
+    return inputs, outputs
+
+
+def word_parity(words):
+    """
+    Find the parity of the number of set bits in each of an array of 64-bit words.
+
+    Argument:
+        words (numpy.ndarray): An array of `numpy.uint64`.
+
+    Returns:
+        numpy.ndarray: An array of `numpy.uint8` of the same shape as `words` whose entries are 0 or 1.
+    """
+
+    # Fold the word in half repeatedly so that its lowest byte has the same parity as the whole word.
+    for shift in (32, 16, 8):
+        words = words ^ (words >> numpy.uint64(shift))
+    return PARITY[(words & numpy.uint64(0xff)).astype(numpy.uint8)]
+
+
+def parity_gram(inputs, constants):
+    """
+    Compute the matrix of dot products modulo 2 between two collections of relations. This is the Gram matrix over the
+    field with two elements, so entry `(i, j)` is the parity of the size of the intersection of the `i`th input with the
+    `j`th constant.
+
+    The packed rows are intersected a 64-bit word at a time. Since the parity of a sum is the sum of the parities, the
+    words of each intersection are combined with exclusive or before a single word has its parity taken, rather than
+    counting the bits of every word.
+
+    Arguments:
+        inputs (RelationBatch | iterable of Relation): The relations indexing the rows of the matrix.
+        constants (RelationBatch | iterable of Relation): The relations indexing the columns of the matrix. These should
+            have the same universe and arity as `inputs`.
+
+    Returns:
+        numpy.ndarray: An array of `numpy.uint8` of shape `(len(inputs), len(constants))` whose entries are 0 or 1.
+    """
+
+    if not isinstance(inputs, RelationBatch):
+        inputs = RelationBatch.from_relations(inputs)
+    if not isinstance(constants, RelationBatch):
+        constants = RelationBatch.from_relations(constants, inputs.universe_size, inputs.arity)
+    assert inputs.universe_size == constants.universe_size and inputs.arity == constants.arity
+    input_words = inputs.words()
+    constant_words = constants.words()
+    gram = numpy.empty((len(inputs), len(constants)), dtype=numpy.uint8)
+    # Process the inputs in chunks so that the array of intersections stays a manageable size.
+    chunk = max(1, GRAM_CHUNK_BYTES // max(1, constant_words.nbytes))
+    for start in range(0, len(inputs), chunk):
+        intersections = input_words[start:start + chunk, numpy.newaxis, :] & constant_words[numpy.newaxis, :, :]
+        gram[start:start + chunk] = word_parity(numpy.bitwise_xor.reduce(intersections, axis=2))
+    return gram
+
+
+class ParityGramEngine:
+    """
+    A bank of constant relations together with the dot products modulo 2 of those constants with some known inputs,
+    such as the inputs of a training set. The dot products of the known inputs with the whole bank are found in one pass
+    by `parity_gram` when they are primed, so that any number of indicator polymorphisms drawing their constants from
+    the bank can be evaluated on those inputs with lookups alone. The dot products of any other input are taken one at a
+    time with `Relation.dot`, which is cheaper than a pass over the whole bank for an input which may never be seen
+    again, such as the output of a neuron in the middle of a neural net.
+
+    Attributes:
+        constants (RelationBatch): The bank of constant relations.
+        columns (dict of Relation: int): The index of each constant relation in the bank.
+        rows (LRUCache): The dot products with the bank of the most recently used primed inputs, keyed by the inputs.
+    """
+
+    def __init__(self, constants, max_rows=ENGINE_ROWS):
+        """
+        Create an engine for a given bank of constants.
+
+        Arguments:
+            constants (RelationBatch | iterable of Relation): The constant relations. There should be at least one.
+            max_rows (int): The largest number of inputs whose dot products are remembered.
+        """
+
+        if not isinstance(constants, RelationBatch):
+            constants = RelationBatch.from_relations(constants)
+        self.constants = constants
+        self._relations = constants.to_relations()
+        self.columns = {}
+        for column, rel in enumerate(self._relations):
+            self.columns.setdefault(rel, column)
+        self.rows = LRUCache(max_rows)
+
+    def column(self, rel):
+        """
+        Find the column of the Gram matrix belonging to a constant relation.
+
+        Argument:
+            rel (Relation): A relation in the bank.
+
+        Returns:
+            int: The index of `rel` in `self.constants`.
+        """
+
+        return self.columns[rel]
+
+    def prime(self, inputs):
+        """
+        Compute the dot products of several inputs with the bank at once and remember them. Inputs which are already
+        known are skipped.
+
+        Argument:
+            inputs (iterable of Relation): The relations whose dot products will be needed.
+        """
+
+        new_inputs = tuple(frozenset(rel for rel in inputs if rel not in self.rows))
+        if new_inputs:
+            for rel, row in zip(new_inputs, parity_gram(new_inputs, self.constants)):
+                self.rows[rel] = row
+
+    def dot(self, rel, column):
+        """
+        Get the dot product modulo 2 of a relation with one constant in the bank.
+
+        Arguments:
+            rel (Relation): The input relation.
+            column (int): The index of the constant, as given by `column`.
+
+        Returns:
+            int: The dot product, looked up if `rel` has been primed and taken directly otherwise.
+        """
+
+        row = self.rows.get(rel)
+        if row is None:
+            return rel.dot(self._relations[column])
+        return int(row[column])
+
+    def parities(self, rel):
+        """
+        Get the dot products modulo 2 of a relation with every constant in the bank. The dot products of a relation
+        which has not been primed are computed without being remembered.
+
+        Argument:
+            rel (Relation): The input relation.
+
+        Returns:
+            numpy.ndarray: An array of 0s and 1s indexed by the columns of the bank.
+        """
+
+        row = self.rows.get(rel)
+        if row is None:
+            return parity_gram((rel,), self.constants)[0]
+        return row
+
+    def gram(self, inputs):
+        """
+        Get the Gram matrix of some inputs against the bank, reusing the rows which are already known and priming the
+        others.
+
+        Argument:
+            inputs (iterable of Relation): The relations indexing the rows of the matrix.
+
+        Returns:
+            numpy.ndarray: An array of shape `(len(inputs), len(self.constants))` whose entries are 0 or 1.
+        """
+
+        inputs = tuple(inputs)
+        self.prime(inputs)
+        return numpy.array([self.parities(rel) for rel in inputs], dtype=numpy.uint8).reshape(len(inputs),
+                                                                                               len(self.constants))
@@ -0,0 +1,324 @@
+"""
+Lazy expressions in the algebra of relations
+"""
+from abc import ABC, abstractmethod
+from relations import Relation, _intersection, _difference, _union, _symmetric_difference, _count
+
+
+def lazy(rel):
+    """
+    Start a lazy expression from a relation.
+
+    Argument:
+        rel (Relation | Expression): The relation to wrap. An expression is returned unchanged.
+
+    Returns:
+        Expression: An expression whose value is `rel`.
+    """
+
+    if isinstance(rel, Expression):
+        return rel
+    return Leaf(rel)
+
+
+class Expression(ABC):
+    """
+    An expression built from relations with the set operations `~`, `&`, `|`, `^`, and `-`, which is only evaluated when
+    its value is needed. Applying these operators to an expression and a relation or another expression produces a
+    larger expression rather than a relation, so a chain such as `((lazy(a) ^ b) & c) ^ d` allocates no intermediate
+    relations. When the value is needed, the whole expression is evaluated in one pass on the packed integers or
+    frozensets stored by its relations, using the same kernels as `Relation`. Complements are carried along as flags
+    instead of being taken against the full relation, no representation is chosen along the way, and only the final
+    result is turned into a `Relation`. The size of the value and its dot products are found from the final stored form
+    without creating a relation at all.
+
+    Expressions can be passed to operations such as `polymorphisms.SwappingAutomorphism` and
+    `polymorphisms.BlankingEndomorphism`, which then return expressions in turn. The operators of `Relation` leave
+    operands which are not relations to the reflected operators of expressions, so `a ^ lazy(b)` is an expression as
+    well. A chain of relations such as `(a ^ b) & lazy(c)` still creates `a ^ b`, so a chain should start with an
+    expression, as made by `lazy`.
+
+    Attributes:
+        universe_size (int): The number of elements in the universe of the value.
+        arity (int): The arity of the value.
+    """
+
+    __slots__ = ('_universe_size', '_arity')
+
+    @property
+    def universe_size(self):
+        return self._universe_size
+
+    @property
+    def arity(self):
+        return self._arity
+
+    @abstractmethod
+    def _stored(self):
+        """
+        Evaluate the expression on the stored forms of its relations.
+
+        Returns:
+            tuple: A packed integer or frozenset holding the positions of the tuples which are either included in or, if
+                the second entry is True, excluded from the value of the expression, and that flag.
+        """
+
+    def comparison_check(self, other):
+        """
+        Determine whether a relation or expression can be combined with this expression.
+
+        Argument:
+            other (Relation | Expression): The other operand.
+
+        Returns:
+            bool: True when the two have the same universe and arity, False otherwise.
+        """
+
+        return self.universe_size == other.universe_size and self.arity == other.arity
+
+    def evaluate(self):
+        """
+        Compute the value of the expression.
+
+        Returns:
+            Relation: The relation which is the value of the expression.
+        """
+
+        store, complemented = self._stored()
+        return Relation._from_store(store, self.universe_size, self.arity, complemented)
+
+    def __len__(self):
+        """
+        Find the number of tuples in the value of the expression, without creating the value.
+
+        Returns:
+            int: The number of tuples in the value.
+        """
+
+        store, complemented = self._stored()
+        if complemented:
+            return self.universe_size ** self.arity - _count(store)
+        return _count(store)
+
+    def __bool__(self):
+        """
+        Check whether the value of the expression is nonempty.
+
+        Returns:
+            bool: True when the value contains at least one tuple, False otherwise.
+        """
+
+        return len(self) > 0
+
+    def dot(self, other):
+        """
+        Take the dot product modulo 2 of the value of the expression with a relation or the value of another
+        expression, without creating either value or their intersection.
+
+        Argument:
+            other (Relation | Expression): The other operand.
+
+        Returns:
+            int: Either 0 or 1, depending on the parity of the size of the intersection.
+        """
+
+        return len(self & other) & 1
+
+    def __invert__(self):
+        return Complement(self)
+
+    # Relations can be used directly as operands, since they give their stored forms in the same way as expressions.
+
+    def __and__(self, other):
+        return Intersection(self, other)
+
+    def __or__(self, other):
+        return Union(self, other)
+
+    def __xor__(self, other):
+        return SymmetricDifference(self, other)
+
+    def __sub__(self, other):
+        return Difference(self, other)
+
+    def __rand__(self, other):
+        return Intersection(other, self)
+
+    def __ror__(self, other):
+        return Union(other, self)
+
+    def __rxor__(self, other):
+        return SymmetricDifference(other, self)
+
+    def __rsub__(self, other):
+        return Difference(other, self)
+
+    def __str__(self):
+        """
+        Display basic information about the expression.
+
+        Returns:
+            str: Information about the universe and arity of the value of the expression.
+        """
+
+        return 'A lazy expression for a relation on a universe of size {} of arity {}'.format(self.universe_size,
+                                                                                             self.arity)
+
+
+class Leaf(Expression):
+    """
+    An expression whose value is a given relation.
+
+    Attributes:
+        rel (Relation): The relation.
+    """
+
+    __slots__ = ('rel',)
+
+    def __init__(self, rel):
+        """
+        Wrap a relation in an expression.
+
+        Argument:
+            rel (Relation): The relation.
+        """
+
+        self.rel = rel
+        self._universe_size = rel.universe_size
+        self._arity = rel.arity
+
+    def _stored(self):
+        return self.rel._stored()
+
+
+class Complement(Expression):
+    """
+    The complement of the value of an expression.
+
+    Attributes:
+        operand (Expression): The expression being complemented.
+    """
+
+    __slots__ = ('operand',)
+
+    def __init__(self, operand):
+        """
+        Complement an expression.
+
+        Argument:
+            operand (Expression): The expression to complement.
+        """
+
+        self.operand = operand
+        self._universe_size = operand._universe_size
+        self._arity = operand._arity
+
+    def __invert__(self):
+        return self.operand
+
+    def _stored(self):
+        store, complemented = self.operand._stored()
+        return store, not complemented
+
+
+class BinaryExpression(Expression):
+    """
+    The result of a set operation on the values of two expressions.
+
+    Attributes:
+        left (Expression | Relation): The first operand.
+        right (Expression | Relation): The second operand.
+    """
+
+    __slots__ = ('left', 'right')
+
+    def __init__(self, left, right):
+        """
+        Combine two expressions.
+
+        Arguments:
+            left (Expression | Relation): The first operand.
+            right (Expression | Relation): The second operand. This must have the same universe and arity as `left`.
+        """
+
+        # Relations and expressions both keep their universe sizes and arities in these slots. Reading them directly
+        # keeps building an expression cheap.
+        self._universe_size = left._universe_size
+        self._arity = left._arity
+        assert self._universe_size == right._universe_size and self._arity == right._arity
+        self.left = left
+        self.right = right
+
+
+# In the following, a stored form with its flag set stands for the complement of its positions, and the set operations
+# are reduced to ones on stored forms by De Morgan's laws, just as in `Relation`.
+
+
+class Intersection(BinaryExpression):
+    """
+    The intersection of the values of two expressions.
+    """
+
+    __slots__ = ()
+
+    def _stored(self):
+        x, x_complemented = self.left._stored()
+        y, y_complemented = self.right._stored()
+        if x_complemented and y_complemented:
+            return _union(x, y), True
+        if x_complemented:
+            return _difference(y, x), False
+        if y_complemented:
+            return _difference(x, y), False
+        return _intersection(x, y), False
+
+
+class Union(BinaryExpression):
+    """
+    The union of the values of two expressions.
+    """
+
+    __slots__ = ()
+
+    def _stored(self):
+        x, x_complemented = self.left._stored()
+        y, y_complemented = self.right._stored()
+        if x_complemented and y_complemented:
+            return _intersection(x, y), True
+        if x_complemented:
+            return _difference(x, y), True
+        if y_complemented:
+            return _difference(y, x), True
+        return _union(x, y), False
+
+
+class Difference(BinaryExpression):
+    """
+    The set difference of the values of two expressions.
+    """
+
+    __slots__ = ()
+
+    def _stored(self):
+        x, x_complemented = self.left._stored()
+        y, y_complemented = self.right._stored()
+        if x_complemented and y_complemented:
+            return _difference(y, x), False
+        if x_complemented:
+            return _union(x, y), True
+        if y_complemented:
+            return _intersection(x, y), False
+        return _difference(x, y), False
+
+
+class SymmetricDifference(BinaryExpression):
+    """
+    The symmetric difference of the values of two expressions.
+    """
+
+    __slots__ = ()
+
+    def _stored(self):
+        x, x_complemented = self.left._stored()
+        y, y_complemented = self.right._stored()
+        return _symmetric_difference(x, y), x_complemented != y_complemented
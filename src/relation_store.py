@@ -0,0 +1,282 @@
+"""
+On-disk stores of relations
+"""
+import os
+import struct
+import numpy
+from relation_batch import RelationBatch
+
+# Every store begins with this header: a magic string, the format version, flags, the universe size, and the arity.
+HEADER = struct.Struct('<8sIIQQ')
+MAGIC = b'RELSTORE'
+VERSION = 1
+# The flag set when each relation in the store carries an integer label.
+LABELLED = 1
+
+
+class RelationStore:
+    """
+    A file holding a sequence of relations of the same universe and arity, such as the images of an MNIST split. After a
+    short header, the file consists of fixed-size records, one for each relation. A record holds the packed bits of a
+    relation in the same layout as a row of a `RelationBatch`, preceded by a little-endian 64-bit label when the store
+    is labelled. The number of relations is read off from the size of the file.
+
+    The records are read through `numpy.memmap`, so opening a store parses nothing and reading a relation only touches
+    the pages holding it. Slices of a store are `RelationBatch`es whose packed rows are views of the file, so the
+    operating system decides which parts of a store larger than memory are actually loaded. In append mode, relations
+    are added to the end of the file as they are produced.
+
+    Attributes:
+        path (str): The location of the file.
+        universe_size (int): The number of elements in the universe of each relation.
+        arity (int): The arity of each relation.
+        labelled (bool): Whether each relation carries an integer label.
+        mode (str): Either 'r' for reading only or 'a' for reading and appending.
+    """
+
+    def __init__(self, path, mode='r', universe_size=None, arity=None, labelled=False):
+        """
+        Open a store, creating it if necessary.
+
+        Arguments:
+            path (str | os.PathLike): The location of the file.
+            mode (str): One of 'r' to read an existing store, 'a' to append to a store, which is created if it does not
+                exist, or 'w' to create a new, empty store in place of any existing file. Stores opened with 'w' may
+                then be appended to.
+            universe_size (int): The universe size of the relations. This is needed when a store is created, and is
+                otherwise checked against the header if it is given.
+            arity (int): The arity of the relations. This is needed when a store is created, and is otherwise checked
+                against the header if it is given.
+            labelled (bool): Whether each relation carries an integer label. This is only used when a store is created.
+
+        Raises:
+            ValueError: If the mode is unknown, if the file is not a store of this version, or if its universe size or
+                arity differ from those given. In append mode, a partial record left at the end of the file by an
+                interrupted run is removed rather than rejected.
+        """
+
+        if mode not in ('r', 'a', 'w'):
+            raise ValueError('Unknown mode {!r}.'.format(mode))
+        self.path = os.fspath(path)
+        if mode == 'w' or (mode == 'a' and not os.path.exists(self.path)):
+            if universe_size is None or arity is None:
+                raise ValueError('The universe size and arity are needed to create a store.')
+            with open(self.path, 'wb') as file:
+                file.write(HEADER.pack(MAGIC, VERSION, LABELLED if labelled else 0, universe_size, arity))
+        with open(self.path, 'rb') as file:
+            header = file.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise ValueError('{} is too short to be a relation store.'.format(self.path))
+        magic, version, flags, stored_universe_size, stored_arity = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a relation store of version {}.'.format(self.path, VERSION))
+        if universe_size is not None and universe_size != stored_universe_size:
+            raise ValueError('The store holds relations on a universe of size {}.'.format(stored_universe_size))
+        if arity is not None and arity != stored_arity:
+            raise ValueError('The store holds relations of arity {}.'.format(stored_arity))
+        self.universe_size = stored_universe_size
+        self.arity = stored_arity
+        self.labelled = bool(flags & LABELLED)
+        self.mode = 'r' if mode == 'r' else 'a'
+        fields = [('bits', numpy.uint8, (self.row_bytes,))]
+        if self.labelled:
+            fields.insert(0, ('label', '<i8'))
+        self.record = numpy.dtype(fields)
+        self._file = None
+        if self.mode == 'a':
+            # A run interrupted while appending can leave part of a record at the end of the file. It is cut off, so
+            # that the records appended from now on line up with the earlier ones.
+            size = os.path.getsize(self.path)
+            whole = HEADER.size + (size - HEADER.size) // self.record.itemsize * self.record.itemsize
+            if size != whole:
+                os.truncate(self.path, whole)
+            self._file = open(self.path, 'ab')
+        self._records = None
+
+    @property
+    def row_bytes(self):
+        """
+        The number of bytes of packed bits in each record.
+        """
+
+        return (self.universe_size ** self.arity + 7) // 8
+
+    def _count(self):
+        """
+        Find the number of complete records in the file.
+
+        Returns:
+            int: The number of relations in the store.
+        """
+
+        if self._file is not None:
+            self._file.flush()
+        return (os.path.getsize(self.path) - HEADER.size) // self.record.itemsize
+
+    def records(self):
+        """
+        Map the records of the store into memory. The map is remade whenever relations have been appended since it was
+        last made.
+
+        Returns:
+            numpy.ndarray: A read-only structured array with one entry for each relation, whose field 'bits' holds the
+                packed rows and whose field 'label', for labelled stores, holds the labels.
+        """
+
+        count = self._count()
+        if self._records is None or len(self._records) != count:
+            if count:
+                self._records = numpy.memmap(self.path, dtype=self.record, mode='r', offset=HEADER.size,
+                                             shape=(count,))
+            else:
+                # A memory map cannot be empty.
+                self._records = numpy.zeros(0, dtype=self.record)
+        return self._records
+
+    @property
+    def labels(self):
+        """
+        The labels of the relations, as a read-only array, or None for an unlabelled store.
+        """
+
+        if not self.labelled:
+            return None
+        return self.records()['label']
+
+    def batch(self):
+        """
+        View the whole store as a batch without reading it.
+
+        Returns:
+            RelationBatch: The relations in the store, whose packed rows are backed by the file.
+        """
+
+        return RelationBatch(self.records()['bits'], self.universe_size, self.arity)
+
+    def __len__(self):
+        """
+        Give the number of relations in the store.
+
+        Returns:
+            int: The number of records in the file.
+        """
+
+        return self._count()
+
+    def __getitem__(self, index):
+        """
+        Read a relation or a batch of relations.
+
+        Argument:
+            index (int | slice | numpy.ndarray): Either the index of a single relation or anything that numpy accepts
+                for selecting entries of an array.
+
+        Returns:
+            Relation | RelationBatch: A single relation when `index` is an integer and a batch otherwise. A batch made
+                from a slice is a view of the file.
+        """
+
+        return self.batch()[index]
+
+    def __iter__(self):
+        """
+        Produce an iterator for the relations in the store. Labels are not included; see `items`.
+
+        Returns:
+            iterator: The relations in the store, in order.
+        """
+
+        return iter(self.batch())
+
+    def items(self):
+        """
+        Produce an iterator for the relations in a labelled store together with their labels, in the same form as
+        `mnist_training_binary.mnist_binary_relations`.
+
+        Yields:
+            tuple: A relation and its integer label.
+        """
+
+        assert self.labelled
+        records = self.records()
+        for i in range(len(records)):
+            yield self[i], int(records['label'][i])
+
+    def __str__(self):
+        """
+        Display basic information about the store.
+
+        Returns:
+            str: Information about the number of relations in the store and their universe and arity.
+        """
+
+        return 'A store of {} {}relations on a universe of size {} of arity {}'.format(
+            len(self), 'labelled ' if self.labelled else '', self.universe_size, self.arity)
+
+    def append(self, rel, label=None):
+        """
+        Add a relation to the end of the store.
+
+        Arguments:
+            rel (Relation): The relation to add. It must have the universe and arity of the store.
+            label (int): The label of `rel`. This must be given exactly when the store is labelled.
+        """
+
+        self.extend(((rel, label),) if self.labelled else (rel,))
+
+    def extend(self, relations):
+        """
+        Add several relations to the end of the store.
+
+        Argument:
+            relations (iterable): For an unlabelled store, the relations to add. For a labelled store, pairs of a
+                relation and its integer label, as produced by `mnist_training_binary.mnist_binary_relations`.
+
+        Raises:
+            ValueError: If the store is not open for appending, or if some relation does not have the universe and arity
+                of the store. The relations before it are added, and nothing of its record is written, so the records in
+                the file stay aligned.
+        """
+
+        if self.mode != 'a':
+            raise ValueError('The store is not open for appending.')
+        for item in relations:
+            if self.labelled:
+                rel, label = item
+            else:
+                rel = item
+            if rel.universe_size != self.universe_size or rel.arity != self.arity:
+                raise ValueError('A relation on a universe of size {} of arity {} cannot be added to a store of '
+                                 'relations on a universe of size {} of arity {}.'.format(rel.universe_size, rel.arity,
+                                                                                         self.universe_size,
+                                                                                         self.arity))
+            # The whole record is encoded before any of it is written.
+            record = rel.bits.to_bytes(self.row_bytes, 'little')
+            if self.labelled:
+                record = struct.pack('<q', label) + record
+            self._file.write(record)
+
+    def flush(self):
+        """
+        Write any buffered relations to the file.
+        """
+
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        """
+        Close the store. Batches read from it remain usable as long as they are referenced.
+        """
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.mode = 'r'
+        self._records = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,8 +1,12 @@
 """
 Relations
 """
-from itertools import product
+import sys
 from functools import wraps
+from hashlib import blake2b
+from pickle import PickleBuffer
+from weakref import WeakValueDictionary
+import numpy
 
 
 def comparison(method):
@@ -24,18 +28,488 @@ def comparison(method):
     return checked_method
 
 
+def set_operator(method):
+    """
+    Check a binary set operator for an appropriate comparison as in `comparison`, but first give `NotImplemented` when
+    the other operand is not a relation, so that Python tries the reflected operator of that operand instead.
+
+    Args:
+        method (function): The operator to which to apply this check.
+
+    Returns:
+        function: The given `method` with this check being made first.
+    """
+
+    checked = comparison(method)
+
+    @wraps(method)
+    def operator(self, other):
+        if not isinstance(other, Relation):
+            return NotImplemented
+        return checked(self, other)
+
+    return operator
+
+
+# Relations whose universe has a Cartesian power with at most this many positions are always stored densely, since a
+# packed integer of this size is handled in a few dozen machine words no matter how many tuples it holds.
+DENSE_POSITIONS = 1 << 12
+# On larger universes, a relation is stored sparsely when it, or its complement, holds at most this proportion of the
+# positions.
+SPARSE_DENSITY = 1 / 256
+# The number of bytes of intermediate results `_boolean_product` may hold at once.
+PRODUCT_CHUNK_BYTES = 1 << 24
+
+
+def choose_representation(size, positions, allow_complemented=True):
+    """
+    Decide how a relation should be stored.
+
+    Arguments:
+        size (int): The number of tuples in the relation.
+        positions (int): The number of tuples in the appropriate Cartesian power of the universe.
+        allow_complemented (bool): Whether the complemented sparse form may be chosen.
+
+    Returns:
+        str: One of 'dense', for a packed integer of the tuples in the relation, 'sparse', for a frozenset of the
+            positions of the tuples in the relation, or 'complemented sparse', for a frozenset of the positions of the
+            tuples not in the relation.
+    """
+
+    if positions <= DENSE_POSITIONS:
+        return 'dense'
+    if size <= SPARSE_DENSITY * positions:
+        return 'sparse'
+    if allow_complemented and positions - size <= SPARSE_DENSITY * positions:
+        return 'complemented sparse'
+    return 'dense'
+
+
+# Testing a bit of a Python integer takes time proportional to its length, so a walk through neighbors starting from a
+# packed integer with more bits than this copies it to bytes once, in which each bit can be tested in constant time.
+PROBE_BITS = 1 << 12
+# The positions flipped by a `PatchedRelation` are kept in a trie whose leaves are integers holding `1 << LEAF_BITS`
+# bits and whose other nodes are tuples of `1 << BRANCH_BITS` children.
+LEAF_BITS = 6
+BRANCH_BITS = 5
+
+
+# A stored form is either a packed integer or a frozenset of positions. The following helpers work with either.
+
+
+def pack_positions(positions):
+    """
+    Pack a collection of positions into an integer.
+
+    Argument:
+        positions (iterable of int): The indices of the bits to set.
+
+    Returns:
+        int: The integer whose set bits are exactly those in `positions`.
+    """
+
+    positions = tuple(positions)
+    if not positions:
+        return 0
+    # We set the bits in a bytearray first so that each position costs a constant amount of work.
+    packed = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        packed[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(packed, 'little')
+
+
+def unpack_positions(bits):
+    """
+    Find the positions of the set bits of an integer.
+
+    Argument:
+        bits (int): A nonnegative integer.
+
+    Yields:
+        int: The index of a set bit of `bits`, in increasing order.
+    """
+
+    # Reading the binary expansion as a string lets `str.find` do the scanning for us.
+    binary = bin(bits)[:1:-1]
+    position = binary.find('1')
+    while position != -1:
+        yield position
+        position = binary.find('1', position + 1)
+
+
+def cube_side(array):
+    """
+    Find the size of the universe indexing an array with one axis for each coordinate of a tuple, such as the array of
+    a relation or the table of an operation. All the axes must have the length of the universe.
+
+    Argument:
+        array (numpy.ndarray): The array.
+
+    Returns:
+        int: The common length of the axes. An array with no axes has none from which to read off the universe, so we
+            take it to describe a singleton.
+    """
+
+    assert len(set(array.shape)) <= 1
+    return array.shape[0] if array.ndim else 1
+
+
+def _encode_positions(store, positions):
+    """
+    Write the positions in a stored form as bytes.
+
+    Arguments:
+        store (int | frozenset of int): A packed integer or a frozenset of positions.
+        positions (int): The number of positions in the Cartesian power, which bounds the positions in `store`.
+
+    Returns:
+        bytes: The positions in increasing order, each written as a little-endian integer with `width` bytes, where
+            `width` is just enough for `positions`.
+    """
+
+    width = (positions.bit_length() + 7) // 8
+    if width > 8:
+        listed = sorted(store) if type(store) is not int else unpack_positions(store)
+        return b''.join(position.to_bytes(width, 'little') for position in listed)
+    if type(store) is int:
+        packed = numpy.frombuffer(store.to_bytes((store.bit_length() + 7) // 8, 'little'), dtype=numpy.uint8)
+        listed = numpy.flatnonzero(numpy.unpackbits(packed, bitorder='little'))
+    else:
+        listed = numpy.sort(numpy.fromiter(store, dtype=numpy.int64, count=len(store)))
+    return listed.astype('<u8').view(numpy.uint8).reshape(-1, 8)[:, :width].tobytes()
+
+
+def _trie_levels(positions):
+    """
+    Find the number of levels of branching nodes in a trie of flipped positions.
+
+    Argument:
+        positions (int): The number of positions in the Cartesian power.
+
+    Returns:
+        int: The smallest number of levels of nodes with `1 << BRANCH_BITS` children above the leaves which can hold
+            every position.
+    """
+
+    levels = 0
+    while positions > 1 << (LEAF_BITS + BRANCH_BITS * levels):
+        levels += 1
+    return levels
+
+
+def _trie_flip(node, position, levels):
+    """
+    Flip a position in a trie, copying only the nodes on the path to its leaf so that the rest of the trie is shared
+    with the original.
+
+    Arguments:
+        node (tuple | int | None): The root of the trie, which is None for an empty trie.
+        position (int): The position to flip.
+        levels (int): The number of levels of branching nodes, as given by `_trie_levels`.
+
+    Returns:
+        tuple | int: The root of the new trie.
+    """
+
+    if not levels:
+        return (node or 0) ^ (1 << (position & ((1 << LEAF_BITS) - 1)))
+    index = (position >> (LEAF_BITS + BRANCH_BITS * (levels - 1))) & ((1 << BRANCH_BITS) - 1)
+    children = list(node) if node is not None else [None] * (1 << BRANCH_BITS)
+    children[index] = _trie_flip(children[index], position, levels - 1)
+    return tuple(children)
+
+
+def _trie_has(node, position, levels):
+    """
+    Check whether a position is in a trie.
+
+    Arguments:
+        node (tuple | int | None): The root of the trie.
+        position (int): The position to look for.
+        levels (int): The number of levels of branching nodes.
+
+    Returns:
+        bool: True when `position` is in the trie, False otherwise.
+    """
+
+    while levels:
+        if node is None:
+            return False
+        levels -= 1
+        node = node[(position >> (LEAF_BITS + BRANCH_BITS * levels)) & ((1 << BRANCH_BITS) - 1)]
+    return bool(node and node >> (position & ((1 << LEAF_BITS) - 1)) & 1)
+
+
+def _trie_positions(node, levels, offset=0):
+    """
+    List the positions in a trie.
+
+    Arguments:
+        node (tuple | int | None): The root of the trie.
+        levels (int): The number of levels of branching nodes.
+        offset (int): The first position covered by `node`.
+
+    Yields:
+        int: The positions in the trie, in increasing order.
+    """
+
+    if not node:
+        return
+    if not levels:
+        for bit in unpack_positions(node):
+            yield offset + bit
+        return
+    span = 1 << (LEAF_BITS + BRANCH_BITS * (levels - 1))
+    for index, child in enumerate(node):
+        yield from _trie_positions(child, levels - 1, offset + index * span)
+
+
+def _as_int(store):
+    if type(store) is int:
+        return store
+    return pack_positions(store)
+
+
+def _as_frozenset(store):
+    if type(store) is frozenset:
+        return store
+    return frozenset(unpack_positions(store))
+
+
+def _count(store):
+    if type(store) is int:
+        return store.bit_count()
+    return len(store)
+
+
+def _select(positions, bits):
+    """
+    Find which of a set of positions are set in a packed integer, with a constant amount of work per position.
+
+    Arguments:
+        positions (frozenset of int): The positions to check.
+        bits (int): The packed integer.
+
+    Returns:
+        frozenset of int: The members of `positions` which are set in `bits`.
+    """
+
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    length = len(data)
+    return frozenset(position for position in positions
+                     if position >> 3 < length and data[position >> 3] >> (position & 7) & 1)
+
+
+# The kernels for set operations on stored forms. Two stored forms of the same kind are combined directly. When one is
+# sparse and the other dense, intersections and differences whose result must lie inside the sparse one only look at
+# its positions, while everything else is done on packed integers.
+
+
+def _intersection(x, y):
+    if type(x) is type(y):
+        return x & y
+    if type(x) is int:
+        return _select(y, x)
+    return _select(x, y)
+
+
+def _difference(x, y):
+    if type(x) is int:
+        return x & ~_as_int(y)
+    if type(y) is int:
+        return x - _select(x, y)
+    return x - y
+
+
+def _union(x, y):
+    if type(x) is type(y):
+        return x | y
+    return _as_int(x) | _as_int(y)
+
+
+def _symmetric_difference(x, y):
+    if type(x) is type(y):
+        return x ^ y
+    return _as_int(x) ^ _as_int(y)
+
+
+def _intersection_count(x, y):
+    """
+    Count the positions shared by two stored forms without building a relation for their intersection.
+
+    Arguments:
+        x (int | frozenset of int): A stored form.
+        y (int | frozenset of int): Another stored form.
+
+    Returns:
+        int: The number of positions in both `x` and `y`.
+    """
+
+    if type(x) is int and type(y) is int:
+        return (x & y).bit_count()
+    if type(x) is int:
+        x, y = y, x
+    if type(y) is frozenset:
+        # The intersection of two sparse forms is no larger than either of them, and building it in C is faster than
+        # counting in Python.
+        return len(x & y)
+    data = y.to_bytes((y.bit_length() + 7) // 8, 'little')
+    length = len(data)
+    return sum(1 for position in x if position >> 3 < length and data[position >> 3] >> (position & 7) & 1)
+
+
+def _pickled_store(store, positions, protocol):
+    """
+    Encode a stored form as a flat buffer for pickling.
+
+    Arguments:
+        store (int | frozenset of int): The stored positions of a relation.
+        positions (int): The number of tuples in the appropriate Cartesian power of the universe.
+        protocol (int): The pickle protocol in use.
+
+    Returns:
+        PickleBuffer | bytes | numpy.ndarray | frozenset of int: The little-endian bytes of a packed integer, or an
+            array of sparse positions. When the protocol allows it, the bytes are wrapped in a `PickleBuffer` so that
+            they can be sent out of band. Positions too large for 64 bits are left as a frozenset.
+    """
+
+    if type(store) is int:
+        data = store.to_bytes((store.bit_length() + 7) // 8, 'little')
+        return PickleBuffer(data) if protocol >= 5 else data
+    if positions > 1 << 64:
+        return store
+    # Numpy arrays send their own buffers out of band when the protocol allows it.
+    return numpy.fromiter(store, dtype=numpy.uint64, count=len(store))
+
+
+def _unpickle_relation(cls, data, universe_size, arity, complemented):
+    """
+    Rebuild a relation pickled by `Relation.__reduce_ex__`, keeping the representation it had when it was pickled.
+
+    Arguments:
+        cls (type): The class of the relation.
+        data (bytes-like | numpy.ndarray | frozenset of int): The buffer produced by `_pickled_store`.
+        universe_size (int): The number of elements in the universe.
+        arity (int): The length of each tuple in the relation.
+        complemented (bool): Whether `data` holds the positions excluded from the relation.
+
+    Returns:
+        Relation: The relation which was pickled.
+    """
+
+    if isinstance(data, frozenset):
+        store = data
+    elif isinstance(data, numpy.ndarray):
+        store = frozenset(data.tolist())
+    else:
+        store = int.from_bytes(data, 'little')
+    rel = object.__new__(cls)
+    rel._universe_size = universe_size
+    rel._arity = arity
+    rel._store = store
+    rel._complemented = complemented
+    rel._size = _count(store)
+    if complemented:
+        rel._size = universe_size ** arity - rel._size
+    rel._hash = None
+    rel._fingerprint = None
+    return rel
+
+
+def _word_rows(matrix):
+    """
+    Pack the rows of a boolean matrix into 64-bit words.
+
+    Argument:
+        matrix (numpy.ndarray): A boolean array of shape `(n, n)`.
+
+    Returns:
+        numpy.ndarray: An array of `numpy.uint64` of shape `(n, ceil(n / 64))` whose row `x` holds the bits of row
+            `x` of `matrix`, least significant bit first.
+    """
+
+    size = len(matrix)
+    padded = numpy.zeros((size, -(-size // 64) * 64), dtype=numpy.bool_)
+    padded[:, :size] = matrix
+    return numpy.packbits(padded, axis=1, bitorder='little').view('<u8')
+
+
+def _boolean_product(left, right):
+    """
+    Multiply two square boolean matrices.
+
+    When a row fits in a single word, each row of the product is the union of the rows of `right` picked out by a row of
+    `left`, which is one vectorized masked reduction over words. Otherwise the method of Four Russians is used. The rows
+    of `right` are split into blocks of eight, and for each block the unions of all 256 subsets of its rows are
+    tabulated. Each byte of a row of `left` then picks out one entry of the table for its block, so a row of the product
+    is the union of one table entry per eight columns of `left` instead of one row of `right` per set bit.
+
+    Arguments:
+        left (numpy.ndarray): The first matrix, as a boolean array of shape `(n, n)`.
+        right (numpy.ndarray): The second matrix, as packed rows in the form given by `_word_rows`.
+
+    Returns:
+        numpy.ndarray: The product, as packed rows in the form given by `_word_rows`.
+    """
+
+    size, words = right.shape
+    if words == 1:
+        return numpy.bitwise_or.reduce(numpy.where(left, right[:, 0], numpy.uint64(0)), axis=1)[:, numpy.newaxis]
+    row_bytes = (size + 7) // 8
+    blocks = numpy.zeros((row_bytes * 8, words), dtype=numpy.uint64)
+    blocks[:size] = right
+    blocks = blocks.reshape(row_bytes, 8, words)
+    # Entry `i` of the table for a block is the union of the rows of the block at the set bits of `i`. The entries with
+    # highest bit `k` are those below `1 << k` with row `k` added.
+    tables = numpy.zeros((row_bytes, 256, words), dtype=numpy.uint64)
+    for row in range(8):
+        numpy.bitwise_or(tables[:, :1 << row], blocks[:, row:row + 1], out=tables[:, 1 << row:2 << row])
+    left = numpy.packbits(left, axis=1, bitorder='little')
+    block_indices = numpy.arange(row_bytes)
+    product = numpy.empty_like(right)
+    # Looking up the tables for many rows at once takes `row_bytes * words` words per row, so the rows are done in
+    # chunks.
+    chunk = max(1, PRODUCT_CHUNK_BYTES // (row_bytes * words * 8))
+    for start in range(0, size, chunk):
+        product[start:start + chunk] = numpy.bitwise_or.reduce(tables[block_indices, left[start:start + chunk]], axis=1)
+    return product
+
+
 class Relation:
     """
     A finitary relation on a finite set.
 
+    The tuples in the appropriate Cartesian power of the universe are ordered lexicographically, and a relation is
+    stored by the positions of its tuples in that order. It chooses one of three representations for this, depending on
+    how many tuples it has and how large the universe is.
+        'dense': A packed integer with one bit for each position, so that set operations, cardinalities, and dot
+            products are carried out a machine word at a time. This is always used on small universes, such as those of
+            MNIST images.
+        'sparse': A frozenset of the positions of the tuples, for relations with few tuples on a large universe.
+        'complemented sparse': A frozenset of the positions of the tuples excluded from the relation, for relations
+            containing almost everything on a large universe. Complements of sparse relations take this form, so the
+            Cartesian power of the universe never needs to be enumerated.
+    The representation is picked by `choose_representation` whenever a relation is created, and binary operations
+    dispatch to the cheapest kernel for the representations of their operands. Apart from speed and memory use, all the
+    representations behave identically. The frozenset of tuples is derived only when it is requested.
+
+    Relations use `__slots__` rather than an instance dictionary, so besides their stored positions each one takes up
+    only a few machine words. See `memory_report` for measuring this.
+
+    Only the stored positions of a relation are pickled, as a single flat buffer. With pickle protocol 5 the buffer can
+    be sent out of band, so that a pickler with a `buffer_callback` hands it over without copying.
+
     Attributes:
         tuples (frozenset of tuple of int): The tuples belonging to the relation.
+        bits (int): The packed representation of the relation.
         universe_size (int): The number of elements in the universe, which is assumed to consist of an initial section
             of the nonnegative integers.
         arity (int): The length of each tuple in the relation. Can be inferred from `tuples` unless that iterable is
             empty.
     """
 
+    __slots__ = ('_universe_size', '_arity', '_store', '_complemented', '_size', '_hash', '_fingerprint', '__weakref__')
+
     def __init__(self, tuples, universe_size, arity=0):
         """
         Construct a relation from a collection of tuples.
@@ -58,14 +532,302 @@ class Relation:
             self._arity = len(tuples[0])
         else:
             self._arity = arity
-        # Cast `tuples` to a frozenset and store it as the `tuples` attribute of the relation.
-        self._tuples = frozenset(tuples)
         # Store the size of the universe.
         self._universe_size = universe_size
+        self._set_store(frozenset(map(self._position, tuples)), False)
+        # The frozenset of tuples is only built if someone asks for it, and it is not kept afterwards.
+        # The hash value is computed the first time it is needed and then remembered.
+        self._hash = None
+        # So is the fingerprint.
+        self._fingerprint = None
+
+    def _set_store(self, store, complemented, allow_complemented=True):
+        """
+        Store a set of positions in the representation chosen by `choose_representation`.
+
+        Arguments:
+            store (int | frozenset of int): The positions, either packed into an integer or as a frozenset.
+            complemented (bool): Whether `store` holds the positions excluded from the relation rather than those
+                included in it.
+            allow_complemented (bool): Whether the complemented sparse representation may be chosen.
+        """
+
+        positions = self._universe_size ** self._arity
+        # Small universes are always dense, and most relations in practice live on them, so they are dealt with first.
+        if positions <= DENSE_POSITIONS and type(store) is int:
+            if complemented:
+                store ^= (1 << positions) - 1
+            self._store = store
+            self._complemented = False
+            self._size = store.bit_count()
+            return
+        size = _count(store)
+        if complemented:
+            size = positions - size
+        representation = choose_representation(size, positions, allow_complemented)
+        if representation == 'complemented sparse':
+            if not complemented:
+                store = ((1 << positions) - 1) ^ _as_int(store)
+            store = _as_frozenset(store)
+        else:
+            if complemented:
+                store = ((1 << positions) - 1) ^ _as_int(store)
+            if representation == 'dense':
+                store = _as_int(store)
+            else:
+                store = _as_frozenset(store)
+        self._store = store
+        self._complemented = representation == 'complemented sparse'
+        self._size = size
+
+    # The following constructors trust their inputs to describe a valid relation, so they skip the normalization and
+    # checking done by `__init__`. They are meant for building relations out of data which already came from relations.
+
+    @classmethod
+    def _from_store(cls, store, universe_size, arity, complemented=False, allow_complemented=True):
+        """
+        Create a relation from a set of positions, in whichever form it is stored.
+
+        Arguments:
+            store (int | frozenset of int): The positions, either packed into an integer or as a frozenset.
+            universe_size (int): The number of elements in the universe.
+            arity (int): The length of each tuple in the relation.
+            complemented (bool): Whether `store` holds the positions excluded from the relation rather than those
+                included in it.
+            allow_complemented (bool): Whether the complemented sparse representation may be chosen.
+
+        Returns:
+            Relation: The relation described by `store`.
+        """
+
+        rel = cls.__new__(cls)
+        rel._arity = arity
+        rel._universe_size = universe_size
+        rel._set_store(store, complemented, allow_complemented)
+        rel._hash = None
+        rel._fingerprint = None
+        return rel
+
+    @classmethod
+    def from_bits(cls, bits, universe_size, arity, complemented=False):
+        """
+        Create a relation directly from its packed representation, skipping the conversion from tuples.
+
+        Arguments:
+            bits (int): The packed representation of the relation. See `bits` for the encoding.
+            universe_size (int): The number of elements in the universe.
+            arity (int): The length of each tuple in the relation.
+            complemented (bool): Whether `bits` records the tuples excluded from the relation rather than those
+                included in it.
+
+        Returns:
+            Relation: The relation whose packed representation is `bits`.
+        """
+
+        return cls._from_store(bits, universe_size, arity, complemented)
+
+    @classmethod
+    def from_frozenset(cls, tuples, universe_size, arity):
+        """
+        Create a relation from a frozenset of tuples, without checking that they lie in the universe. Only the
+        positions of the tuples are kept, so the frozenset is not held on to.
+
+        Arguments:
+            tuples (frozenset of tuple of int): The tuples belonging to the relation. These should all have length
+                `arity` and have entries in the universe.
+            universe_size (int): The number of elements in the universe.
+            arity (int): The length of each tuple in the relation.
+
+        Returns:
+            Relation: The relation whose tuples are those in `tuples`.
+        """
+
+        positions = []
+        for tup in tuples:
+            position = 0
+            for entry in tup:
+                position = position * universe_size + entry
+            positions.append(position)
+        return cls._from_store(frozenset(positions), universe_size, arity)
+
+    @classmethod
+    def from_coords(cls, coords, universe_size):
+        """
+        Create a relation from an array of coordinates, without checking that they lie in the universe.
+
+        Arguments:
+            coords (numpy.ndarray): An integer array of shape `(number of tuples, arity)` whose rows are the tuples
+                belonging to the relation. Repeated rows are allowed.
+            universe_size (int): The number of elements in the universe.
+
+        Returns:
+            Relation: The relation whose tuples are the rows of `coords`.
+        """
+
+        coords = numpy.asarray(coords, dtype=numpy.int64)
+        arity = coords.shape[1]
+        # Find the position of each row in the lexicographic order by taking its dot product with the place values.
+        positions = numpy.unique(coords @ (universe_size ** numpy.arange(arity - 1, -1, -1, dtype=numpy.int64)))
+        if choose_representation(len(positions), universe_size ** arity) == 'dense':
+            members = numpy.zeros(universe_size ** arity, dtype=numpy.bool_)
+            members[positions] = True
+            return cls._from_store(int.from_bytes(numpy.packbits(members, bitorder='little').tobytes(), 'little'),
+                                   universe_size, arity)
+        return cls._from_store(frozenset(positions.tolist()), universe_size, arity)
+
+    @classmethod
+    def from_array(cls, array):
+        """
+        Create a relation from a boolean array with one axis for each coordinate.
+
+        Argument:
+            array (numpy.ndarray): An array of shape `(universe_size,) * arity` whose entry at a tuple is True exactly
+                when that tuple belongs to the relation, such as a binary image.
+
+        Returns:
+            Relation: The relation described by `array`.
+        """
+
+        array = numpy.asarray(array, dtype=numpy.bool_)
+        universe_size = cube_side(array)
+        # Flattening the array lists its entries in the lexicographic order of their indices, which is the order of the
+        # positions.
+        bits = int.from_bytes(numpy.packbits(array.ravel(), bitorder='little').tobytes(), 'little')
+        return cls._from_store(bits, universe_size, array.ndim)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Create several relations at once from a stack of boolean arrays, such as a dataset of binary images.
+
+        Argument:
+            arrays (numpy.ndarray): An array of shape `(N,) + (universe_size,) * arity` whose `i`th entry describes the
+                `i`th relation as in `from_array`.
+
+        Returns:
+            list of Relation: The `N` relations described by `arrays`, in order.
+        """
+
+        arrays = numpy.asarray(arrays, dtype=numpy.bool_)
+        assert arrays.ndim >= 1 and len(set(arrays.shape[1:])) <= 1
+        universe_size = arrays.shape[1] if arrays.ndim > 1 else 1
+        arity = arrays.ndim - 1
+        # All the relations are packed in one call, after which each one only has to be read off as an integer.
+        data = numpy.packbits(arrays.reshape(len(arrays), -1), axis=1, bitorder='little').tobytes()
+        row_bytes = (universe_size ** arity + 7) // 8
+        return [cls._from_store(int.from_bytes(data[start:start + row_bytes], 'little'), universe_size, arity)
+                for start in range(0, len(data), row_bytes)]
+
+    def to_array(self):
+        """
+        Describe the relation by a boolean array with one axis for each coordinate. This is the inverse of
+        `from_array`.
+
+        Returns:
+            numpy.ndarray: An array of shape `(universe_size,) * arity` whose entry at a tuple is True exactly when that
+                tuple belongs to the relation.
+        """
+
+        positions = self.universe_size ** self.arity
+        packed = numpy.frombuffer(self.bits.to_bytes((positions + 7) // 8, 'little'), dtype=numpy.uint8)
+        return numpy.unpackbits(packed, count=positions, bitorder='little').view(numpy.bool_).reshape(
+            (self.universe_size,) * self.arity)
+
+    def _position(self, tup):
+        """
+        Find the position of a tuple in the lexicographic ordering of the appropriate Cartesian power of the universe.
+
+        Argument:
+            tup (tuple of int): The tuple whose position we want. Its entries must lie in the universe.
+
+        Returns:
+            int: The index of the bit corresponding to `tup` in the packed representation of a relation.
+        """
+
+        assert len(tup) == self.arity
+        position = 0
+        for entry in tup:
+            assert 0 <= entry < self.universe_size
+            position = position * self.universe_size + entry
+        return position
+
+    def _tuple_at(self, position):
+        """
+        Recover the tuple sitting at a given position of the lexicographic ordering of the Cartesian power of the
+        universe. This is the inverse of `_position`.
+
+        Argument:
+            position (int): The index of a bit in the packed representation of a relation.
+
+        Returns:
+            tuple of int: The tuple corresponding to that bit.
+        """
+
+        entries = []
+        for _ in range(self.arity):
+            position, entry = divmod(position, self.universe_size)
+            entries.append(entry)
+        return tuple(reversed(entries))
+
+    def _positions(self):
+        """
+        Produce the positions of the tuples in the relation, in increasing order.
+
+        Yields:
+            int: The index of a set bit of `self.bits`.
+        """
+
+        if type(self._store) is int:
+            stored = unpack_positions(self._store)
+        else:
+            stored = sorted(self._store)
+        if self._complemented:
+            # Fill in the gaps between the excluded positions.
+            start = 0
+            for position in stored:
+                yield from range(start, position)
+                start = position + 1
+            yield from range(start, self.universe_size ** self.arity)
+        else:
+            yield from stored
 
     @property
     def tuples(self):
-        return self._tuples
+        # Holding on to the frozenset would cost far more memory than the stored positions, so it is always rebuilt from
+        # them.
+        return frozenset(map(self._tuple_at, self._positions()))
+
+    @property
+    def bits(self):
+        """
+        The packed representation of the relation. The tuples in the Cartesian power of the universe are ordered
+        lexicographically, and the bit of `bits` at the position of a tuple is set exactly when that tuple belongs to
+        the relation. This has to be computed unless the relation is dense.
+        """
+
+        if self._complemented:
+            return self._full_bits() ^ _as_int(self._store)
+        return _as_int(self._store)
+
+    @property
+    def representation(self):
+        """
+        The representation in which the relation is stored. See `choose_representation` for the possible values.
+        """
+
+        if self._complemented:
+            return 'complemented sparse'
+        if type(self._store) is int:
+            return 'dense'
+        return 'sparse'
+
+    @property
+    def complemented(self):
+        """
+        Whether the relation is stored in complemented form, by the tuples it excludes.
+        """
+
+        return self._complemented
 
     @property
     def universe_size(self):
@@ -75,6 +837,101 @@ class Relation:
     def arity(self):
         return self._arity
 
+    def _full_bits(self):
+        """
+        Give the packed representation of the full relation with the same universe and arity.
+
+        Returns:
+            int: An integer whose lowest `universe_size ** arity` bits are set.
+        """
+
+        return (1 << self.universe_size ** self.arity) - 1
+
+    def materialize(self):
+        """
+        Convert a relation in complemented form to an equal relation which stores the tuples it includes.
+
+        Returns:
+            Relation: A relation equal to this one which is not in complemented form. This is the relation itself if it
+                is already in that form.
+        """
+
+        if self._complemented:
+            return self._from_store(self._store, self.universe_size, self.arity, True, allow_complemented=False)
+        return self
+
+    def _combine(self, store, complemented):
+        """
+        Create a relation with the same universe and arity as this one from a set of positions.
+
+        Arguments:
+            store (int | frozenset of int): The positions, either packed into an integer or as a frozenset.
+            complemented (bool): Whether `store` holds the positions excluded from the new relation.
+
+        Returns:
+            Relation: The new relation.
+        """
+
+        rel = object.__new__(type(self))
+        rel._arity = self._arity
+        rel._universe_size = self._universe_size
+        rel._set_store(store, complemented)
+        rel._hash = None
+        rel._fingerprint = None
+        return rel
+
+    def _canonical(self):
+        """
+        Give the stored form of the relation in the representation chosen by `choose_representation`. Every relation is
+        already in this form unless it came from `materialize`, so this depends only on the tuples of the relation.
+
+        Returns:
+            tuple: A pair consisting of a packed integer or frozenset of positions and whether it is complemented.
+        """
+
+        if self.representation == choose_representation(len(self), self.universe_size ** self.arity):
+            return self._store, self._complemented
+        rel = self._combine(self._store, self._complemented)
+        return rel._store, rel._complemented
+
+    def _stored(self):
+        """
+        Give the stored form of the relation, for code which works with stored forms directly.
+
+        Returns:
+            tuple: A packed integer or frozenset of positions and whether it is complemented.
+        """
+
+        return self._store, self._complemented
+
+    def _store_nbytes(self):
+        """
+        Measure the memory used by the stored positions of the relation.
+
+        Returns:
+            int: The number of bytes taken up by the packed integer or frozenset of positions.
+        """
+
+        nbytes = sys.getsizeof(self._store)
+        if type(self._store) is frozenset:
+            nbytes += sum(sys.getsizeof(position) for position in self._store)
+        return nbytes
+
+    def __reduce_ex__(self, protocol):
+        """
+        Prepare the relation for pickling.
+
+        Argument:
+            protocol (int): The pickle protocol in use.
+
+        Returns:
+            tuple: The function `_unpickle_relation` and its arguments, with the stored positions given as a buffer by
+                `_pickled_store`.
+        """
+
+        data = _pickled_store(self._store, self._universe_size ** self._arity, protocol)
+        return _unpickle_relation, (type(self), data, self._universe_size, self._arity, self._complemented)
+
     def __len__(self):
         """
         Give the number of tuples in the relation.
@@ -83,7 +940,7 @@ class Relation:
             int: The number of tuples in `self.tuples`.
         """
 
-        return len(self.tuples)
+        return self._size
 
     def __str__(self):
         """
@@ -116,17 +973,87 @@ class Relation:
             bool: True when `tup` belongs to `self.tuples`, False otherwise.
         """
 
-        return tup in self.tuples
+        # Anything which is not a tuple of the right shape over the universe cannot belong to the relation.
+        if not isinstance(tup, tuple) or len(tup) != self.arity:
+            return False
+        position = 0
+        for entry in tup:
+            if not 0 <= entry < self.universe_size:
+                return False
+            position = position * self.universe_size + entry
+        return self._has_position(position)
+
+    def _has_position(self, position):
+        """
+        Check whether the tuple at a given position belongs to the relation.
+
+        Argument:
+            position (int): The index of a bit in the packed representation of a relation.
+
+        Returns:
+            bool: True when the tuple at `position` belongs to the relation, False otherwise.
+        """
+
+        if type(self._store) is int:
+            return bool(self._store >> position & 1) != self._complemented
+        return (position in self._store) != self._complemented
+
+    def flip(self, tup):
+        """
+        Add a tuple to the relation if it is absent, or remove it if it is present. This moves to a neighbor in the
+        Hamming graph.
+
+        The new relation shares the storage of this one and only records which tuples were flipped, so it is made in
+        constant time. See `PatchedRelation` for details.
+
+        Argument:
+            tup (tuple of int): The tuple to flip. Its entries must lie in the universe.
+
+        Returns:
+            Relation: The relation differing from this one in exactly `tup`.
+        """
+
+        return PatchedRelation(self, self._position(tup))
+
+    def add(self, tup):
+        """
+        Add a tuple to the relation, sharing storage as in `flip`.
+
+        Argument:
+            tup (tuple of int): The tuple to add. Its entries must lie in the universe.
+
+        Returns:
+            Relation: The relation with `tup` added, which is this one if it already contains `tup`.
+        """
+
+        if self._has_position(self._position(tup)):
+            return self
+        return self.flip(tup)
+
+    def remove(self, tup):
+        """
+        Remove a tuple from the relation, sharing storage as in `flip`.
+
+        Argument:
+            tup (tuple of int): The tuple to remove. Its entries must lie in the universe.
+
+        Returns:
+            Relation: The relation with `tup` removed, which is this one if it does not contain `tup`.
+        """
+
+        if not self._has_position(self._position(tup)):
+            return self
+        return self.flip(tup)
 
     def __iter__(self):
         """
         Produce an iterator for the tuples in the relation.
 
         Returns:
-            frozenset: The set of tuples in the relation.
+            iterator: The tuples in the relation, in lexicographic order.
         """
 
-        return iter(self.tuples)
+        return map(self._tuple_at, self._positions())
 
     def __bool__(self):
         """
@@ -136,7 +1063,7 @@ class Relation:
             bool: True when self.tuples is nonempty, False otherwise.
         """
 
-        return bool(self.tuples)
+        return self._size > 0
 
     def show(self, special_binary_display=None):
         """
@@ -192,7 +1119,7 @@ class Relation:
             bool: True when the two relations have the same universe and arity, False otherwise.
         """
 
-        return self.universe_size == other.universe_size and self.arity == other.arity
+        return self._universe_size == other.universe_size and self._arity == other.arity
 
     def __hash__(self):
         """
@@ -202,7 +1129,68 @@ class Relation:
             int: The hash value of the `Relation` object.
         """
 
-        return hash((self.tuples, self.universe_size, self.arity))
+        if self._hash is None:
+            self._hash = hash(self._key())
+        return self._hash
+
+    def _key(self):
+        """
+        Give a hashable value which determines the relation, regardless of the form in which it is stored.
+
+        Returns:
+            tuple: The canonical packed representation of the relation together with its universe size and arity.
+        """
+
+        return self._canonical(), self.universe_size, self.arity
+
+    @property
+    def fingerprint(self):
+        """
+        A 128-bit digest of the contents of the relation. Unlike the hash value, which Python salts differently in every
+        process, the fingerprint of a relation is the same in every process and every run, so it can be used as a key
+        for caches shared between processes or kept on disk. It is computed with BLAKE2b from `canonical_encoding` the
+        first time it is needed and then remembered.
+        """
+
+        if self._fingerprint is None:
+            self._fingerprint = int.from_bytes(blake2b(self.canonical_encoding(), digest_size=16).digest(), 'little')
+        return self._fingerprint
+
+    def canonical_encoding(self):
+        """
+        Encode the relation as bytes which depend only on its universe size, arity, and tuples, and not on how it is
+        stored, so that its fingerprint stays the same if `DENSE_POSITIONS` or `SPARSE_DENSITY` are tuned.
+
+        Returns:
+            bytes: The universe size and arity, then a tag saying whether the relation is listed by the positions of its
+                tuples or, when it has more than half of the possible tuples, by the positions of the tuples it does
+                not have, and then those positions in increasing order, each written as a little-endian integer with
+                just enough bytes for the largest possible position.
+        """
+
+        positions = self.universe_size ** self.arity
+        members = 2 * len(self) <= positions
+        store, complemented = self._stored()
+        if members == complemented:
+            # The stored positions are those of the other side, so we list their complement in the Cartesian power.
+            store = ((1 << positions) - 1) ^ _as_int(store)
+        tag = b'+' if members else b'-'
+        return '{} {} '.format(self.universe_size, self.arity).encode() + tag + _encode_positions(store, positions)
+
+    def intern(self, pool=None):
+        """
+        Find the canonical object equal to this relation in an interning pool. See `RelationPool` for details.
+
+        Argument:
+            pool (RelationPool): The pool to use. The default is the module-level `relation_pool`.
+
+        Returns:
+            Relation: The object in the pool which is equal to this relation.
+        """
+
+        if pool is None:
+            pool = relation_pool
+        return pool.intern(self)
 
     @comparison
     def __eq__(self, other):
@@ -216,7 +1204,93 @@ class Relation:
             bool: True when self.tuples is equal to other.tuples and False otherwise.
         """
 
-        return self.tuples == other.tuples
+        # Interned relations are only equal when they are identical, and equal relations have equal hash values.
+        if self is other:
+            return True
+        if self._hash is not None and other._hash is not None and self._hash != other._hash:
+            return False
+        if self._size != other._size:
+            return False
+        return self._canonical() == other._canonical()
+
+    # The following methods count the tuples in combinations of two relations without creating the combinations. Each
+    # one comes down to the size of the intersection of the stored forms, since the sizes of the relations themselves
+    # are known.
+
+    @comparison
+    def intersection_size(self, other):
+        """
+        Count the tuples in both of two relations.
+
+        Argument:
+            other (Relation): The other relation.
+
+        Returns:
+            int: The size of `self & other`.
+        """
+
+        shared = _intersection_count(self._store, other._store)
+        if self._complemented:
+            if other._complemented:
+                # Both stored forms hold excluded positions, so we count the positions excluded by neither.
+                positions = self._universe_size ** self._arity
+                return positions - (positions - self._size) - (positions - other._size) + shared
+            return other._size - shared
+        if other._complemented:
+            return self._size - shared
+        return shared
+
+    def union_size(self, other):
+        """
+        Count the tuples in either of two relations.
+
+        Argument:
+            other (Relation): The other relation.
+
+        Returns:
+            int: The size of `self | other`.
+        """
+
+        return len(self) + len(other) - self.intersection_size(other)
+
+    def difference_size(self, other):
+        """
+        Count the tuples in this relation but not in another one.
+
+        Argument:
+            other (Relation): The other relation.
+
+        Returns:
+            int: The size of `self - other`.
+        """
+
+        return len(self) - self.intersection_size(other)
+
+    def symmetric_difference_size(self, other):
+        """
+        Count the tuples in exactly one of two relations. This is their distance in the Hamming graph.
+
+        Argument:
+            other (Relation): The other relation.
+
+        Returns:
+            int: The size of `self ^ other`.
+        """
+
+        return len(self) + len(other) - 2 * self.intersection_size(other)
+
+    def issubset(self, other):
+        """
+        Check whether the relation is contained in another relation. This is the same as `self <= other`.
+
+        Argument:
+            other (Relation): The other relation.
+
+        Returns:
+            bool: True when every tuple of `self` belongs to `other`, False otherwise.
+        """
+
+        return len(self) <= len(other) and self.intersection_size(other) == len(self)
 
     @comparison
     def __lt__(self, other):
@@ -230,7 +1304,7 @@ class Relation:
             bool: True when self.tuples is a proper subset of other.tuples and False otherwise.
         """
 
-        return self.tuples < other.tuples
+        return len(self) < len(other) and self.intersection_size(other) == len(self)
 
     @comparison
     def __le__(self, other):
@@ -244,7 +1318,7 @@ class Relation:
             bool: True when self.tuples is a subset of other.tuples and False otherwise.
         """
 
-        return self.tuples <= other.tuples
+        return self.issubset(other)
 
     @comparison
     def __gt__(self, other):
@@ -258,7 +1332,7 @@ class Relation:
             bool: True when self.tuples is a proper superset of other.tuples and False otherwise.
         """
 
-        return self.tuples > other.tuples
+        return len(other) < len(self) and self.intersection_size(other) == len(other)
 
     @comparison
     def __ge__(self, other):
@@ -272,21 +1346,27 @@ class Relation:
             bool: True when self.tuples is a superset of other.tuples and False otherwise.
         """
 
-        return self.tuples >= other.tuples
+        return other.issubset(self)
 
     def __invert__(self):
         """
         Create the complement of a relation. That is, a tuple in the appropriate Cartesian power of the universe will
         belong to the complement if and only if it does not belong to the given relation.
 
+        The complement is stored in complemented form, so this takes no more time or memory than the relation itself.
+        Use `materialize` to convert the result to the usual form.
+
         Returns:
             Relation: The relation which is dual to the given relation in the above sense.
         """
 
-        return Relation((tup for tup in product(range(self.universe_size), repeat=self.arity) if tup not in self),
-                        self.universe_size, self.arity)
+        return self._combine(self._store, not self._complemented)
 
-    @comparison
+    # A relation in complemented form stands for the complement of its stored positions, so the set operations below
+    # are reduced to ones on stored forms by De Morgan's laws. For instance, the intersection of a relation with the
+    # complement of another is the difference of their stored forms.
+
+    @set_operator
     def __sub__(self, other):
         """
         Take the difference of two relations. This is the same as the set difference of their sets of tuples.
@@ -298,9 +1378,15 @@ class Relation:
             Relation: The relation with the same universe and arity as the inputs which is their set difference.
         """
 
-        return Relation(self.tuples.difference(other.tuples), self.universe_size, self.arity)
+        if not self._complemented:
+            if not other._complemented:
+                return self._combine(_difference(self._store, other._store), False)
+            return self._combine(_intersection(self._store, other._store), False)
+        if not other._complemented:
+            return self._combine(_union(self._store, other._store), True)
+        return self._combine(_difference(other._store, self._store), False)
 
-    @comparison
+    @set_operator
     def __and__(self, other):
         """
         Take the intersection of two relations. This is the same as bitwise multiplication.
@@ -312,9 +1398,15 @@ class Relation:
             Relation: The relation with the same universe and arity as the inputs which is their intersection.
         """
 
-        return Relation(self.tuples.intersection(other.tuples), self.universe_size, self.arity)
+        if not self._complemented:
+            if not other._complemented:
+                return self._combine(_intersection(self._store, other._store), False)
+            return self._combine(_difference(self._store, other._store), False)
+        if not other._complemented:
+            return self._combine(_difference(other._store, self._store), False)
+        return self._combine(_union(self._store, other._store), True)
 
-    @comparison
+    @set_operator
     def __or__(self, other):
         """
         Take the union of two relations. This is the same as bitwise disjunction.
@@ -326,9 +1418,15 @@ class Relation:
             Relation: The relation with the same universe and arity as the inputs which is their union.
         """
 
-        return Relation(self.tuples.union(other.tuples), self.universe_size, self.arity)
+        if not self._complemented:
+            if not other._complemented:
+                return self._combine(_union(self._store, other._store), False)
+            return self._combine(_difference(other._store, self._store), True)
+        if not other._complemented:
+            return self._combine(_difference(self._store, other._store), True)
+        return self._combine(_intersection(self._store, other._store), True)
 
-    @comparison
+    @set_operator
     def __xor__(self, other):
         """
         Take the symmetric difference of two relations. This is the same as bitwise addition.
@@ -340,9 +1438,10 @@ class Relation:
             Relation: The relation with the same universe and arity as the inputs which is their symmetric difference.
         """
 
-        return Relation(self.tuples.symmetric_difference(other.tuples), self.universe_size, self.arity)
+        return self._combine(_symmetric_difference(self._store, other._store),
+                             self._complemented != other._complemented)
 
-    @comparison
+    @set_operator
     def __isub__(self, other):
         """
         Take the set difference of two relations with augmented assignment.
@@ -356,7 +1455,7 @@ class Relation:
 
         return self - other
 
-    @comparison
+    @set_operator
     def __iand__(self, other):
         """
         Take the set intersection of two relations with augmented assignment.
@@ -370,7 +1469,7 @@ class Relation:
 
         return self & other
 
-    @comparison
+    @set_operator
     def __ior__(self, other):
         """
         Take the set union of two relations with augmented assignment.
@@ -384,7 +1483,7 @@ class Relation:
 
         return self | other
 
-    @comparison
+    @set_operator
     def __ixor__(self, other):
         """
         Take the symmetric difference of two relations with augmented assignment.
@@ -411,4 +1510,458 @@ class Relation:
             int: Either 0 or 1, depending on the parity of the number of tuples in `self` and `other`.
         """
 
-        return len(self & other) % 2
+        return self.intersection_size(other) & 1
+
+    # The following methods treat a binary relation as a boolean matrix whose entry in row `x` and column `y` is 1
+    # exactly when `(x, y)` belongs to the relation. Since the pairs are ordered lexicographically, row `x` holds the
+    # positions from `x * universe_size` to `(x + 1) * universe_size - 1`.
+
+    @classmethod
+    def identity(cls, universe_size):
+        """
+        Create the identity relation on a universe, which holds the pairs `(x, x)`.
+
+        Argument:
+            universe_size (int): The number of elements in the universe.
+
+        Returns:
+            Relation: The binary relation whose pairs are those with equal entries.
+        """
+
+        return cls._from_store(frozenset(range(0, universe_size * universe_size, universe_size + 1)), universe_size, 2)
+
+    def converse(self):
+        """
+        Take the converse of a binary relation, which holds the pairs `(y, x)` for which `(x, y)` belongs to the
+        relation. This is the transpose of the relation as a boolean matrix.
+
+        Returns:
+            Relation: The converse relation.
+        """
+
+        assert self.arity == 2
+        store, complemented = self._stored()
+        universe_size = self.universe_size
+        if type(store) is frozenset:
+            # Transposing the stored positions transposes their complement as well.
+            return self._from_store(frozenset(position % universe_size * universe_size + position // universe_size
+                                              for position in store), universe_size, 2, complemented)
+        return self.from_array(self.to_array().T)
+
+    @comparison
+    def compose(self, other):
+        """
+        Compose two binary relations. The composite, often written `R ; S`, holds the pairs `(x, z)` for which there is
+        some `y` such that `(x, y)` belongs to `R` and `(y, z)` belongs to `S`. It is the boolean matrix product of the
+        two relations, and is also available as `R @ S`.
+
+        Sparse relations are joined on their middle entries, which takes time proportional to the number of pairs
+        involved. Otherwise, the product is computed on rows packed into 64-bit words, either by a masked union of
+        whole rows or, on universes of more than 64 elements, by the method of Four Russians.
+
+        Argument:
+            other (Relation): The binary relation to follow this one. It must have the same universe.
+
+        Returns:
+            Relation: The composite of this relation followed by `other`.
+        """
+
+        assert self.arity == 2
+        universe_size = self.universe_size
+        x, x_complemented = self._stored()
+        y, y_complemented = other._stored()
+        if type(x) is frozenset and type(y) is frozenset and not x_complemented and not y_complemented:
+            successors = {}
+            for position in y:
+                middle, end = divmod(position, universe_size)
+                successors.setdefault(middle, []).append(end)
+            positions = set()
+            for position in x:
+                # The pair `(start, middle)` at this position is extended by replacing `middle` with each successor.
+                middle = position % universe_size
+                positions.update(position - middle + end for end in successors.get(middle, ()))
+            return self._from_store(frozenset(positions), universe_size, 2)
+        product = _boolean_product(self.to_array(), _word_rows(other.to_array()))
+        matrix = numpy.unpackbits(product.view(numpy.uint8), axis=1, count=universe_size, bitorder='little')
+        return self._from_store(int.from_bytes(numpy.packbits(matrix, bitorder='little').tobytes(), 'little'),
+                                universe_size, 2)
+
+    def __matmul__(self, other):
+        return self.compose(other)
+
+    def power(self, exponent):
+        """
+        Compose a binary relation with itself a number of times, by repeated squaring.
+
+        Argument:
+            exponent (int): The number of copies of the relation to compose. The zeroth power is the identity relation.
+
+        Returns:
+            Relation: The relation holding the pairs joined by a path of exactly `exponent` steps in this relation.
+        """
+
+        assert self.arity == 2 and exponent >= 0
+        result = self.identity(self.universe_size)
+        square = self
+        while exponent:
+            if exponent & 1:
+                result = result.compose(square)
+            exponent >>= 1
+            if exponent:
+                square = square.compose(square)
+        return result
+
+    def closure(self):
+        """
+        Take the reflexive-transitive closure of a binary relation, which is the smallest reflexive and transitive
+        relation containing it. It is found by squaring the relation together with the identity until nothing changes,
+        which takes about `log2(universe_size)` compositions.
+
+        Returns:
+            Relation: The relation holding the pairs joined by a path of any length, including zero, in this relation.
+        """
+
+        assert self.arity == 2
+        closure = self | self.identity(self.universe_size)
+        while True:
+            square = closure.compose(closure)
+            if square == closure:
+                return closure
+            closure = square
+
+
+# The descriptors for the slots of `Relation` which `PatchedRelation` fills in lazily.
+_STORE_SLOT = Relation._store
+_COMPLEMENTED_SLOT = Relation._complemented
+
+
+class PatchedRelation(Relation):
+    """
+    A relation obtained from a base relation by flipping some tuples. It keeps a reference to the base relation and a
+    trie of the flipped positions instead of a stored form of its own, so it is made without copying the base. Flipping
+    a tuple of a patched relation makes another patched relation sharing the same base, whose trie shares all but one
+    path with the old one, so a walk through neighbors in the Hamming graph costs the same small amount of work per
+    step however large the relation is and however long the walk. A walk from a large packed integer copies it to
+    bytes once at its first step; see `PROBE_BITS`.
+
+    Membership tests, sizes, and further flips only look at the trie and the base. Anything else, such as a set
+    operation or a hash value, applies the patch the first time it needs the stored form, which takes time proportional
+    to the size of the base and the number of flips. After that the relation behaves exactly like an ordinary relation
+    and no longer refers to its base. Relations produced from a patched relation are ordinary relations.
+    """
+
+    __slots__ = ('_base', '_probe', '_flips', '_levels')
+
+    def __init__(self, rel, position):
+        """
+        Flip the tuple at a given position of a relation.
+
+        Arguments:
+            rel (Relation): The relation to flip a tuple of.
+            position (int): The position of the tuple to flip.
+        """
+
+        if type(rel) is PatchedRelation and rel._base is not None:
+            self._base, self._probe, self._levels = rel._base, rel._probe, rel._levels
+            self._flips = _trie_flip(rel._flips, position, rel._levels)
+        else:
+            self._base = rel
+            self._probe = None
+            if rel.representation == 'dense' and rel._store.bit_length() > PROBE_BITS:
+                self._probe = rel._store.to_bytes((rel._store.bit_length() + 7) // 8, 'little')
+            self._levels = _trie_levels(rel._universe_size ** rel._arity)
+            self._flips = _trie_flip(None, position, self._levels)
+        self._universe_size = rel._universe_size
+        self._arity = rel._arity
+        self._size = rel._size - 1 if rel._has_position(position) else rel._size + 1
+        self._hash = None
+        self._fingerprint = None
+
+    def _apply(self):
+        """
+        Apply the patch to a copy of the stored form of the base relation and store the result in this relation.
+        """
+
+        base, flips = self._base, frozenset(_trie_positions(self._flips, self._levels))
+        self._base = None
+        self._probe = None
+        self._flips = None
+        store = base._store
+        # Flipping a position changes whether it is stored, whether or not the stored form is complemented.
+        if type(store) is int:
+            store = store ^ pack_positions(flips)
+        else:
+            store = store ^ flips
+        self._set_store(store, base._complemented)
+
+    @property
+    def _store(self):
+        if self._base is not None:
+            self._apply()
+        return _STORE_SLOT.__get__(self)
+
+    @_store.setter
+    def _store(self, store):
+        _STORE_SLOT.__set__(self, store)
+
+    @property
+    def _complemented(self):
+        if self._base is not None:
+            self._apply()
+        return _COMPLEMENTED_SLOT.__get__(self)
+
+    @_complemented.setter
+    def _complemented(self, complemented):
+        _COMPLEMENTED_SLOT.__set__(self, complemented)
+
+    def _has_position(self, position):
+        if self._base is None:
+            return Relation._has_position(self, position)
+        if self._probe is None:
+            present = self._base._has_position(position)
+        else:
+            index = position >> 3
+            present = (index < len(self._probe) and bool(self._probe[index] >> (position & 7) & 1)) != \
+                self._base._complemented
+        return present != _trie_has(self._flips, position, self._levels)
+
+    @classmethod
+    def _from_store(cls, store, universe_size, arity, complemented=False, allow_complemented=True):
+        return Relation._from_store(store, universe_size, arity, complemented, allow_complemented)
+
+    def _combine(self, store, complemented):
+        return Relation._from_store(store, self._universe_size, self._arity, complemented)
+
+    def _store_nbytes(self):
+        # Until the patch is applied, the storage of the base and most of the trie are shared with other relations, so
+        # only one path from the root of the trie to a leaf is counted, as that is what each flip copies.
+        if self._base is not None:
+            nbytes = 0
+            node = self._flips
+            while type(node) is tuple:
+                nbytes += sys.getsizeof(node)
+                node = next(child for child in node if child is not None)
+            return nbytes + sys.getsizeof(node)
+        return Relation._store_nbytes(self)
+
+    def __reduce_ex__(self, protocol):
+        function, arguments = Relation.__reduce_ex__(self, protocol)
+        return function, (Relation,) + arguments[1:]
+
+
+def relation_nbytes(rel):
+    """
+    Measure the memory used by a single relation.
+
+    Argument:
+        rel (Relation): The relation to measure.
+
+    Returns:
+        int: The number of bytes taken up by the relation object and its stored positions.
+    """
+
+    return sys.getsizeof(rel) + rel._store_nbytes()
+
+
+def memory_report(data):
+    """
+    Measure the memory used by a dataset of relations. The dataset may be a relation or any nesting of tuples, lists,
+    and dictionaries with relations inside, such as the training pairs produced by
+    `mnist_training_binary.build_training_data`. A relation which appears several times, such as an interned relation
+    or one of the targets 'Empty' and 'Full', is only counted once.
+
+    Argument:
+        data (Relation | tuple | list | dict): The dataset to measure.
+
+    Returns:
+        dict: A dictionary with the following keys.
+            'relations' (int): The number of places in the dataset holding a relation.
+            'distinct_relations' (int): The number of distinct relation objects in the dataset.
+            'relation_bytes' (int): The bytes used by the distinct relations.
+            'container_bytes' (int): The bytes used by the tuples, lists, and dictionaries holding them.
+            'total_bytes' (int): The sum of the previous two.
+            'bytes_per_relation' (float): The average number of bytes used by each distinct relation.
+    """
+
+    report = {'relations': 0, 'distinct_relations': 0, 'relation_bytes': 0, 'container_bytes': 0}
+    seen = set()
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Relation):
+            report['relations'] += 1
+            if id(item) not in seen:
+                seen.add(id(item))
+                report['distinct_relations'] += 1
+                report['relation_bytes'] += relation_nbytes(item)
+        elif isinstance(item, (tuple, list, dict)):
+            report['container_bytes'] += sys.getsizeof(item)
+            if isinstance(item, dict):
+                stack.extend(item.values())
+            else:
+                stack.extend(item)
+    report['total_bytes'] = report['relation_bytes'] + report['container_bytes']
+    report['bytes_per_relation'] = report['relation_bytes'] / max(1, report['distinct_relations'])
+    return report
+
+
+class DatasetFingerprint:
+    """
+    A running fingerprint of a dataset of relations, which is stable across processes and runs like
+    `Relation.fingerprint`. Parts of the dataset are fed in with `update` as they are produced, and each relation only
+    contributes its own cached fingerprint, so extending a dataset costs a few bytes of hashing for each new relation.
+
+    The dataset may be any nesting of tuples, lists, and dictionaries with relations inside, along with plain values
+    such as labels, which are included by their `repr`. Both the order and the nesting are taken into account.
+    """
+
+    def __init__(self, data=()):
+        """
+        Start a fingerprint.
+
+        Argument:
+            data (iterable): The first items of the dataset, if any.
+        """
+
+        self._digest = blake2b(digest_size=16)
+        for item in data:
+            self.update(item)
+
+    def update(self, item):
+        """
+        Add an item to the end of the dataset.
+
+        Argument:
+            item (Relation | tuple | list | dict | object): The item to add.
+        """
+
+        stack = [item]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, Relation):
+                self._digest.update(b'R' + item.fingerprint.to_bytes(16, 'little'))
+            elif isinstance(item, (tuple, list)):
+                self._digest.update('({} '.format(len(item)).encode())
+                stack.extend(reversed(item))
+            elif isinstance(item, dict):
+                self._digest.update('{{{} '.format(len(item)).encode())
+                for key, value in reversed(item.items()):
+                    stack.extend((value, key))
+            else:
+                self._digest.update('V{!r} '.format(item).encode())
+
+    def copy(self):
+        """
+        Copy the fingerprint, so that the dataset can be extended in different ways.
+
+        Returns:
+            DatasetFingerprint: A fingerprint of the same dataset.
+        """
+
+        other = DatasetFingerprint()
+        other._digest = self._digest.copy()
+        return other
+
+    @property
+    def value(self):
+        """
+        The 128-bit fingerprint of the items added so far.
+        """
+
+        return int.from_bytes(self._digest.digest(), 'little')
+
+
+def dataset_fingerprint(data):
+    """
+    Find the fingerprint of a whole dataset, such as the training pairs produced by
+    `mnist_training_binary.build_training_data`.
+
+    Argument:
+        data (iterable): The items of the dataset. See `DatasetFingerprint` for what these may be.
+
+    Returns:
+        int: The 128-bit fingerprint of the dataset.
+    """
+
+    return DatasetFingerprint(data).value
+
+
+class RelationPool:
+    """
+    A pool for interning relations. Interning a relation gives back a single canonical object for all the relations
+    equal to it, with its hash value already computed. When the relations used as keys in dictionaries, such as the
+    memoized values of an `Operation`, are interned, looking them up only requires comparing identities.
+
+    The pool only holds weak references to the canonical objects, so relations which are no longer in use elsewhere are
+    freed as usual and dropped from the pool.
+
+    Attributes:
+        hits (int): The number of times a relation was interned and an equal relation was already in the pool.
+        misses (int): The number of times a relation was interned and became the canonical object itself.
+    """
+
+    def __init__(self):
+        """
+        Create an empty interning pool.
+        """
+
+        self._relations = WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """
+        Give the number of canonical relations currently alive in the pool.
+
+        Returns:
+            int: The number of relations in the pool.
+        """
+
+        return len(self._relations)
+
+    def intern(self, rel):
+        """
+        Find the canonical object equal to a given relation, adding the relation to the pool if there is none yet.
+
+        Argument:
+            rel (Relation): The relation to intern.
+
+        Returns:
+            Relation: The object in the pool which is equal to `rel`.
+        """
+
+        key = rel._key()
+        canonical = self._relations.get(key)
+        if canonical is None:
+            self.misses += 1
+            rel._hash = hash(key)
+            self._relations[key] = rel
+            return rel
+        self.hits += 1
+        return canonical
+
+    @property
+    def hit_rate(self):
+        """
+        The proportion of calls to `intern` which found an equal relation already in the pool, or 0 if there have not
+        been any calls.
+        """
+
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def __str__(self):
+        """
+        Display basic information about the pool.
+
+        Returns:
+            str: The number of relations in the pool and its hit rate.
+        """
+
+        return 'A relation pool containing {} relations with a hit rate of {:.1%}'.format(len(self), self.hit_rate)
+
+
+# The default pool used by `Relation.intern`.
+relation_pool = RelationPool()
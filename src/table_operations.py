@@ -0,0 +1,123 @@
+"""
+Operations on finite universes stored as tables
+"""
+from hashlib import blake2b
+from itertools import product
+import numpy
+from operations import Operation
+from relations import cube_side
+
+
+class TableOperation(Operation):
+    """
+    An operation on the universe `{0, ..., order - 1}` stored as its Cayley table, an array with one axis for each
+    argument whose entry at a tuple of arguments is the value there. A single value is one array lookup, and the values
+    on whole columns of arguments are found at once by fancy indexing in `evaluate_batch`, so a neural net whose
+    activation functions are tables can be evaluated on a whole training set in a few array operations per neuron.
+    Arguments outside the universe raise a `ValueError`, rather than being wrapped around as negative indices would be
+    by numpy.
+
+    Attributes:
+        table (numpy.ndarray): The read-only array of shape `(order,) * arity` holding the values of the operation.
+        order (int): The size of the universe.
+    """
+
+    def __init__(self, table):
+        """
+        Create an operation from its table.
+
+        Argument:
+            table (numpy.ndarray): An integer array of shape `(order,) * arity` whose entries lie in
+                `{0, ..., order - 1}`. It is copied, so it may be changed afterwards.
+        """
+
+        table = numpy.array(table, dtype=numpy.int64)
+        order = cube_side(table)
+        table.flags.writeable = False
+        self.table = table
+        self.order = order if table.ndim else None
+        self._spec = None
+        if table.ndim == 0:
+            Operation.__init__(self, 0, table.item(), cache_values=False)
+        else:
+            item = table.item
+
+            def func(*tup):
+                for argument in tup:
+                    if not 0 <= argument < order:
+                        raise ValueError('The argument {} does not lie in the universe of size {}.'.format(argument,
+                                                                                                          order))
+                return item(*tup)
+
+            # Looking a tuple up in the table is already as fast as looking it up in a cache.
+            Operation.__init__(self, table.ndim, func, cache_values=False)
+
+    @classmethod
+    def from_operation(cls, op, order):
+        """
+        Tabulate an operation by evaluating it on every tuple of arguments.
+
+        Arguments:
+            op (Operation): The operation to tabulate. Its values on `{0, ..., order - 1}` must lie in the same set.
+            order (int): The size of the universe.
+
+        Returns:
+            TableOperation: The operation with the same values as `op`.
+        """
+
+        if op.arity == 0:
+            return cls(op())
+        table = numpy.empty((order,) * op.arity, dtype=numpy.int64)
+        for tup in product(range(order), repeat=op.arity):
+            table[tup] = op(*tup)
+        return cls(table)
+
+    @classmethod
+    def random(cls, order, arity, seed=None):
+        """
+        Choose an operation uniformly at random, as `random_neural_net.RandomOperation` does lazily.
+
+        Arguments:
+            order (int): The size of the universe.
+            arity (int): The arity of the operation.
+            seed (int): A seed for the random values, so that an operation can be made again.
+
+        Returns:
+            TableOperation: The random operation.
+        """
+
+        return cls(numpy.random.default_rng(seed).integers(order, size=(order,) * arity))
+
+    def spec(self):
+        """
+        Describe the operation by a digest of its table.
+
+        Returns:
+            tuple: The name of the class, the shape of the table, and the digest.
+        """
+
+        if self._spec is None:
+            self._spec = ('TableOperation', self.table.shape, blake2b(self.table.tobytes(), digest_size=16).hexdigest())
+        return self._spec
+
+    def _evaluate_batch(self, *columns):
+        """
+        Compute the values of the operation on many tuples of arguments at once.
+
+        Argument:
+            columns (tuple of numpy.ndarray): One integer array for each argument, all of the same shape, whose entries
+                at each index form a tuple of arguments.
+
+        Returns:
+            numpy.ndarray: The array of the values of the operation at those tuples.
+
+        Raises:
+            ValueError: If some argument does not lie in the universe.
+        """
+
+        assert len(columns) == self.arity
+        columns = tuple(numpy.asarray(column) for column in columns)
+        for column in columns:
+            if ((column < 0) | (column >= self.order)).any():
+                raise ValueError('Some argument does not lie in the universe of size {}.'.format(self.order))
+        return self.table[columns]
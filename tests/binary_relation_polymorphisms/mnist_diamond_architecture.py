@@ -1,9 +1,14 @@
 from neural_net import Neuron, Layer, NeuralNet
 from polymorphisms import RotationAutomorphism, IndicatorPolymorphism, polymorphism_neighbor_func, hamming_loss
 from mnist_training_binary import binary_mnist_zero_one
+from relation_batch import ParityGramEngine
 
 training_pairs = tuple(binary_mnist_zero_one(100, 'train'))
 constant_relations = tuple(pair[0]['x0'] for pair in training_pairs)
+# The dot products of the training inputs with every constant are computed once and shared by all the indicator
+# polymorphisms we try. Other inputs, such as rotated images, have their dot products taken one at a time.
+gram_engine = ParityGramEngine(constant_relations)
+gram_engine.prime(pair[0]['x0'] for pair in training_pairs)
 
 layer0 = Layer(('x0',))
 
@@ -19,7 +24,7 @@ net = NeuralNet([layer0, layer1, layer2])
 print(net.empirical_loss(training_pairs, hamming_loss))
 print()
 
-net.train(training_pairs, lambda op: polymorphism_neighbor_func(op, 4, constant_relations),
+net.train(training_pairs, lambda op: polymorphism_neighbor_func(op, 4, constant_relations, gram_engine=gram_engine),
           100, hamming_loss, report_loss=True)
 print()
 
@@ -0,0 +1,58 @@
+"""
+Array relations test
+"""
+import numpy
+from relations import Relation
+from array_relations import ArrayRelation
+from polymorphisms import HyperoctahedralAutomorphism
+
+print('An array relation is given by a boolean array with one axis for each coordinate.')
+array = numpy.zeros((3, 3, 3), dtype=bool)
+array[0, 1, 2] = True
+array[2, 2, 0] = True
+A = ArrayRelation(array)
+print(A)
+print(A.representation)
+print(sorted(A))
+print()
+
+print('Membership is a single lookup in the array.')
+print((0, 1, 2) in A)
+print((1, 1, 1) in A)
+print()
+
+print('Array relations are equal to, and hash like, ordinary relations with the same tuples.')
+R = Relation([(0, 1, 2), (2, 2, 0)], 3, 3)
+print(A == R)
+print(hash(A) == hash(R))
+print(A.to_relation().representation)
+print(ArrayRelation.from_relation(R) == A)
+print()
+
+print('Set operations may mix array relations and ordinary relations, and produce array relations.')
+S = Relation([(0, 1, 2), (1, 1, 1)], 3, 3)
+print(sorted(A & S), type(A & S).__name__)
+print(sorted(S | A), type(S | A).__name__)
+print(sorted(A ^ S))
+print(sorted(S - A))
+print(len(~A))
+print(A.dot(S))
+print()
+
+print('The coordinates can be permuted and reflected all at once.')
+print(sorted(A.permute_axes((2, 0, 1))))
+print(sorted(A.reflect((0,))))
+print()
+
+print('A hyperoctahedral automorphism applies a symmetry of the cube to a relation of any arity.')
+H = HyperoctahedralAutomorphism((1, 0, 2), (2,))
+print(sorted(H(R)))
+print()
+
+print('Voxel images at the size of MNIST digits are practical to work with.')
+rng = numpy.random.default_rng(0)
+V = ArrayRelation(rng.random((28, 28, 28)) < 0.1)
+W = ArrayRelation(rng.random((28, 28, 28)) < 0.1)
+print(V)
+print(len(V ^ W))
+print(HyperoctahedralAutomorphism.random(3)(V) != V)
@@ -0,0 +1,52 @@
+"""
+Cache policies test
+"""
+from relations import Relation
+from operations import Operation
+from caches import LRUCache, LFUCache, SizeBoundedCache, limit_cache_memory, set_default_cache
+
+R = Relation([(0, 0), (0, 1), (2, 0)], 3)
+S = Relation([(1, 1), (0, 1)], 3)
+T = Relation([(2, 2), (1, 0), (1, 2)], 3)
+
+print('By default, a memoized operation remembers every value it computes.')
+op = Operation(1, lambda x: ~x)
+for rel in (R, S, T):
+    op(rel)
+print(type(op.values).__name__, len(op.values))
+print()
+
+print('A least recently used cache keeps a fixed number of values, evicting the one used longest ago.')
+op = Operation(1, lambda x: ~x, cache=LRUCache(2))
+for rel in (R, S, R, T):
+    op(rel)
+print(op.values, (R,) in op.values, (S,) in op.values)
+print()
+
+print('A least frequently used cache instead evicts the value used the fewest times.')
+op = Operation(1, lambda x: ~x, cache=LFUCache(2))
+for rel in (R, R, S, T):
+    op(rel)
+print(op.values, (R,) in op.values, (S,) in op.values)
+print()
+
+print('A size-bounded cache keeps values up to a number of bytes.')
+op = Operation(2, lambda x, y: x ^ y, cache=SizeBoundedCache(max_bytes=1000))
+for rel in (R, S, T):
+    op(rel, R)
+print(op.values)
+print()
+
+print('A memory budget can be shared by the caches of all the operations made from now on.')
+print('Each live operation gets an equal share, and the caches already in use are trimmed as new ones join.')
+budget = limit_cache_memory(10000)
+ops = [Operation(1, lambda x: x ^ R) for _ in range(4)]
+print(budget, budget.share)
+for rel in (R, S, T):
+    for op in ops:
+        op(rel)
+ops += [Operation(1, lambda x: x ^ S) for _ in range(6)]
+print(budget, budget.nbytes <= budget.max_bytes)
+del ops
+print(len(budget))
+set_default_cache(None)
@@ -0,0 +1,29 @@
+"""
+Hamming index test
+"""
+from relations import Relation
+from hamming_index import HammingIndex
+
+R = Relation([(0, 0), (0, 1), (2, 0)], 3)
+S = Relation([(1, 1), (0, 1)], 3)
+T = Relation([(2, 2), (1, 0), (1, 2)], 3)
+
+print('An index holds relations so that those nearest to a query in the Hamming graph can be found quickly.')
+index = HammingIndex([R, S], tables=4, bits_per_key=3, seed=0)
+print(index)
+print()
+
+print('Relations can be added to the index at any time.')
+index.insert(T)
+print(len(index))
+print()
+
+print('The nearest relations are returned together with their distances from the query.')
+query = R.flip((1, 1))
+print([(sorted(rel), distance) for (rel, distance) in index.nearest(query, 2, exact=True)])
+print([distance for (_, distance) in index.nearest(query, 2)])
+print()
+
+print('We can also ask for every relation within a given distance.')
+print([distance for (_, distance) in index.within(query, 3, exact=True)])
+print(index.distances(query))
@@ -0,0 +1,38 @@
+"""
+Operation statistics test
+"""
+from relations import Relation
+from relation_batch import RelationBatch
+from operations import Projection
+from polymorphisms import RotationAutomorphism, SwappingAutomorphism
+from operation_stats import enable_stats, disable_stats
+
+R = Relation([(0, 0), (0, 1), (2, 0)], 3)
+S = Relation([(1, 1), (0, 1)], 3)
+
+print('Once statistics are enabled, every call to an operation is counted by the class of the operation.')
+rotation = RotationAutomorphism(1)
+swapping = SwappingAutomorphism(S)
+composite = rotation[swapping[Projection(2, 0)]]
+composite.memoize = True
+registry = enable_stats()
+for _ in range(3):
+    composite(R, S)
+    rotation(S)
+print(registry)
+print()
+
+print('Calls to evaluate_batch are counted once for each column, along with the operations they call in turn.')
+composite.evaluate_batch(RelationBatch.from_relations([R, S]), RelationBatch.from_relations([S, S]))
+print(registry['Composite'])
+print(registry['SwappingAutomorphism'])
+print()
+
+print('The counters for a class can be looked up by its name.')
+print(registry['RotationAutomorphism'].hit_rate, registry['RotationAutomorphism'].cache_size)
+print()
+
+print('Disabling the statistics stops the recording, while keeping the counters.')
+disable_stats()
+rotation(R)
+print(registry['RotationAutomorphism'].calls)
@@ -0,0 +1,58 @@
+"""
+Operations test
+"""
+import numpy
+from relations import Relation
+from relation_batch import RelationBatch
+from operations import Operation, Projection
+from arithmetic_operations import ModularAddition
+from polymorphisms import RotationAutomorphism, SwappingAutomorphism
+
+R = Relation([(0, 0), (0, 1), (2, 0)], 3)
+S = Relation([(1, 1), (0, 1)], 3)
+
+print('Operations can be composed. The composite of an operation with others of the same arity applies the outer\n\
+operation to the values of the inner ones.')
+union = Operation(2, lambda x, y: x | y)
+complement = Operation(1, lambda x: ~x)
+composite = union[complement[Projection(2, 0)], Projection(2, 1)]
+print(sorted(composite(R, S)))
+print()
+
+print('Composites are compiled into flat plans. Projections become references to the arguments, and an operation\n\
+applied to the same arguments in several places is only called once.')
+doubled = union[complement[Projection(2, 0)], complement[Projection(2, 0)]]
+print(len(composite.plan), len(doubled.plan), doubled(R, S) == ~R)
+print()
+
+print('However deeply composites are nested, they are evaluated in a single loop.')
+op = union
+for _ in range(500):
+    op = complement[op]
+print(len(op.plan), op(R, S) == R | S)
+print()
+
+print('Operations determined by a few parameters have specs, and so do composites built from them.')
+print('Memoized composites with the same spec share a cache of their values on relations, keyed by fingerprints.')
+first = RotationAutomorphism(1)[SwappingAutomorphism(S)[Projection(2, 0)]]
+second = RotationAutomorphism(1)[SwappingAutomorphism(S)[Projection(2, 0)]]
+first.memoize = second.memoize = True
+print(first.spec() == second.spec(), first.cache is second.cache)
+first(R, S)
+print(len(second.cache), second(Relation([(0, 0), (0, 1), (2, 0)], 3), S) == first(R, S))
+print(composite.spec())
+print()
+
+print('Operations can be evaluated on whole columns of inputs at once.')
+print('Columns of numbers are numpy arrays and columns of relations are batches.')
+print('Operations without a batch method of their own call themselves on each tuple in turn.')
+print(ModularAddition(7).evaluate_batch(numpy.arange(5), numpy.arange(5, 10)))
+print(Operation(2, lambda x, y: x * y).evaluate_batch([1, 2, 3], [4, 5, 6]))
+batch = RelationBatch.from_relations([R, S, R & S])
+rotated = RotationAutomorphism(1).evaluate_batch(batch)
+print(rotated, list(rotated) == [RotationAutomorphism(1)(rel) for rel in batch])
+print()
+
+print('Composites run their plans on whole columns, handing each step to the batch method of its operation.')
+values = first.evaluate_batch(batch, batch)
+print(list(values) == [first(rel, rel) for rel in batch])
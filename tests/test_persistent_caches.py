@@ -0,0 +1,74 @@
+"""
+Persistent caches test
+"""
+import os
+import tempfile
+from multiprocessing import Pool
+from relations import Relation
+from operations import Projection
+from polymorphisms import BlankingEndomorphism, RotationAutomorphism, SwappingAutomorphism
+from persistent_caches import PersistentStore, persist
+
+R = Relation([(0, 0), (0, 1), (2, 0)], 3)
+S = Relation([(1, 1), (0, 1)], 3)
+T = Relation([(2, 2), (1, 0), (1, 2)], 3)
+
+directory = tempfile.mkdtemp()
+path = os.path.join(directory, 'values.db')
+
+print('An operation with a spec can keep its values in a file, keyed by its spec and the fingerprints of its\n\
+arguments.')
+store = PersistentStore(path)
+rotation = persist(RotationAutomorphism(1), store)
+for rel in (R, S, T):
+    rotation(rel)
+print(store)
+store.close()
+print()
+
+print('An operation made the same way in a later run finds the values without computing them. Here the function of\n\
+the new operation is never called.')
+store = PersistentStore(path)
+rotation = persist(RotationAutomorphism(1), store)
+rotation.func = None
+print(rotation(S) == RotationAutomorphism(1)(S), len(rotation.values))
+print()
+
+print('Composites keep their values on relations in the store as well.')
+composite = persist(SwappingAutomorphism(R)[RotationAutomorphism(2)[Projection(2, 1)]], store)
+composite(S, T)
+again = persist(SwappingAutomorphism(R)[RotationAutomorphism(2)[Projection(2, 1)]], PersistentStore(path))
+print(len(again.cache), again(Relation([(1, 1), (0, 1)], 3), T) == composite(S, T))
+print()
+
+
+def blank(rel):
+    """
+    Blank the relations R, S, and T with a given relation, keeping the values in the store.
+
+    Argument:
+        rel (Relation): The relation to blank with.
+
+    Returns:
+        int: The number of values stored for the blanking endomorphism.
+    """
+
+    op = persist(BlankingEndomorphism(rel), PersistentStore(path))
+    for other in (R, S, T):
+        op(other)
+    return len(op.values)
+
+
+print('Several processes can use the same store at once.')
+with Pool(3) as pool:
+    print(pool.map(blank, (R, S, T, R, S, T)))
+print(len(PersistentStore(path)))
+print()
+
+print('A store can be limited to a number of bytes, beyond which the least recently used values are removed.')
+small = PersistentStore(os.path.join(directory, 'small.db'), max_bytes=1000)
+rotation = persist(RotationAutomorphism(3), small)
+for k in range(4):
+    for rel in (R, S, T):
+        rotation(RotationAutomorphism(k)(rel))
+print(small)
@@ -0,0 +1,78 @@
+"""
+Relation batches test
+"""
+from relations import Relation
+from relation_batch import RelationBatch, batch_training_pairs, parity_gram, ParityGramEngine
+from polymorphisms import hamming_loss, hamming_loss_batch
+
+print('A batch stores several relations with the same universe and arity as the rows of a packed bit array.')
+R = Relation([(0, 0), (0, 1), (2, 0)], 3)
+S = Relation([(1, 1), (0, 1)], 3)
+T = Relation([(2, 2)], 3)
+batch = RelationBatch.from_relations([R, S, T])
+print(batch)
+print(batch.packed)
+print()
+
+print('Each row takes ceil(3 ** 2 / 8) = 2 bytes.')
+print(batch.row_bytes)
+print()
+
+print('We can get the relations back out, either one at a time or all together.')
+print(batch[1] == S)
+print(batch.to_relations() == [R, S, T])
+print()
+
+print('The sizes of all the relations are computed at once.')
+print(batch.cardinalities())
+print()
+
+print('Set operations work row by row between batches of the same length.')
+other = RelationBatch.from_relations([S, T, R])
+for rel in batch ^ other:
+    rel.show('binary_pixels')
+    print()
+
+print('A single relation is broadcast against every row of a batch.')
+for rel in batch & S:
+    print(rel)
+print()
+
+print('A stack of boolean arrays, such as a dataset of binary images, is packed into a batch in a single call.')
+arrays = batch.to_arrays()
+print(arrays.shape, RelationBatch.from_arrays(arrays).to_relations() == [R, S, T])
+print()
+
+print('The complements of all the relations in a batch can be taken at once.')
+print((~batch).cardinalities())
+print()
+
+print('Dot products modulo 2 are also vectorized.')
+print(batch.dot(S), [rel.dot(S) for rel in (R, S, T)])
+print()
+
+print('Training pairs can be gathered into one batch per input and one batch per output.')
+training_pairs = [({'x0': R, 'x1': S}, (T,)), ({'x0': T, 'x1': R}, (S,))]
+inputs, outputs = batch_training_pairs(training_pairs)
+print(inputs['x0'])
+print(outputs[0])
+print()
+
+print('The Hamming loss of whole columns of outputs is found from the popcounts of their symmetric differences.')
+predictions = (RelationBatch.from_relations([R, T]),)
+print(hamming_loss_batch(predictions, outputs))
+print([hamming_loss(x, y) for (x, (_, y)) in zip([(R,), (T,)], training_pairs)])
+print()
+
+print('The dot products modulo 2 of every relation in one collection with every relation in another form a Gram\n\
+matrix, which is computed in a single pass over the packed bits.')
+print(batch.gram([R, S]))
+print(parity_gram([R, S, T], [R, S]))
+print()
+
+print('A `ParityGramEngine` remembers the dot products of the inputs it is primed with against a bank of constants.\n\
+Other inputs have their dot products taken directly.')
+engine = ParityGramEngine([R, S, T])
+engine.prime([R, S])
+print(engine.parities(R), engine.column(T), len(engine.rows))
+print(engine.dot(S, 2) == S.dot(T), engine.dot(T, 2) == T.dot(T), len(engine.rows))
@@ -0,0 +1,32 @@
+"""
+Lazy relation expressions test
+"""
+from relations import Relation
+from relation_expressions import lazy
+from polymorphisms import SwappingAutomorphism, BlankingEndomorphism
+
+R = Relation([(0, 0), (0, 1), (2, 0)], 3)
+S = Relation([(1, 1), (0, 1)], 3)
+T = Relation([(2, 2), (0, 0)], 3)
+
+print('Set operations on a lazy expression build a larger expression instead of computing a relation.')
+expression = ((lazy(R) ^ S) & ~T) | S
+print(expression)
+print()
+
+print('The value is computed in one pass when it is asked for, and agrees with computing it step by step.')
+print(sorted(expression.evaluate()))
+print(expression.evaluate() == ((R ^ S) & ~T) | S)
+print()
+
+print('The size of the value and its dot products are found without creating any relations.')
+print(len(expression), expression.dot(T), bool(lazy(R) - R))
+print()
+
+print('Operations built from set operations, such as swapping and blanking, pass expressions along.')
+composite = SwappingAutomorphism(T)[BlankingEndomorphism(S)]
+print(composite(lazy(R)).evaluate() == (R & S) ^ T)
+print()
+
+print('A relation on the left of an expression gives an expression too, so the expression can be the fixed argument.')
+print(SwappingAutomorphism(lazy(T))(R).evaluate() == R ^ T)
@@ -0,0 +1,47 @@
+"""
+Relation stores test
+"""
+import os
+import tempfile
+from relations import Relation
+from relation_store import RelationStore
+
+R = Relation([(0, 0), (0, 1), (2, 0)], 3)
+S = Relation([(1, 1), (0, 1)], 3)
+T = Relation([(2, 2)], 3)
+path = os.path.join(tempfile.mkdtemp(), 'example.rel')
+
+print('A store is a file of relations with the same universe and arity. Relations can be appended to it one at a time\n\
+or several at once, optionally with labels.')
+with RelationStore(path, 'w', 3, 2, labelled=True) as store:
+    store.append(R, 0)
+    store.extend([(S, 1), (T, 1)])
+    print(store)
+print()
+
+print('Opening the store again for appending adds more relations to the end of the file.')
+with RelationStore(path, 'a') as store:
+    store.append(R & S, 0)
+print()
+
+print('A partial record left at the end of the file by an interrupted run is cut off when appending resumes.')
+with open(path, 'ab') as file:
+    file.write(b'\x05\x00\x00')
+with RelationStore(path, 'a') as store:
+    print(len(store))
+print()
+
+print('Reading a store maps the file into memory, so nothing is parsed until a relation is asked for.')
+store = RelationStore(path)
+print(store)
+print(store[1] == S)
+print(store.labels)
+print(list(store.items())[3][0] == R & S)
+print()
+
+print('Slices of a store are batches whose rows are views of the file.')
+batch = store[1:3]
+print(batch)
+print(batch.to_relations() == [S, T])
+print(store.batch().cardinalities())
+store.close()
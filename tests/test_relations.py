@@ -1,7 +1,8 @@
 """
 Relations test
 """
-from relations import Relation
+import pickle
+from relations import Relation, RelationPool, relation_nbytes, memory_report, DatasetFingerprint
 from itertools import product
 
 print('Create a binary relation on the set {0,1,2} whose members are the pairs (0,0), (0,1), and (2,0).\n\
@@ -171,3 +172,87 @@ if Z:
     print('There are members of `Z.tuples`.')
 if Z ^ Z:
     print('This won\'t be printed because `Z ^ Z` is empty.')
+print()
+
+print('Behind the scenes, a relation on a small universe is stored as a single integer with one bit for each tuple in\n\
+the Cartesian power of the universe. The tuples are ordered lexicographically, so the pair (i, j) on a universe of\n\
+size 3 sits at bit 3*i+j.')
+print(bin(W.bits))
+print(Relation(((0, 0), (1, 2)), 3).bits == 0b100001)
+print()
+
+print('Complements are stored by the tuples they exclude, so even the complement of a relation on a huge universe is\n\
+cheap to create and to query.')
+V = ~Relation([(1, 2, 3)], 1000, 3)
+print(V.complemented)
+print(len(V))
+print((5, 5, 5) in V, (1, 2, 3) in V)
+print()
+
+print('A complemented relation can be converted to the usual form when needed.')
+print((~W).materialize().complemented, (~W).materialize() == ~W)
+print()
+
+print('Equal relations can be interned in a pool so that they are represented by a single object. Dictionary lookups\n\
+with interned relations as keys then only need to compare identities.')
+pool = RelationPool()
+R1 = Relation([(0, 0), (0, 1), (2, 0)], 3).intern(pool)
+S1 = S.intern(pool)
+print(R1 is S1)
+print(pool)
+print()
+
+print('We can measure how much memory relations use, either one at a time or for a whole dataset.')
+print(relation_nbytes(A))
+print(memory_report([({'x0': A}, (B,)), ({'x0': C}, (B,))]))
+print()
+
+print('Each relation picks a representation based on the size of its universe and how many tuples it has.\n\
+Relations on small universes are always dense, while those on large universes are sparse when they or their\n\
+complements have few tuples.')
+print(A.representation)
+print(Relation([(1, 2, 3)], 1000, 3).representation)
+print(V.representation)
+print((V ^ Relation([(1, 2, 3)], 1000, 3)).representation)
+print()
+
+print('Relations are pickled as a single buffer of their stored positions, which protocol 5 can send out of band.')
+buffers = []
+data = pickle.dumps(V, protocol=5, buffer_callback=buffers.append)
+print(len(buffers))
+print(pickle.loads(data, buffers=buffers) == V)
+print(pickle.loads(pickle.dumps(A)) == A)
+print()
+
+print('Fingerprints are digests of the contents of relations which, unlike hash values, are the same in every\n\
+process. Fingerprints of datasets can be extended as more data arrives.')
+print((A | B).fingerprint == (B | A).fingerprint, A.fingerprint == B.fingerprint)
+fingerprint = DatasetFingerprint([({'x0': A}, (B,))])
+fingerprint.update(({'x0': C}, (B,)))
+print(hex(fingerprint.value))
+print()
+
+print('Flipping, adding, or removing a single tuple makes a new relation which shares the storage of the original.')
+D = A.flip((0, 0)).add((1, 0)).remove((1, 0))
+print(sorted(A ^ D))
+print(len(D), (0, 0) in D, (0, 0) in A)
+print()
+
+print('The sizes of combinations of two relations can be counted without creating the combinations.')
+print(A.intersection_size(B) == len(A & B), A.union_size(B) == len(A | B))
+print(A.symmetric_difference_size(B) == len(A ^ B), A.difference_size(B) == len(A - B))
+print((A & B).issubset(A), A.issubset(A & B))
+print()
+
+print('Relations can be converted to and from boolean arrays with one axis for each coordinate, such as binary\n\
+images. A stack of arrays is converted in a single vectorized call.')
+array = A.to_array()
+print(array.astype(int))
+print(Relation.from_array(array) == A, Relation.from_arrays([array, ~array]) == [A, ~A])
+print()
+
+print('A binary relation can be composed with another, taken to a power, reversed, or closed under reflexivity and\n\
+transitivity. These are computed as boolean matrix products on packed rows.')
+E = Relation([(0, 1), (1, 2), (2, 3)], 4)
+print(sorted(E @ E), sorted(E.power(3)), sorted(E.converse()))
+print(sorted(E.closure()))
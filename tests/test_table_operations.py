@@ -0,0 +1,80 @@
+"""
+Table operations test
+"""
+import time
+from itertools import product
+import numpy
+import arithmetic_operations
+from neural_net import Neuron, Layer, NeuralNet, TrainingColumns
+from table_operations import TableOperation
+
+order = 100
+
+# We can tabulate any operation on a finite universe by evaluating it everywhere.
+addition = TableOperation.from_operation(arithmetic_operations.ModularAddition(order), order)
+multiplication = TableOperation.from_operation(arithmetic_operations.ModularMultiplication(order), order)
+print(addition.table.shape)
+print(addition(37, 85), multiplication(37, 85))
+print()
+
+# A table operation can be applied to whole columns of arguments at once.
+x = numpy.arange(10)
+y = numpy.arange(10, 20)
+print(addition.evaluate_batch(x, y))
+print(multiplication.evaluate_batch(x, y))
+print()
+
+# Arguments outside the universe are rejected rather than wrapped around.
+try:
+    addition(-1, 2)
+except ValueError as error:
+    print(error)
+print()
+
+# Tables with the same entries have the same spec, wherever they came from.
+print(addition.spec() == TableOperation(addition.table).spec())
+print(addition.spec() == multiplication.spec())
+print()
+
+# A random operation is a random table.
+random_op = TableOperation.random(order, 2, seed=0)
+print(random_op.spec() == TableOperation.random(order, 2, seed=0).spec())
+print()
+
+# We train the neural net from `test_neural_net.py` to compute (x0+x1)*(x1+x2) modulo `order`, using tables as the
+# activation functions and giving the training pairs as columns.
+layer0 = Layer(('x0', 'x1', 'x2'))
+neuron0 = Neuron(addition, ('x0', 'x1'))
+neuron1 = Neuron(TableOperation.random(order, 2), ('x1', 'x2'))
+layer1 = Layer([neuron0, neuron1])
+neuron2 = Neuron(multiplication, [neuron0, neuron1])
+layer2 = Layer([neuron2])
+net = NeuralNet([layer0, layer1, layer2])
+
+training_pairs = [({'x0': x[0], 'x1': x[1], 'x2': x[2]}, (((x[0] + x[1]) * (x[1] + x[2])) % order,))
+                  for x in product(range(order // 2 + 1), repeat=3)]
+columns = TrainingColumns(training_pairs)
+print(len(columns))
+
+# The loss is the same whether the training pairs are given as columns or not.
+print(net.empirical_loss(columns) == net.empirical_loss(training_pairs))
+print()
+
+
+def neighbor_func(op):
+    """
+    Report all the neighbors of any operation as being addition, multiplication, or a random binary operation.
+
+    Argument:
+        op (operation): The Operation whose neighbors we'd like to find.
+
+    Returns:
+        list of Operations: The neighboring Operations.
+    """
+
+    return [addition, multiplication, TableOperation.random(order, 2)]
+
+
+start = time.time()
+net.train(columns, neighbor_func, 5, report_loss=True)
+print('Trained in {:.2f} seconds'.format(time.time() - start))